@@ -0,0 +1,95 @@
+"""
+This contains the shared reader for read-only tables memory mapped from a file.
+
+The files start with a header of b'<magic>', uint32 version, uint64 count, which
+is followed by arrays of uint64 and then the data. The first array always holds
+the count + 1 offsets of the utf-8 keys, which are stored in byte order so a key
+can be found by binary search without reading the rest of the file.
+"""
+import mmap
+import struct
+
+
+class MappedSortedTable(object):
+    """
+    Base for read-only tables memory mapped from a file with sorted utf-8 keys.
+    Subclasses set MAGIC, VERSION and ARRAYS and write the file themselves.
+
+    Attributes:
+        fname: Path of the mapped file
+        MAGIC: Four bytes which open the file
+        VERSION: Version of the file layout
+        ARRAYS: Tuple of (attribute name, extra entries) for the uint64 arrays after the
+            header, in file order. Each array holds count + extra entries. The first
+            must be ('_key_offsets', 1)
+        DESCRIPTION: What the file holds, for the error raised on a file of another kind
+    """
+    MAGIC = None
+    VERSION = 1
+    HEADER = struct.Struct('=4sIQ')
+    ARRAYS = (('_key_offsets', 1),)
+    DESCRIPTION = 'table'
+
+    def __init__(self, fname):
+        """
+        Args:
+            fname: Path of the file to map
+        """
+        self.fname = fname
+        self._open()
+
+    def _open(self):
+        with open(self.fname, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = self.HEADER.unpack_from(self._mmap, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            self._mmap.close()
+            raise ValueError('%s is not a %s' % (self.fname, self.DESCRIPTION))
+        self._count = count
+        view = memoryview(self._mmap)
+        start = self.HEADER.size
+        for name, extra in self.ARRAYS:
+            width = 8 * (count + extra)
+            setattr(self, name, view[start:start + width].cast('Q'))
+            start += width
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def close(self):
+        for name, extra in self.ARRAYS:
+            getattr(self, name).release()
+        self._mmap.close()
+
+    def _key(self, i):
+        return self._mmap[self._key_offsets[i]:self._key_offsets[i + 1]].decode('utf-8')
+
+    def _find(self, key):
+        """
+        Returns:
+            Position of the key among the sorted keys, or -1
+        """
+        key = key.encode('utf-8')
+        offsets = self._key_offsets
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = self._mmap[offsets[mid]:offsets[mid + 1]]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def __getstate__(self):
+        # worker processes reopen the file rather than receiving a copy of it
+        return {'fname': self.fname}
+
+    def __setstate__(self, state):
+        self.fname = state['fname']
+        self._open()
@@ -0,0 +1,231 @@
+"""
+This contains vectorized association measures for scoring ngrams.
+
+The nltk collocation finders score ngrams one at a time through python calls into
+BigramAssocMeasures / TrigramAssocMeasures and fully sort the results for every
+measure requested. AssociationScorer instead gathers the contingency marginals of
+all the ngrams into numpy arrays once and computes each measure over every ngram
+in a handful of array operations. The formulas follow nltk.metrics.association
+term for term so the scores agree with the finder's.
+"""
+import numpy as np
+
+# Same smoothing constant nltk adds to avoid dividing by or taking the log of zero
+_SMALL = 1e-20
+
+
+class AssociationScorer(object):
+    """
+    Scores every ngram held by a collocation finder with vectorized association
+    measures. raw_freq, pmi and student_t only need the unigram marginals and work
+    for any n. likelihood_ratio and chi_sq need the full contingency table and
+    support bigrams and trigrams.
+    Example:
+        scorer = AssociationScorer.from_finder(finder)
+        scorer.nbest('pmi', 10)
+        scorer.score_ngrams('raw_freq')
+
+    Attributes:
+        n: Length of the ngrams
+        ngrams: List of the ngram tuples, in the order of the arrays
+        n_ngram: Array of the count of each ngram
+        subgrams: Tuple of the arrays of the (n-1)-gram marginals. Empty for bigrams,
+            (n_iix, n_ixi, n_xii) for trigrams
+        unigrams: Tuple of n arrays holding the count of each word of the ngram
+        n_all: Total number of words
+    """
+
+    measures = ('raw_freq', 'pmi', 'likelihood_ratio', 'chi_sq', 'student_t')
+
+    def __init__(self, ngrams, n_ngram, unigrams, n_all, subgrams=()):
+        """
+        Args:
+            ngrams: List of ngram tuples
+            n_ngram: Sequence of the count of each ngram
+            unigrams: Sequence of n sequences, the counts of the first, second, ... word of each ngram
+            n_all: Total number of words
+            subgrams: For trigrams, the sequences (n_iix, n_ixi, n_xii) of pair counts
+        """
+        self.ngrams = ngrams
+        self.n = len(unigrams)
+        assert(self.n >= 2)
+        self.n_ngram = np.asarray(n_ngram, dtype=np.float64)
+        self.unigrams = tuple(np.asarray(u, dtype=np.float64) for u in unigrams)
+        self.subgrams = tuple(np.asarray(s, dtype=np.float64) for s in subgrams)
+        self.n_all = n_all
+        self._cont = None
+        self._ranks = None
+
+    @classmethod
+    def from_finder(cls, finder):
+        """
+        Gathers the marginals of every ngram in a BigramCollocationFinder or
+        TrigramCollocationFinder. Like the finder, ngrams with a zero count are skipped
+        and bigram counts are scaled by 1 / (window_size - 1).
+
+        Args:
+            finder: nltk collocation finder
+        Returns:
+            AssociationScorer
+        """
+        ngrams = [ngram for ngram, count in finder.ngram_fd.items() if count]
+        n_ngram = [finder.ngram_fd[ngram] for ngram in ngrams]
+        word_fd = finder.word_fd
+        n = 3 if hasattr(finder, 'wildcard_fd') else 2
+        unigrams = [[word_fd[ngram[i]] for ngram in ngrams] for i in range(n)]
+        if n == 2:
+            n_ngram = np.asarray(n_ngram, dtype=np.float64) / (finder.window_size - 1.0)
+            return cls(ngrams, n_ngram, unigrams, finder.N)
+        subgrams = ([finder.bigram_fd[(w1, w2)] for w1, w2, w3 in ngrams],
+                    [finder.wildcard_fd[(w1, w3)] for w1, w2, w3 in ngrams],
+                    [finder.bigram_fd[(w2, w3)] for w1, w2, w3 in ngrams])
+        return cls(ngrams, n_ngram, unigrams, finder.N, subgrams)
+
+    def __len__(self):
+        return len(self.ngrams)
+
+    def score(self, measure):
+        """
+        Args:
+            measure: Name of one of the measures, e.g., 'pmi'
+        Returns:
+            Array with the score of each ngram, in the order of self.ngrams
+        """
+        if measure not in self.measures:
+            raise ValueError("Unknown association measure %s" % measure)
+        return getattr(self, measure)()
+
+    def score_ngrams(self, measure):
+        """
+        Equivalent of the collocation finder's score_ngrams
+
+        Args:
+            measure: Name of one of the measures
+        Returns:
+            List of (ngram, score) tuples ordered from highest to lowest score, ties broken by ngram
+        """
+        scores = self.score(measure)
+        order = np.lexsort((self._ngram_ranks(), -scores))
+        return [(self.ngrams[i], s) for i, s in zip(order.tolist(), scores[order].tolist())]
+
+    def nbest(self, measure, number):
+        """
+        Equivalent of the collocation finder's nbest. Selects the top scores with
+        partition so only the number best (plus any ties for the last place) are sorted.
+
+        Args:
+            measure: Name of one of the measures
+            number: How many ngrams to return
+        Returns:
+            List of the number highest scoring ngrams
+        """
+        scores = self.score(measure)
+        if number <= 0:
+            return []
+        if number < len(scores):
+            cutoff = -np.partition(-scores, number - 1)[number - 1]
+            candidates = np.flatnonzero(scores >= cutoff)
+        else:
+            candidates = np.arange(len(scores))
+        # ties are broken among the candidates only, so nothing is sorted over the whole table
+        ngrams = self.ngrams
+        order = sorted(candidates.tolist(), key=lambda i: (-scores[i], ngrams[i]))
+        return [ngrams[i] for i in order[:number]]
+
+    def raw_freq(self):
+        """Scores ngrams by their frequency"""
+        return self.n_ngram / self.n_all
+
+    def pmi(self):
+        """Scores ngrams by pointwise mutual information, as in Manning and Schutze 5.4"""
+        return np.log2(self.n_ngram * self.n_all ** (self.n - 1)) - np.log2(self._unigram_product())
+
+    def student_t(self):
+        """Scores ngrams using Student's t test with independence hypothesis for unigrams"""
+        expected = self._unigram_product() / (self.n_all ** (self.n - 1))
+        return (self.n_ngram - expected) / (self.n_ngram + _SMALL) ** 0.5
+
+    def chi_sq(self):
+        """Scores ngrams using Pearson's chi-square as in Manning and Schutze 5.3.3"""
+        cont = self._contingency()
+        if self.n == 2:
+            # nltk scores bigrams as n_xx * phi_sq
+            a, b, c, d = cont
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return self.n_all * ((a * d - b * c) ** 2 / ((a + b) * (a + c) * (b + d) * (c + d)))
+        total = np.zeros(len(self))
+        for obs, exp in zip(cont, self._expected_values(cont)):
+            total += (obs - exp) ** 2 / (exp + _SMALL)
+        return total
+
+    def likelihood_ratio(self):
+        """Scores ngrams using likelihood ratios as in Manning and Schutze 5.3.4"""
+        cont = self._contingency()
+        total = np.zeros(len(self))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for obs, exp in zip(cont, self._expected_values(cont)):
+                total += obs * np.log(obs / (exp + _SMALL) + _SMALL)
+        return 2 * total
+
+    def _unigram_product(self):
+        product = self.unigrams[0]
+        for u in self.unigrams[1:]:
+            product = product * u
+        return product
+
+    def _contingency(self):
+        """
+        Returns:
+            Tuple of arrays, one per contingency table cell, in nltk's cell order
+        """
+        if self._cont is None:
+            if self.n > 3:
+                raise NotImplementedError("The contingency table is only available for bigrams and trigrams")
+            if self.n == 2:
+                n_ii = self.n_ngram
+                n_ix, n_xi = self.unigrams
+                n_oi = n_xi - n_ii
+                n_io = n_ix - n_ii
+                self._cont = (n_ii, n_oi, n_io, self.n_all - n_ii - n_oi - n_io)
+            else:
+                n_iii = self.n_ngram
+                n_iix, n_ixi, n_xii = self.subgrams
+                n_ixx, n_xix, n_xxi = self.unigrams
+                n_oii = n_xii - n_iii
+                n_ioi = n_ixi - n_iii
+                n_iio = n_iix - n_iii
+                n_ooi = n_xxi - n_iii - n_oii - n_ioi
+                n_oio = n_xix - n_iii - n_oii - n_iio
+                n_ioo = n_ixx - n_iii - n_ioi - n_iio
+                n_ooo = self.n_all - n_iii - n_oii - n_ioi - n_iio - n_ooi - n_oio - n_ioo
+                self._cont = (n_iii, n_oii, n_ioi, n_ooi, n_iio, n_oio, n_ioo, n_ooo)
+        return self._cont
+
+    def _expected_values(self, cont):
+        """
+        Returns:
+            List of arrays with the expected value of each contingency table cell
+        """
+        n_all = cont[0]
+        for c in cont[1:]:
+            n_all = n_all + c
+        bits = [1 << i for i in range(self.n)]
+        expected = []
+        for i in range(len(cont)):
+            product = None
+            for j in bits:
+                margin = sum(cont[x] for x in range(len(cont)) if (x & j) == (i & j))
+                product = margin if product is None else product * margin
+            expected.append(product / (n_all ** (self.n - 1)))
+        return expected
+
+    def _ngram_ranks(self):
+        """
+        Returns:
+            Array with the position of each ngram in sorted order, used to break score ties
+        """
+        if self._ranks is None:
+            order = sorted(range(len(self.ngrams)), key=self.ngrams.__getitem__)
+            self._ranks = np.empty(len(order), dtype=np.int64)
+            self._ranks[order] = np.arange(len(order))
+        return self._ranks
@@ -4,6 +4,28 @@ Created by adam on 11/11/15
 """
 __author__ = 'adam'
 
+import copy
+import multiprocessing
+
+import nltk
+
+from AnalysisErrors import NgramError
+from TextCleaningTools import IModifier, INgramFilter, WordFilter
+from StreamingCounters import LossyCounter, SpillingCounter
+from Vocabulary import Vocabulary, IdBag, TweetTupleTable
+
+try:
+    import numpy as np
+    from NgramStatistics import AssociationScorer
+except ImportError:
+    # numpy is not installed; score through the collocation finder instead
+    np = None
+    AssociationScorer = None
+
+
+# Attributes set by calculate(), which worker copies leave behind
+_RESULT_NAMES = ('collocation_finder', 'topPMI', 'raw_freq', 'sorted_ngrams', 'top_likelihood_ratio')
+
 
 class NgramGetter(object):
     """
@@ -20,15 +42,31 @@ class NgramGetter(object):
         top_pmi: Variable number of n-grams with the highest Pointwise Mutual Information (i.e., which occur together
         more often than would be expected)
         word_bag: List of text to process
+        word_fd: FreqDist of the words counted so far
+        ngram_fd: FreqDist of the ngrams counted so far
+        document_fd: FreqDist of the number of tweets each ngram appears in, counted by partial_fit_documents()
+        approximation_error: Most times an ngram missing from the last process_bounded() may have been seen
     """
 
     def __init__(self):
         self.modifiers = []
         self.ngram_filters = []
+        self._drop_ngram = None
+        self._candidates = None
+        self.approximation_error = 0
         self.word_bag = []
         self.ngrams = []
         if not self.measurement_tool:
             raise NotImplementedError
+        self.reset()
+
+    def reset(self):
+        """
+        Discards all the counts accumulated by partial_fit()
+        """
+        self.word_fd = nltk.FreqDist()
+        self.ngram_fd = nltk.FreqDist()
+        self.document_fd = nltk.FreqDist()
 
     def add_modifier(self, iModifier):
         assert(isinstance(iModifier, IModifier))
@@ -36,33 +74,361 @@ class NgramGetter(object):
 
     def _run_modifiers(self):
         """
-        Calls the modifiers in sequence and stores the results back in word_bag
+        Calls the modifiers in sequence and stores the results back in word_bag.
+        Each modifier processes every unique word once (see IModifier.process_many)
         """
         for modifier in self.modifiers:
-            self.word_bag = [modifier.process(w) for w in self.word_bag]
+            self.word_bag = modifier.process_many(self.word_bag)
 
     def add_filter(self, iNgramFilter):
         """
-        Adds a filter to be run after the ngrams are created
+        Adds a filter which is compiled (see INgramFilter.compile) and run while the ngrams
+        are counted, so filtered ngrams are never stored. Only the ngram counts are
+        filtered; the word counts used as marginals are not. Batches counted before the
+        filter was added are not affected; use apply_filters() for those.
         :param iNgramFilter:
         :return:
         """
+        assert(isinstance(iNgramFilter, INgramFilter))
         self.ngram_filters.append(iNgramFilter)
+        self._drop_ngram = None
 
     def apply_filters(self):
+        """
+        Runs the filters on the collocation finder built by the last calculate()
+        """
         for ftr in self.ngram_filters:
-            self.collocation_finder.apply_ngram_filter(ftr)
+            ftr.filter(self.collocation_finder)
+
+    @property
+    def drop_ngram(self):
+        """
+        The filters compiled into one predicate
+        Returns:
+            Function taking an ngram tuple and returning True if any filter removes it,
+            or None when there are no filters
+        """
+        if self._drop_ngram is None and self.ngram_filters:
+            predicates = [ftr.compile() for ftr in self.ngram_filters]
+            if len(predicates) == 1:
+                self._drop_ngram = predicates[0]
+            else:
+                self._drop_ngram = lambda ngram: any(predicate(ngram) for predicate in predicates)
+        return self._drop_ngram
 
     def process(self, word_bag, min_freq=3, get_top=10, **kwargs):
         """
         Runs any modifiers (stemmers, lemmatizers, etc) on the list of terms and
-        then extracts the ngrams
+        then extracts the ngrams. Discards any counts from earlier calls.
 
         Args:
             get_top: The cut off for ngrams to get stats for
             min_freq: Integer of minimum number of appearances of ngram to extract
             word_bag: List of strings to extract ngrams from. Should already be filtered.
         """
+        self.reset()
+        self.partial_fit(word_bag)
+        self.calculate(min_freq, get_top)
+
+    def partial_fit(self, word_bag):
+        """
+        Runs the modifiers on a batch of words and folds its word and ngram counts into
+        the running totals. Ngrams do not span two batches.
+        Example:
+            getter = BigramGetter()
+            for day in days:
+                getter.partial_fit(day.masterbag)
+            getter.calculate(min_freq=3)
+
+        Args:
+            word_bag: List of strings. Should already be filtered.
+        """
+        self.word_bag = word_bag
+        self._run_modifiers()
+        self._count(self.word_bag)
+
+    def merge(self, other):
+        """
+        Adds the counts accumulated by another getter of the same kind to this one's
+
+        Args:
+            other: NgramGetter of the same class
+        Returns:
+            This getter
+        """
+        assert(type(other) is type(self))
+        self._merge_counts(other._counts())
+        return self
+
+    def process_documents(self, tweet_tuples, min_freq=3, get_top=10, workers=None, chunksize=None):
+        """
+        Like process() but takes the tweets separately so that no ngram spans the seam
+        between two tweets, and also counts the number of tweets each ngram appears in
+        (see document_fd). Discards any counts from earlier calls.
+        Example:
+            getter.process_documents(bagmaker.tweet_tuples, workers=4)
+
+        Args:
+            tweet_tuples: List of (tweetID, [list of words in tweet]) tuples or a TweetTupleTable
+            get_top: The cut off for ngrams to get stats for
+            min_freq: Integer of minimum number of appearances of ngram to extract
+            workers: Number of processes to shard the tweets across. None or 1 runs serially
+            chunksize: Number of tweets per shard when workers is set. Defaults to a quarter of
+                an even split between the workers
+        """
+        self.reset()
+        self.partial_fit_documents(tweet_tuples, workers, chunksize)
+        self.calculate(min_freq, get_top)
+
+    def partial_fit_documents(self, tweet_tuples, workers=None, chunksize=None):
+        """
+        Counts the words, ngrams and document frequencies of a batch of tweets into
+        the running totals. With workers, each shard of tweets is counted in its own
+        process and the counts are merged back in.
+
+        Args:
+            tweet_tuples: List of (tweetID, [list of words in tweet]) tuples or a TweetTupleTable
+            workers: Number of processes to shard the tweets across. None or 1 runs serially
+            chunksize: Number of tweets per shard when workers is set
+        """
+        documents = self._prepare_documents(tweet_tuples)
+        if workers is None or workers <= 1:
+            self._count_documents(documents)
+            return
+        if chunksize is None:
+            chunksize = len(tweet_tuples) // (workers * 4) + 1
+        pool = multiprocessing.Pool(workers, initializer=_init_ngram_worker, initargs=(self._worker_copy(),))
+        try:
+            for counts in pool.imap(_count_document_shard, self._document_shards(documents, chunksize)):
+                self._merge_counts(counts)
+        except BaseException:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+
+    def _prepare_documents(self, tweet_tuples):
+        """
+        Returns:
+            The tweets in the form _count_documents() and _document_shards() take
+        """
+        return tweet_tuples
+
+    def _document_shards(self, documents, chunksize):
+        """
+        Returns:
+            Generator of slices of chunksize tweets
+        """
+        return (documents[i:i + chunksize] for i in range(0, len(documents), chunksize))
+
+    def _count_documents(self, documents):
+        """
+        Runs the modifiers over the tweets and counts each one as a separate batch,
+        adding every distinct ngram of a tweet once to document_fd
+
+        Args:
+            documents: List of (tweetID, [list of words in tweet]) tuples or a TweetTupleTable
+        """
+        offsets = [0]
+        self.word_bag = []
+        for tweetid, words in documents:
+            self.word_bag += words
+            offsets.append(len(self.word_bag))
+        self._run_modifiers()
+        words = self.word_bag
+        for start, end in zip(offsets, offsets[1:]):
+            self.document_fd.update(set(self._count(words[start:end])))
+
+    def _counts(self):
+        """
+        Returns:
+            Dictionary of the accumulated counts, keyed by attribute name
+        """
+        return dict((name, getattr(self, name)) for name in self._count_names)
+
+    def _merge_counts(self, counts):
+        """
+        Args:
+            counts: Dictionary returned by _counts() of a getter of the same class
+        """
+        for name in self._count_names:
+            getattr(self, name).update(counts[name])
+
+    def _worker_copy(self):
+        """
+        Returns:
+            Shallow copy of this getter carrying the modifiers but none of the counts
+            or the results of an earlier calculate(), for shipping to worker processes
+        """
+        worker = copy.copy(self)
+        worker.word_bag = []
+        worker.ngrams = []
+        worker._drop_ngram = None
+        for name in _RESULT_NAMES:
+            worker.__dict__.pop(name, None)
+        worker.reset()
+        return worker
+
+    def calculate(self, min_freq=3, get_top=10):
+        """
+        Computes the statistics from the counts accumulated so far. The counts
+        themselves are left intact so more batches can be added afterwards.
+
+        Args:
+            get_top: The cut off for ngrams to get stats for
+            min_freq: Integer of minimum number of appearances of ngram to extract
+        Raises:
+            NgramError: Finding the collocations or calculating the statistics failed
+        """
+        try:
+            self.collocation_finder = self._make_collocation_finder()
+            self.collocation_finder.apply_freq_filter(min_freq)
+        except Exception as e:
+            raise NgramError('finding collocations for %s' % self.__class__.__name__) from e
+        try:
+            self._calculate_statistics(get_top)
+        except Exception as e:
+            raise NgramError('calculating statistics for %s' % self.__class__.__name__) from e
+
+    def process_bounded(self, word_bags, min_freq=3, get_top=10, max_entries=1000000):
+        """
+        Counts in two passes so that the memory needed for the ngram counts is bounded.
+        The first pass counts the ngrams approximately with a LossyCounter holding at
+        most max_entries of them. The second pass counts exactly, but only the ngrams
+        which the first pass found could reach min_freq, along with the marginals
+        those ngrams need. The results are exact as long as approximation_error is
+        below min_freq; otherwise ngrams seen at most approximation_error times may be missing.
+        Example:
+            getter.process_bounded([words for tweetid, words in bagmaker.tweet_tuples], max_entries=500000)
+
+        Args:
+            word_bags: Sequence of word bags (lists of strings), e.g., one per tweet, which can
+                be iterated over twice. No ngram spans two word bags
+            get_top: The cut off for ngrams to get stats for
+            min_freq: Integer of minimum number of appearances of ngram to extract
+            max_entries: Largest number of ngrams the first pass holds at once
+        Raises:
+            TypeError: word_bags is an iterator, which the second pass would find empty
+        """
+        if iter(word_bags) is word_bags:
+            raise TypeError("process_bounded makes two passes over word_bags; pass a list rather than an iterator")
+        self.reset()
+        counter = LossyCounter(max_entries=max_entries)
+        for word_bag in word_bags:
+            self.word_bag = list(word_bag)
+            self._run_modifiers()
+            counter.update(self._ngrams(self.word_bag))
+        self.approximation_error = counter.error
+        self._set_candidates(counter.candidates(min_freq))
+        del counter
+        for word_bag in word_bags:
+            self.word_bag = list(word_bag)
+            self._run_modifiers()
+            self.document_fd.update(set(self._count_candidates(self.word_bag)))
+        self._set_candidates(None)
+        self.calculate(min_freq, get_top)
+
+    def process_spilling(self, word_bags, min_freq=3, get_top=10, max_entries=1000000, directory=None):
+        """
+        Counts exactly without holding every distinct ngram in memory at once. The
+        ngram counts (and for trigrams the pair counts) go to SpillingCounters, which
+        write sorted runs to temporary files under directory whenever they hold more
+        than max_entries items. The runs are merged afterwards, keeping only the ngrams
+        seen at least min_freq times and the marginals those ngrams need.
+        Example:
+            getter.process_spilling(day_bags, max_entries=5000000, directory='/scratch')
+
+        Args:
+            word_bags: Iterable of word bags (lists of strings), e.g., one per tweet. No ngram
+                spans two word bags
+            get_top: The cut off for ngrams to get stats for
+            min_freq: Integer of minimum number of appearances of ngram to extract
+            max_entries: Largest number of distinct items each counter holds in memory
+            directory: Directory for the run files, or None for the system default
+        """
+        self.reset()
+        counters = dict((name, SpillingCounter(max_entries, directory)) for name in self._spilled_names)
+        try:
+            for word_bag in word_bags:
+                self.word_bag = list(word_bag)
+                self._run_modifiers()
+                self._count_spilling(self.word_bag, counters)
+            self._gather_spilled(counters, min_freq)
+        finally:
+            for counter in counters.values():
+                counter.close()
+        self.calculate(min_freq, get_top)
+
+    def _count_spilling(self, words, counters):
+        """
+        Counts the words in word_fd and the ngrams in the spilling counters
+
+        Args:
+            words: List of strings
+            counters: Dictionary of SpillingCounters keyed by the names in _spilled_names
+        """
+        ngrams = self._ngrams(words)
+        self.word_fd.update(words)
+        counters['ngram_fd'].update(ngrams)
+        counters['document_fd'].update(set(ngrams))
+
+    def _gather_spilled(self, counters, min_freq):
+        """
+        Merges the spilled counts of the ngrams seen at least min_freq times into ngram_fd and document_fd
+        """
+        ngram_fd = self.ngram_fd
+        for ngram, count in counters['ngram_fd'].items():
+            if count >= min_freq:
+                ngram_fd[ngram] = count
+        for ngram, count in counters['document_fd'].items():
+            if ngram in ngram_fd:
+                self.document_fd[ngram] = count
+
+    def _ngrams(self, words):
+        """
+        Args:
+            words: List of strings
+        Returns:
+            List of the ngrams in words which pass the filters
+        """
+        raise NotImplementedError
+
+    def _count(self, words):
+        """
+        Adds the word and ngram counts of one batch of words to the running totals
+
+        Args:
+            words: List of strings
+        Returns:
+            List of the ngrams in the batch
+        """
+        raise NotImplementedError
+
+    def _set_candidates(self, candidates):
+        """
+        Args:
+            candidates: Set of the ngrams _count_candidates() counts, or None to clear them
+        """
+        self._candidates = candidates
+
+    def _count_candidates(self, words):
+        """
+        Like _count() but only counts the candidate ngrams and the marginals they need
+
+        Args:
+            words: List of strings
+        Returns:
+            List of the candidate ngrams in the batch
+        """
+        raise NotImplementedError
+
+    def _make_collocation_finder(self):
+        """
+        Returns:
+            nltk collocation finder built over the accumulated counts
+        """
         raise NotImplementedError
 
     def _calculate_statistics(self, get_top=10, **kwargs):
@@ -70,10 +436,38 @@ class NgramGetter(object):
         Arguments:
             get_top: The cut off for ngrams to get stats for
         """
-        self.topPMI = self.collocation_finder.nbest(self.measurement_tool.pmi, get_top)
-        self.raw_freq = self.collocation_finder.score_ngrams(self.measurement_tool.raw_freq)
+        scorer = self._make_scorer()
+        self.topPMI = scorer.nbest('pmi', get_top)
+        self.raw_freq = scorer.score_ngrams('raw_freq')
         self.sorted_ngrams = (ngram for ngram, score in self.raw_freq)
-        self.top_likelihood_ratio = self.collocation_finder.nbest(self.measurement_tool.likelihood_ratio, get_top)
+        self.top_likelihood_ratio = scorer.nbest('likelihood_ratio', get_top)
+
+    def _make_scorer(self):
+        """
+        Returns:
+            AssociationScorer over the collocation finder's ngrams, or when numpy is
+            unavailable, a FinderScorer which scores through the finder itself
+        """
+        if AssociationScorer is None:
+            return FinderScorer(self.collocation_finder, self.measurement_tool)
+        return AssociationScorer.from_finder(self.collocation_finder)
+
+
+class FinderScorer(object):
+    """
+    Fallback with the same nbest / score_ngrams interface as NgramStatistics.AssociationScorer
+    which scores each ngram through the nltk collocation finder
+    """
+
+    def __init__(self, finder, measurement_tool):
+        self.finder = finder
+        self.measurement_tool = measurement_tool
+
+    def nbest(self, measure, number):
+        return self.finder.nbest(getattr(self.measurement_tool, measure), number)
+
+    def score_ngrams(self, measure):
+        return self.finder.score_ngrams(getattr(self.measurement_tool, measure))
 
 
 class BigramGetter(NgramGetter):
@@ -87,26 +481,38 @@ class BigramGetter(NgramGetter):
         sorted_ngrams: List of tuples sorted by self.scored_ngrams
     """
 
+    _count_names = ('word_fd', 'ngram_fd', 'document_fd')
+    _spilled_names = ('ngram_fd', 'document_fd')
+
     def __init__(self):
-        self.measurement_tool = nltk.metrics.BigramAssocMeasures()
+        self.measurement_tool = nltk.collocations.BigramAssocMeasures()
         NgramGetter.__init__(self)
 
-    def process(self, word_bag, min_freq=3, get_top=10, **kwargs):
+    def _ngrams(self, words):
+        ngrams = list(zip(words, words[1:]))
+        drop = self.drop_ngram
+        if drop is not None:
+            ngrams = [ngram for ngram in ngrams if not drop(ngram)]
+        return ngrams
+
+    def _count(self, words):
         """
-        Arguments:
-            word_bag: List of strings
+        Counts exactly as BigramCollocationFinder.from_words does
         """
-        assert(isinstance(word_bag, list))
-        try:
-            self._run_modifiers()
-            self.collocation_finder = nltk.collocations.BigramCollocationFinder.from_words(self.word_bag)
-            self.collocation_finder.apply_freq_filter(min_freq)
-        except NgramError('finding collocations for bigram'):
-            pass
-        try:
-            self._calculate_statistics(get_top)
-        except NgramError('calculating statistics for bigram'):
-            pass
+        ngrams = self._ngrams(words)
+        self.word_fd.update(words)
+        self.ngram_fd.update(ngrams)
+        return ngrams
+
+    def _count_candidates(self, words):
+        candidates = self._candidates
+        ngrams = [ngram for ngram in zip(words, words[1:]) if ngram in candidates]
+        self.word_fd.update(words)
+        self.ngram_fd.update(ngrams)
+        return ngrams
+
+    def _make_collocation_finder(self):
+        return nltk.collocations.BigramCollocationFinder(self.word_fd, self.ngram_fd)
 
     def _calculate_statistics(self, get_top=10, **kwargs):
         """
@@ -134,23 +540,419 @@ class TrigramGetter(NgramGetter):
         Extracts 3-grams from a word bag and calculates statistics
     """
 
+    _count_names = ('word_fd', 'ngram_fd', 'document_fd', 'bigram_fd', 'wildcard_fd')
+    _spilled_names = ('ngram_fd', 'document_fd', 'bigram_fd', 'wildcard_fd')
+
     def __init__(self):
-        self.measurement_tool = nltk.metrics.TrigramAssocMeasures()
+        self.measurement_tool = nltk.collocations.TrigramAssocMeasures()
         NgramGetter.__init__(self)
 
-    def process(self, word_bag, min_freq=3, get_top=10, **kwargs):
+    def reset(self):
+        NgramGetter.reset(self)
+        self.bigram_fd = nltk.FreqDist()
+        self.wildcard_fd = nltk.FreqDist()
+
+    def _ngrams(self, words):
+        ngrams = list(zip(words, words[1:], words[2:]))
+        drop = self.drop_ngram
+        if drop is not None:
+            ngrams = [ngram for ngram in ngrams if not drop(ngram)]
+        return ngrams
+
+    def _count(self, words):
         """
-        Arguments:
-            word_bag: List of strings
+        Counts exactly as TrigramCollocationFinder.from_words does
         """
-        assert(isinstance(word_bag, list))
-        try:
-            self._run_modifiers()
-            self.collocation_finder = nltk.collocations.TrigramCollocationFinder.from_words(self.word_bag)
-            self.collocation_finder.apply_freq_filter(min_freq)
-        except NgramError('finding collocations for trigram'):
-            pass
-        try:
-            self._calculate_statistics(get_top)
-        except NgramError('calculating statistics for trigram'):
-            pass
+        self.word_fd.update(words)
+        self.bigram_fd.update(zip(words, words[1:]))
+        self.wildcard_fd.update(zip(words, words[2:]))
+        ngrams = self._ngrams(words)
+        self.ngram_fd.update(ngrams)
+        return ngrams
+
+    def _set_candidates(self, candidates):
+        """
+        Also collects the pairs whose counts the candidates need as marginals
+        """
+        NgramGetter._set_candidates(self, candidates)
+        self._candidate_pairs = set()
+        self._candidate_wildcards = set()
+        for w1, w2, w3 in candidates or ():
+            self._candidate_pairs.add((w1, w2))
+            self._candidate_pairs.add((w2, w3))
+            self._candidate_wildcards.add((w1, w3))
+
+    def _count_spilling(self, words, counters):
+        NgramGetter._count_spilling(self, words, counters)
+        counters['bigram_fd'].update(zip(words, words[1:]))
+        counters['wildcard_fd'].update(zip(words, words[2:]))
+
+    def _gather_spilled(self, counters, min_freq):
+        """
+        Also keeps the pair counts the surviving trigrams need as marginals
+        """
+        NgramGetter._gather_spilled(self, counters, min_freq)
+        self._set_candidates(self.ngram_fd)
+        for name, needed in (('bigram_fd', self._candidate_pairs), ('wildcard_fd', self._candidate_wildcards)):
+            fd = getattr(self, name)
+            for pair, count in counters[name].items():
+                if pair in needed:
+                    fd[pair] = count
+        self._set_candidates(None)
+
+    def _count_candidates(self, words):
+        pairs = self._candidate_pairs
+        wildcards = self._candidate_wildcards
+        candidates = self._candidates
+        self.word_fd.update(words)
+        self.bigram_fd.update(pair for pair in zip(words, words[1:]) if pair in pairs)
+        self.wildcard_fd.update(pair for pair in zip(words, words[2:]) if pair in wildcards)
+        ngrams = [ngram for ngram in zip(words, words[1:], words[2:]) if ngram in candidates]
+        self.ngram_fd.update(ngrams)
+        return ngrams
+
+    def _make_collocation_finder(self):
+        return nltk.collocations.TrigramCollocationFinder(self.word_fd, self.bigram_fd, self.wildcard_fd,
+                                                          self.ngram_fd)
+
+
+# Number of queued rows IdNgramGetter lets build up before folding them into a small table
+_PENDING_ROWS = 1 << 16
+
+
+class IdNgramGetter(NgramGetter):
+    """
+    Extracts ngrams of any length (e.g., 4- and 5-grams of pain phrases) by counting
+    over an array of vocabulary ids rather than tuples of strings. Each window of n ids
+    is packed into a single int64 key (or a fixed width byte key when n ids do not fit
+    in 63 bits) and the keys are counted with numpy's sort based unique. Only the ngrams
+    which survive min_freq are decoded back to tuples of strings. Requires numpy.
+    Example:
+        getter = IdNgramGetter(4)
+        getter.process(bagmaker.masterbag, min_freq=3)
+        getter.topPMI
+
+    Attributes:
+        n: Length of the ngrams
+        vocabulary: Vocabulary which encodes the words. Shared with IdBag input
+        grams: Array of shape (number of distinct ngrams, n) holding the ids of each ngram counted so far
+        gram_counts: Array of the count of each row of grams
+        gram_documents: Array of the number of tweets each row of grams appears in, counted by
+            partial_fit_documents()
+        word_counts: Array of the count of each word, indexed by id
+        document_fd: FreqDist of the number of tweets each ngram kept by the last calculate() appears in
+        top_likelihood_ratio: Always None. Likelihood ratio needs the full 2**n contingency table
+
+    WordFilters are pushed down into counting as a mask over the id windows. Other
+    filters need the decoded strings, so they run in calculate() on the ngrams which pass min_freq.
+    """
+
+    def __init__(self, n=4, vocabulary=None):
+        """
+        Args:
+            n: Length of the ngrams
+            vocabulary: Optional Vocabulary. Defaults to the vocabulary of the first IdBag
+                processed, or a new one
+        """
+        if np is None:
+            raise ImportError("IdNgramGetter requires numpy")
+        assert(n >= 2)
+        self.n = n
+        self.vocabulary = vocabulary
+        # scoring goes through NgramStatistics rather than an nltk measure class
+        self.measurement_tool = AssociationScorer
+        NgramGetter.__init__(self)
+        self._filter_ids = None
+        self.top_likelihood_ratio = None
+
+    def reset(self):
+        self._grams = np.empty((0, self.n), dtype=np.uint32)
+        self._gram_counts = np.empty(0, dtype=np.int64)
+        self._gram_documents = np.empty(0, dtype=np.int64)
+        self._pending = []
+        self._pending_rows = 0
+        self.word_counts = np.empty(0, dtype=np.int64)
+        self.document_fd = nltk.FreqDist()
+
+    @property
+    def grams(self):
+        self._consolidate()
+        return self._grams
+
+    @property
+    def gram_counts(self):
+        self._consolidate()
+        return self._gram_counts
+
+    @property
+    def gram_documents(self):
+        self._consolidate()
+        return self._gram_documents
+
+    def partial_fit(self, word_bag):
+        """
+        Counts a batch of words. Ngrams do not span two batches.
+
+        Args:
+            word_bag: List of strings or IdBag. An IdBag is counted without decoding
+                when there are no modifiers
+        """
+        if isinstance(word_bag, IdBag) and not self.modifiers:
+            if self.vocabulary is None:
+                self.vocabulary = word_bag.vocabulary
+            assert(word_bag.vocabulary is self.vocabulary)
+            self._count(np.frombuffer(word_bag.ids, dtype=np.uint32))
+            return
+        NgramGetter.partial_fit(self, list(word_bag))
+
+    def merge(self, other):
+        """
+        Adds the counts of another IdNgramGetter with the same n and vocabulary
+
+        Args:
+            other: IdNgramGetter
+        Returns:
+            This getter
+        """
+        assert(isinstance(other, IdNgramGetter) and other.n == self.n)
+        if self.vocabulary is None:
+            self.vocabulary = other.vocabulary
+        assert(other.vocabulary is self.vocabulary or not len(other.word_counts))
+        self._merge_counts(other._counts())
+        return self
+
+    def process_bounded(self, word_bags, min_freq=3, get_top=10, max_entries=1000000):
+        raise NotImplementedError("IdNgramGetter counts into arrays; use partial_fit() in batches and calculate()")
+
+    def process_spilling(self, word_bags, min_freq=3, get_top=10, max_entries=1000000, directory=None):
+        raise NotImplementedError("IdNgramGetter counts into arrays; use partial_fit() in batches and calculate()")
+
+    def calculate(self, min_freq=3, get_top=10):
+        """
+        Computes topPMI, raw_freq and sorted_ngrams from the counts accumulated so far
+
+        Args:
+            get_top: The cut off for ngrams to get stats for
+            min_freq: Integer of minimum number of appearances of ngram to extract
+        """
+        keep = np.flatnonzero(self.gram_counts >= min_freq)
+        words = self.vocabulary.words if self.vocabulary is not None else []
+        ngrams = [tuple(words[i] for i in row) for row in self.grams[keep].tolist()]
+        predicates = [ftr.compile() for ftr in self.ngram_filters if not isinstance(ftr, WordFilter)]
+        if predicates:
+            passed = [j for j, ngram in enumerate(ngrams) if not any(drop(ngram) for drop in predicates)]
+            keep = keep[passed]
+            ngrams = [ngrams[j] for j in passed]
+        grams = self.grams[keep]
+        unigrams = [self.word_counts[grams[:, i]] for i in range(self.n)]
+        scorer = AssociationScorer(ngrams, self.gram_counts[keep], unigrams, int(self.word_counts.sum()))
+        self.topPMI = scorer.nbest('pmi', get_top)
+        self.raw_freq = scorer.score_ngrams('raw_freq')
+        self.sorted_ngrams = (ngram for ngram, score in self.raw_freq)
+        self.document_fd = nltk.FreqDist(dict(zip(ngrams, self.gram_documents[keep].tolist())))
+
+    def _prepare_documents(self, tweet_tuples):
+        """
+        Flattens the tweets into one id array plus the offsets where each tweet starts,
+        as in TweetTupleTable. A TweetTupleTable is used as is when there are no modifiers.
+
+        Returns:
+            Tuple of (array of ids, array of len(tweet_tuples) + 1 offsets)
+        """
+        if isinstance(tweet_tuples, TweetTupleTable) and not self.modifiers:
+            if self.vocabulary is None:
+                self.vocabulary = tweet_tuples.vocabulary
+            if tweet_tuples.vocabulary is self.vocabulary:
+                return (np.frombuffer(tweet_tuples.token_ids, dtype=np.uint32),
+                        np.frombuffer(tweet_tuples.offsets, dtype=np.uint64).astype(np.int64))
+        offsets = [0]
+        self.word_bag = []
+        for tweetid, words in tweet_tuples:
+            self.word_bag += words
+            offsets.append(len(self.word_bag))
+        self._run_modifiers()
+        if self.vocabulary is None:
+            self.vocabulary = Vocabulary()
+        ids = np.frombuffer(self.vocabulary.encode(self.word_bag), dtype=np.uint32)
+        return ids, np.array(offsets, dtype=np.int64)
+
+    def _document_shards(self, documents, chunksize):
+        ids, offsets = documents
+        for i in range(0, len(offsets) - 1, chunksize):
+            shard_offsets = offsets[i:i + chunksize + 1]
+            yield ids[shard_offsets[0]:shard_offsets[-1]], shard_offsets - shard_offsets[0]
+
+    def _count_documents(self, documents):
+        """
+        Counts every window of n ids which lies within a single tweet, along with the
+        number of distinct tweets each ngram appears in
+
+        Args:
+            documents: Tuple of (array of ids, array of tweet offsets) from _prepare_documents()
+        """
+        ids, offsets = documents
+        self._add_word_counts(np.bincount(ids))
+        if len(ids) < self.n:
+            return
+        windows = np.lib.stride_tricks.sliding_window_view(ids, self.n)
+        starts = np.arange(len(windows))
+        tweets = np.searchsorted(offsets, starts, side='right') - 1
+        inside = starts + self.n <= offsets[tweets + 1]
+        unfiltered = self._unfiltered(windows)
+        if unfiltered is not None:
+            inside &= unfiltered
+        windows = windows[inside]
+        tweets = tweets[inside]
+        unique_keys, first, inverse = np.unique(self._pack(windows), return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+        distinct = len(unique_keys)
+        counts = np.bincount(inverse, minlength=distinct)
+        # each (tweet, ngram) pair counts once towards the ngram's document frequency
+        pairs = np.unique(tweets * distinct + inverse)
+        documents = np.bincount(pairs % distinct, minlength=distinct)
+        self._add_gram_counts(windows[first], counts, documents)
+
+    def _counts(self):
+        return {'word_counts': self.word_counts, 'grams': self.grams,
+                'gram_counts': self.gram_counts, 'gram_documents': self.gram_documents}
+
+    def _merge_counts(self, counts):
+        self._add_word_counts(counts['word_counts'])
+        self._add_gram_counts(counts['grams'], counts['gram_counts'], counts['gram_documents'])
+
+    def _worker_copy(self):
+        worker = NgramGetter._worker_copy(self)
+        # workers only see ids, so the vocabulary stays behind and the filter words go as ids
+        worker._filter_ids = self._filtered_ids()
+        worker.vocabulary = None
+        return worker
+
+    def _filtered_ids(self):
+        """
+        Returns:
+            Array of the ids of the words of the WordFilters which are in the vocabulary
+        """
+        if self._filter_ids is not None:
+            return self._filter_ids
+        ids = []
+        if self.vocabulary is not None:
+            ids = [self.vocabulary.lookup(word) for ftr in self.ngram_filters if isinstance(ftr, WordFilter)
+                   for word in ftr.filter_words]
+        return np.array([i for i in ids if i is not None], dtype=np.uint32)
+
+    def _unfiltered(self, windows):
+        """
+        Args:
+            windows: Array of shape (m, n) of ids
+        Returns:
+            Boolean array marking the windows which contain none of the filter words, or
+            None when there is nothing to filter
+        """
+        ids = self._filtered_ids()
+        if not len(ids):
+            return None
+        return ~np.isin(windows, ids).any(axis=1)
+
+    def _count(self, words):
+        """
+        Args:
+            words: List of strings or array of ids
+        """
+        if not isinstance(words, np.ndarray):
+            if self.vocabulary is None:
+                self.vocabulary = Vocabulary()
+            words = np.frombuffer(self.vocabulary.encode(words), dtype=np.uint32)
+        self._add_word_counts(np.bincount(words))
+        if len(words) < self.n:
+            return
+        windows = np.lib.stride_tricks.sliding_window_view(words, self.n)
+        unfiltered = self._unfiltered(windows)
+        if unfiltered is not None:
+            windows = windows[unfiltered]
+        ones = np.ones(len(windows), dtype=np.int64)
+        self._add_gram_counts(*self._reduce_grams(windows, ones, np.zeros(len(windows), dtype=np.int64)))
+
+    def _add_word_counts(self, counts):
+        if len(counts) > len(self.word_counts):
+            self.word_counts = np.concatenate(
+                (self.word_counts, np.zeros(len(counts) - len(self.word_counts), dtype=np.int64)))
+        self.word_counts[:len(counts)] += counts
+
+    def _add_gram_counts(self, grams, counts, documents=None):
+        """
+        Queues distinct rows of ids with their counts and document frequencies for
+        grams, gram_counts and gram_documents. The queue is folded in once it holds
+        more rows than the table, so each row is sorted a logarithmic number of times
+        however many batches are added, or when the table is next read.
+        """
+        if documents is None:
+            documents = np.zeros(len(grams), dtype=np.int64)
+        self._pending.append((grams, counts, documents))
+        self._pending_rows += len(grams)
+        if self._pending_rows > max(len(self._grams), _PENDING_ROWS):
+            self._consolidate()
+
+    def _consolidate(self):
+        """
+        Folds the queued rows into the table
+        """
+        if not self._pending:
+            return
+        parts = [(self._grams, self._gram_counts, self._gram_documents)] + self._pending
+        self._pending = []
+        self._pending_rows = 0
+        self._grams, self._gram_counts, self._gram_documents = self._reduce_grams(
+            *[np.concatenate(column) for column in zip(*parts)])
+
+    def _reduce_grams(self, grams, counts, documents):
+        """
+        Returns:
+            Tuple of (distinct rows of grams, total count of each, total document frequency of each)
+        """
+        unique_keys, first, inverse = np.unique(self._pack(grams), return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+        return (grams[first],
+                np.bincount(inverse, weights=counts, minlength=len(unique_keys)).astype(np.int64),
+                np.bincount(inverse, weights=documents, minlength=len(unique_keys)).astype(np.int64))
+
+    def _pack(self, grams):
+        """
+        Args:
+            grams: Array of shape (m, n) of ids
+        Returns:
+            Array of m keys which compare equal exactly when the rows do
+        """
+        bits = max(int(len(self.word_counts) - 1).bit_length(), 1)
+        if bits * self.n <= 63:
+            keys = np.zeros(len(grams), dtype=np.int64)
+            for column in range(self.n):
+                keys <<= bits
+                keys |= grams[:, column].astype(np.int64)
+            return keys
+        grams = np.ascontiguousarray(grams, dtype=np.uint32)
+        return grams.view(np.dtype((np.void, 4 * self.n))).ravel()
+
+
+# The getter installed in each pool process by _init_ngram_worker
+_worker_ngram_getter = None
+
+
+def _init_ngram_worker(getter):
+    """
+    Pool initializer for NgramGetter.partial_fit_documents. Stores the configured
+    getter so that it is shipped once per process rather than once per shard
+    """
+    global _worker_ngram_getter
+    _worker_ngram_getter = getter
+
+
+def _count_document_shard(shard):
+    """
+    Args:
+        shard: One shard of tweets from NgramGetter._document_shards
+    Returns:
+        Dictionary of the counts of the shard, see NgramGetter._counts
+    """
+    _worker_ngram_getter.reset()
+    _worker_ngram_getter._count_documents(shard)
+    return _worker_ngram_getter._counts()
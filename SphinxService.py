@@ -23,7 +23,9 @@ class SphinxSearch(SphinxClient, IOMService):
         # connect to server
         self.SetServer(HOST, PORT)
         #set the number of docs returned to be greater than the number we have (first argument is the offset)
-        self.SetLimits(0, 5000, 5000)
+        #iter_search pages past this instead of stopping at it
+        self.max_results = 5000
+        self.SetLimits(0, self.max_results, self.max_results)
         # known searchd status codes
         SEARCHD_OK = 0
         SEARCHD_ERROR = 1
@@ -162,12 +164,9 @@ class SphinxSearch(SphinxClient, IOMService):
                 exit
             #Store string in property for use elsewhere
             self.search_string = search_string
-            #run search
-            self.search_results = self.Query(search_string, self.index_for_search);
-            #error handler
-            self.sphinxErrorHandler();
-            #construct an array of quote/response id's
-            [self.resultIDs.append(m['id']) for m in self.search_results['matches']]
+            #run search, a page at a time so that nothing past max_results is dropped
+            #and construct an array of quote/response id's
+            self.resultIDs.extend(self.iter_search(search_string))
 
         ##get information on the occurance of the string
         #self.num_docs_w_term = self.search_results['docs']
@@ -180,22 +179,102 @@ class SphinxSearch(SphinxClient, IOMService):
             print('search failed')
             self.sphinxErrorHandler();
 
-    def getContent(self):
+    def iter_search(self, search_string, page_size=None):
+        """
+        Runs the search one page of page_size matches at a time and yields the ids of the
+        matches as each page arrives, until searchd has no more. The last page's result
+        is left in self.search_results. Note that searchd will not return more than its
+        max_matches setting in total.
+
+        @param search_string A term or set of terms using sphinx extended search syntax
+        @param page_size Number of matches per Query. Defaults to self.max_results
+        @return: Generator of the matching quoteID/RMIndex ids
+        """
+        if page_size is None:
+            page_size = self.max_results
+        offset = 0
+        try:
+            while True:
+                self.SetLimits(offset, page_size, offset + page_size)
+                self.search_results = self.Query(search_string, self.index_for_search) or 'FALSE'
+                self.sphinxErrorHandler()
+                if self.search_results == 'FALSE':
+                    return
+                matches = self.search_results['matches']
+                for m in matches:
+                    yield m['id']
+                offset += len(matches)
+                # 'total' is capped at the max_matches of this page, so only total_found
+                # says how many matches there are in all
+                if len(matches) < page_size or offset >= self.search_results['total_found']:
+                    return
+        finally:
+            #back to the limits set in __init__
+            self.SetLimits(0, self.max_results, self.max_results)
+
+    def search_many(self, search_strings):
+        """
+        Runs the searches for a list of strings (e.g., variants of a term) in one round trip
+        to searchd by queueing them with AddQuery and sending them with RunQueries. The ids
+        of the matches of all the searches are added to self.resultIDs, each once.
+
+        @param search_strings List of strings using sphinx extended search syntax
+        @return: Dictionary mapping each search string to the list of ids it matched
+        """
+        found = {}
+        for search_string in search_strings:
+            self.AddQuery(search_string, self.index_for_search)
+        self.search_results = self.RunQueries() or 'FALSE'
+        self.sphinxErrorHandler()
+        if self.search_results == 'FALSE':
+            return found
+        seen = set(self.resultIDs)
+        for search_string, result in zip(search_strings, self.search_results):
+            if result.get('error'):
+                print('search for %s failed: %s' % (search_string, result['error']))
+            found[search_string] = [m['id'] for m in result.get('matches', [])]
+            for idnum in found[search_string]:
+                if idnum not in seen:
+                    seen.add(idnum)
+                    self.resultIDs.append(idnum)
+        return found
+
+    def getContent(self, batch_size=500):
+        """
+        Fetches the rows for the search hits in self.resultIDs into self.result_content,
+        batch_size ids per SELECT ... WHERE quoteID IN (...) query rather than one query
+        per hit. The rows are put back in the order sphinx returned the hits.
+
+        @param batch_size Number of ids per query
+        """
         try:
             #self.sel = mysql_select_db(self.searchDB) or die(mysql_error());
-            for idnum in self.resultIDs:
-                self.query = "SELECT quoteID, quoteText FROM testimony_all WHERE quoteID = %s"
-                #self.query = "SELECT * FROM %%s WHERE %%s = %idnum" % (self.table_to_search, self.table_search_prim_key)
-                self.val = [idnum]
+            rows = {}
+            for start in range(0, len(self.resultIDs), batch_size):
+                batch = self.resultIDs[start:start + batch_size]
+                self.query = "SELECT quoteID, quoteText FROM testimony_all WHERE quoteID IN (%s)" % ', '.join(
+                    ['%s'] * len(batch))
+                #self.query = "SELECT * FROM %%s WHERE %%s IN (...)" % (self.table_to_search, self.table_search_prim_key)
+                self.val = batch
                 self.returnAll()
-                self.result_content.append(self.results[0])
+                for row in self.results:
+                    rows[row['quoteID']] = row
+            for idnum in self.resultIDs:
+                if idnum in rows:
+                    self.result_content.append(rows[idnum])
         except:
             print('Getting content failed')
 
-    def buildExcerpts(self):
+    def buildExcerpts(self, batch_size=1000):
         """
         Note that exact phrase is set to true because I have a comprehensive list of variations.
         For projects which draw from other sources, this may need to be set to false
+
+        Sends the texts in self.result_content to searchd batch_size documents per
+        BuildExcerpts call. BuildExcerpts returns the excerpts in the order of the
+        documents, which is how they are paired back up with their quoteIDs.
+
+        @param batch_size Number of documents per BuildExcerpts call
         """
         try:
             self.excerpt_options = {'exact_phrase': 'true',
@@ -204,10 +283,12 @@ class SphinxSearch(SphinxClient, IOMService):
                                     'after_match': '~',
                                     'around': 5000,
                                     'limit': 1000000}
-            for r in self.result_content:
-                ex = self.BuildExcerpts([r['quoteText']], self.excerpt_index, self.search_string, self.excerpt_options)
-                d = {'quoteID': r['quoteID'], 'quoteText': ex[0]}
-                self.excerpts.append(d)
+            for start in range(0, len(self.result_content), batch_size):
+                batch = self.result_content[start:start + batch_size]
+                ex = self.BuildExcerpts([r['quoteText'] for r in batch], self.excerpt_index, self.search_string,
+                                        self.excerpt_options)
+                for r, excerpt in zip(batch, ex):
+                    self.excerpts.append({'quoteID': r['quoteID'], 'quoteText': excerpt})
         except:
             self.sphinxErrorHandler()
             print('Failed to build excerpts')
@@ -238,21 +319,38 @@ class SphinxSearch(SphinxClient, IOMService):
             return self.masked
 
 
-    def insertExcerpts(self):
+    def insertExcerpts(self, batch_size=1000):
+        """
+        Writes the (quoteID, quoteText) pairs in self.excerpts to self.table_to_insert_masked,
+        batch_size rows per INSERT statement. After mask_term these are the masked texts.
+        If there are no excerpts yet they are built first, in which case the unmasked
+        excerpts, with the search term marked as ~term~, are what gets written.
+
+        @param batch_size Number of rows per multi-row INSERT
+        """
         #excerpt_options = array('exact_phrase' => 'true', 'before_match' => '<span class="mask"><strong>', 'after_match' => '</strong></span>', 'around' => 5000, 'limit' => 1000000);
-        for recid, text in self.result_content:
-            ex = self.BuildExcerpts(text, self.excerpt_index, self.search_string, self.excerpt_options)
-            for k, v in ex:
-                self.query = "INSERT INTO %%s  (%%s, %%s) VALUES(%s, %s)" % (
-                self.table_to_insert_masked, self.table_masked_prim_key, self.table_masked_content)
-                self.val = [k, v]
-                self.executeQuery()
+        if not self.excerpts:
+            self.buildExcerpts()
+        rows = [[e['quoteID'], e['quoteText']] for e in self.excerpts]
+        self.query = "INSERT INTO %s (%s, %s) VALUES " % (
+            self.table_to_insert_masked, self.table_masked_prim_key, self.table_masked_content)
+        self._insert_rows(rows, batch_size)
 
-            #		/* This is a serious hack. The excerpt array doesn't hold the quoteID. So I'm relying on the
-            #		array having the same order as the results array and stepping through it with the update query.
-        i = 0;
-        for idnum in self.resultIDs:
-            self.query = "UPDATE quotes_masked SET quoteID = %s WHERE questionNumber = %s"
-            self.val = [idnum, i]
-            self.executeQuery
-            i = i + 1
\ No newline at end of file
+    def _insert_rows(self, rows, batch_size=1000):
+        """
+        Runs the INSERT in self.query (up to and including VALUES) for every row,
+        sending one multi-row INSERT ... VALUES (%s, %s), (%s, %s), ... per batch_size
+        rows through executeQuery
+
+        @param rows List of lists of values, one per row
+        @param batch_size Number of rows per statement
+        """
+        if not rows:
+            return
+        prefix = self.query
+        row_placeholders = '(%s)' % ', '.join(['%s'] * len(rows[0]))
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            self.query = prefix + ', '.join([row_placeholders] * len(batch))
+            self.val = [value for row in batch for value in row]
+            self.executeQuery()
@@ -0,0 +1,421 @@
+"""
+This contains counters which bound the memory used to count items in a stream.
+
+LossyCounter trades exactness for a fixed amount of memory and reports the largest
+error it may have introduced, so that callers can tell whether the counts they get
+back are good enough or need an exact recount of the surviving candidates.
+SpillingCounter stays exact by moving counts out to sorted runs on disk.
+SpaceSavingCounter keeps a fixed number of counters for the most frequent items.
+"""
+import heapq
+import pickle
+import tempfile
+from collections import Counter
+from itertools import islice
+from operator import itemgetter
+
+# Number of (item, count) pairs pickled together in a spilled run
+_RUN_BLOCK = 10000
+
+
+class LossyCounter(object):
+    """
+    Lossy counting (Manku and Motwani 2002) with an optional cap on the number of
+    entries held. Items whose count cannot exceed the current error bound are
+    periodically pruned; an item added after a prune is given a delta equal to
+    the error bound at that moment, the most it could have been undercounted.
+
+    For every item:
+        count(item) <= true count <= count(item) + delta(item) <= count(item) + error
+    and any item which is no longer held has a true count of at most error.
+
+    With epsilon, the error stays below epsilon * total. With max_entries, the
+    table is pruned down to half of max_entries whenever it grows past it and the
+    error rises by as much as that takes.
+    Example:
+        counter = LossyCounter(max_entries=1000000)
+        for tweet in tweets:
+            counter.update(zip(tweet, tweet[1:]))
+        candidates = counter.candidates(3)
+
+    Attributes:
+        epsilon: Fraction of the total by which a count may fall short, or None
+        max_entries: Largest number of entries to hold, or None
+        total: Number of items counted
+        error: Largest amount by which any count may fall short of the truth
+        counts: Dictionary of the count of each held item since it was last added
+        deltas: Dictionary of the delta of each held item added after a prune
+    """
+
+    def __init__(self, epsilon=None, max_entries=None):
+        """
+        Args:
+            epsilon: Error bound as a fraction of the number of items counted
+            max_entries: Memory budget as a number of table entries
+        """
+        assert(epsilon is not None or max_entries is not None)
+        self.epsilon = epsilon
+        self.max_entries = max_entries
+        self.total = 0
+        self.error = 0
+        self.counts = {}
+        self.deltas = {}
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __contains__(self, item):
+        return item in self.counts
+
+    def update(self, items):
+        """
+        Counts a batch of items. Pruning happens between batches. With max_entries, the
+        batch is counted in slices of max_entries // 4 items and the table is shrunk
+        whenever the next slice might not fit, so even one large batch never makes it
+        hold more than max_entries items.
+
+        Args:
+            items: Iterable of hashable items
+        """
+        if self.max_entries is None:
+            self._update(items)
+            return
+        items = iter(items)
+        step = max(self.max_entries // 4, 1)
+        while True:
+            batch = list(islice(items, step))
+            if not batch:
+                return
+            self._update(batch)
+            if len(self.counts) > self.max_entries - step:
+                self._shrink(self.max_entries // 2)
+
+    def _update(self, items):
+        batch = Counter(items)
+        counts = self.counts
+        error = self.error
+        for item, count in batch.items():
+            if item in counts:
+                counts[item] += count
+            else:
+                counts[item] = count
+                if error:
+                    self.deltas[item] = error
+        self.total += sum(batch.values())
+        if self.epsilon is not None and int(self.epsilon * self.total) > self.error:
+            self.prune(int(self.epsilon * self.total))
+
+    def prune(self, threshold):
+        """
+        Drops every item whose upper bound is at most threshold and raises the error to threshold
+
+        Args:
+            threshold: Integer count
+        """
+        deltas = self.deltas
+        for item in [item for item, count in self.counts.items() if count + deltas.get(item, 0) <= threshold]:
+            del self.counts[item]
+            deltas.pop(item, None)
+        self.error = max(self.error, threshold)
+
+    def count(self, item):
+        """
+        Returns:
+            The lower bound on the count of item
+        """
+        return self.counts.get(item, 0)
+
+    def upper_bound(self, item):
+        """
+        Returns:
+            The upper bound on the count of item
+        """
+        if item in self.counts:
+            return self.counts[item] + self.deltas.get(item, 0)
+        return self.error
+
+    def candidates(self, min_count):
+        """
+        Args:
+            min_count: Integer count
+        Returns:
+            Set of the held items whose true count may be min_count or more. It contains
+            every item whose true count is at least min_count as long as error < min_count
+        """
+        deltas = self.deltas
+        return set(item for item, count in self.counts.items() if count + deltas.get(item, 0) >= min_count)
+
+    def _shrink(self, keep):
+        """
+        Prunes at the lowest threshold which leaves at most keep entries
+        """
+        deltas = self.deltas
+        bounds = heapq.nlargest(keep + 1, (count + deltas.get(item, 0) for item, count in self.counts.items()))
+        self.prune(max(bounds[-1], self.error))
+
+
+class SpillingCounter(object):
+    """
+    Exact counter for more distinct items than fit in memory. Counts are kept in a
+    Counter until it holds more than max_entries items; the counts are then written
+    to a temporary file as a run sorted by item and the Counter starts over.
+    items() k-way merges the runs with what is still in memory, adding up the counts
+    of each item as it goes. Items must be sortable (e.g., tuples of strings).
+    So that the number of open run files stays bounded, once there are max_runs
+    runs they are merged into a single run before counting goes on.
+    Example:
+        with SpillingCounter(max_entries=5000000) as counter:
+            for tweet in tweets:
+                counter.update(zip(tweet, tweet[1:]))
+            frequent = [(bigram, count) for bigram, count in counter.items() if count >= 3]
+
+    Attributes:
+        max_entries: Largest number of items held in memory
+        directory: Directory for the run files, or None for the system default
+        max_runs: Largest number of run files held open at once
+        counts: Counter of the items counted since the last spill
+        runs: List of the open temporary files holding the spilled runs
+    """
+
+    def __init__(self, max_entries=1000000, directory=None, max_runs=64):
+        """
+        Args:
+            max_entries: Memory budget as a number of distinct items
+            directory: Directory for the run files
+            max_runs: Fan-in limit of the merge, at least 2
+        """
+        assert(max_runs >= 2)
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_runs = max_runs
+        self.counts = Counter()
+        self.runs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def update(self, items):
+        """
+        Args:
+            items: Iterable of hashable, sortable items
+        """
+        self.counts.update(items)
+        if len(self.counts) > self.max_entries:
+            self.spill()
+
+    def spill(self):
+        """
+        Writes the in-memory counts to a new sorted run and clears them
+        """
+        if not self.counts:
+            return
+        self.runs.append(self._write_run(sorted(self.counts.items())))
+        self.counts = Counter()
+        if len(self.runs) >= self.max_runs:
+            self._compact()
+
+    def _compact(self):
+        """
+        Merges all the runs into one
+        """
+        run = self._write_run(self._merge([self._read_run(run) for run in self.runs]))
+        self.close()
+        self.runs = [run]
+
+    def _write_run(self, pairs):
+        """
+        Args:
+            pairs: Iterable of (item, count) tuples in item order
+        Returns:
+            Temporary file holding the pairs in blocks of _RUN_BLOCK
+        """
+        run = tempfile.TemporaryFile(dir=self.directory)
+        pairs = iter(pairs)
+        while True:
+            block = list(islice(pairs, _RUN_BLOCK))
+            if not block:
+                break
+            pickle.dump(block, run, pickle.HIGHEST_PROTOCOL)
+        run.flush()
+        return run
+
+    def items(self):
+        """
+        Only one items() generator should be consumed at a time, since they share the run files.
+
+        Returns:
+            Generator of (item, count) tuples in item order, one per distinct item
+        """
+        streams = [self._read_run(run) for run in self.runs]
+        streams.append(iter(sorted(self.counts.items())))
+        return self._merge(streams)
+
+    @staticmethod
+    def _merge(streams):
+        """
+        Args:
+            streams: List of iterables of (item, count) tuples, each in item order
+        Returns:
+            Generator of (item, count) tuples in item order with the counts of each item added up
+        """
+        current = None
+        total = 0
+        for item, count in heapq.merge(*streams, key=itemgetter(0)):
+            if total and item == current:
+                total += count
+                continue
+            if total:
+                yield current, total
+            current = item
+            total = count
+        if total:
+            yield current, total
+
+    def close(self):
+        """
+        Deletes the run files
+        """
+        for run in self.runs:
+            run.close()
+        self.runs = []
+
+    @staticmethod
+    def _read_run(run):
+        run.seek(0)
+        while True:
+            try:
+                block = pickle.load(run)
+            except EOFError:
+                return
+            for pair in block:
+                yield pair
+
+
+class SpaceSavingCounter(object):
+    """
+    Space-Saving heavy hitters (Metwally, Agrawal and El Abbadi 2005). Holds at most
+    capacity counters. An unseen item takes over the counter of the item with the
+    smallest count and inherits that count as its error, so for every held item:
+        count(item) - error(item) <= true count <= count(item)
+    Any item seen more than total / capacity times is held. The smallest counter is
+    found with a lazy heap: counts only grow, so a heap entry can only be stale low;
+    when the minimum is needed, stale entries are refreshed until the top is current.
+    Example:
+        counter = SpaceSavingCounter(1000)
+        for batch in stream:
+            counter.update(batch)
+        counter.top(100)
+
+    Attributes:
+        capacity: Largest number of items held
+        total: Number of items counted
+        counts: Dictionary of the count of each held item (an upper bound)
+        errors: Dictionary of how much each held item's count may overstate the truth
+    """
+
+    def __init__(self, capacity):
+        """
+        Args:
+            capacity: Number of counters
+        """
+        assert(capacity > 0)
+        self.capacity = capacity
+        self.total = 0
+        self.counts = {}
+        self.errors = {}
+        self._heap = []
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __contains__(self, item):
+        return item in self.counts
+
+    def update(self, items):
+        """
+        Counts a batch of items. Repeats within the batch are added up first, which
+        the weighted form of the algorithm allows without loosening the bounds.
+
+        Args:
+            items: Iterable of hashable items
+        """
+        counts = self.counts
+        heap = self._heap
+        for item, weight in Counter(items).items():
+            self.total += weight
+            if item in counts:
+                counts[item] += weight
+            elif len(counts) < self.capacity:
+                counts[item] = weight
+                self.errors[item] = 0
+                heapq.heappush(heap, (weight, item))
+            else:
+                smallest, evicted = self._pop_min()
+                del counts[evicted]
+                del self.errors[evicted]
+                counts[item] = smallest + weight
+                self.errors[item] = smallest
+                heapq.heappush(heap, (smallest + weight, item))
+
+    @property
+    def min_count(self):
+        """
+        The smallest held count. No item which is not held was seen more often than this;
+        0 until every counter is in use
+        """
+        if len(self.counts) < self.capacity:
+            return 0
+        count, item = self._pop_min()
+        heapq.heappush(self._heap, (count, item))
+        return count
+
+    def bounds(self, item):
+        """
+        Returns:
+            Tuple of (lower, upper) bounds on the true count of item
+        """
+        if item in self.counts:
+            return self.counts[item] - self.errors[item], self.counts[item]
+        return 0, self.min_count
+
+    def top(self, number):
+        """
+        Args:
+            number: How many items to return
+        Returns:
+            List of (item, count, error) tuples for the held items with the highest counts.
+            Ties are ordered by item
+        """
+        counts = self.counts
+        best = heapq.nsmallest(number, counts, key=lambda item: (-counts[item], item))
+        return [(item, counts[item], self.errors[item]) for item in best]
+
+    def top_is_exact(self, number):
+        """
+        Args:
+            number: Size of the top list
+        Returns:
+            True when the items of top(number) are guaranteed to be the true top number items,
+            i.e., each of their lower bounds is at least the count of the next item
+        """
+        ranked = self.top(number + 1)
+        if len(ranked) <= number:
+            return self.min_count == 0
+        next_count = ranked[number][1]
+        return all(count - error >= next_count for item, count, error in ranked[:number])
+
+    def _pop_min(self):
+        """
+        Returns:
+            Tuple of (count, item) for the held item with the smallest count, removed from the heap
+        """
+        heap = self._heap
+        counts = self.counts
+        while True:
+            count, item = heapq.heappop(heap)
+            if counts[item] == count:
+                return count, item
+            heapq.heappush(heap, (counts[item], item))
@@ -1,14 +1,25 @@
 """
 Not sure whose work this is based on! Ack.
 """
-# import re, csv, yaml, enchant
 import re
 import csv
+import os
+import pickle
+from array import array
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    # python < 3.11
+    import sre_parse
 
 import yaml
 from nltk.corpus import wordnet
+from nltk.corpus.reader.wordnet import WordNetCorpusReader, POS_LIST
 from nltk.metrics import edit_distance
 
+from MappedTables import MappedSortedTable
+
 
 #################################################
 # Replacing Words Matching Regular Expressions #
@@ -32,6 +43,119 @@ punctuation_patterns = [
 ]
 
 
+def required_literal(regex, flags=0):
+    r""" Returns the longest run of literal characters which every match of the
+    regex must contain, or '' if none can be found. The runs are read off the
+    top level of the parsed pattern, where only consecutive LITERAL nodes count:
+    repeats (including {m,n}), escapes such as \x41 and \N{...}, groups and
+    alternations all end a run, so the answer is conservative. Pass the flags the
+    regex is compiled with, since e.g. re.VERBOSE changes what is literal.
+    >>> required_literal(r"(\w+)n\'t")
+    "n't"
+    >>> required_literal(r'colou?r')
+    'colo'
+    >>> required_literal(r'cat|dog')
+    ''
+    """
+    runs = []
+    run = ''
+    for op, av in sre_parse.parse(regex, flags):
+        if op is sre_parse.LITERAL:
+            run += chr(av)
+        else:
+            runs.append(run)
+            run = ''
+    runs.append(run)
+    return max(runs, key=len)
+
+
+class RegexpReplacementEngine(object):
+    """ Applies an ordered list of (pattern, replacement) pairs to a string with
+    exactly the result of calling subn for each pattern in turn, without a pass
+    over the string for every pattern.
+
+    Each pattern gets a literal trigger: a substring which every match of it must
+    contain (e.g. "n't"). A pattern only runs if its trigger occurs in the current
+    string, which is a plain substring test, so a string with no apostrophe skips
+    all the contraction patterns almost for free. Patterns without a trigger are
+    merged into one alternation with a named group per pattern and the string is
+    scanned once with it. While the string is unchanged and that scan found nothing,
+    those patterns are skipped. Patterns are never substituted in a single merged
+    pass because that would change the result whenever they overlap ("swon't" is
+    "swill not" sequentially, not "swo not").
+    >>> engine = RegexpReplacementEngine(replacement_patterns)
+    >>> engine.replace("I won't, they'll")
+    'I will not, they will'
+
+    Attributes:
+        rules: Tuple of (compiled pattern, replacement, trigger) tuples in order of application.
+            The trigger is '' for patterns without one
+        gate: Compiled alternation of the patterns without a trigger, or None if there are
+            fewer than two of them or they cannot be merged
+    """
+
+    def __init__(self, patterns=()):
+        """
+        :param patterns: Iterable of (regex, replacement) tuples. The regex may be a string or compiled
+        """
+        self.rules = ()
+        self.gate = None
+        self.add_patterns(patterns)
+
+    def add_patterns(self, patterns):
+        """
+        Appends replacement patterns to the end of the sequence and recompiles the gate
+        :param patterns: Iterable of (regex, replacement) tuples
+        """
+        rules = list(self.rules)
+        for regex, repl in patterns:
+            pattern = re.compile(regex)
+            trigger = ''
+            if isinstance(pattern.pattern, str) and not pattern.flags & re.IGNORECASE:
+                trigger = required_literal(pattern.pattern, pattern.flags)
+            rules.append((pattern, repl, trigger))
+        self.rules = tuple(rules)
+        self.gate = self._compile_gate()
+
+    def _compile_gate(self):
+        """
+        Merges the patterns without a trigger into one alternation with a named group
+        per pattern. Patterns with back references or differing flags cannot be merged
+        safely, in which case there is no gate.
+        """
+        untriggered = [pattern for pattern, repl, trigger in self.rules if not trigger]
+        if len(untriggered) < 2:
+            return None
+        flags = set(pattern.flags for pattern in untriggered)
+        sources = [pattern.pattern for pattern in untriggered]
+        if len(flags) > 1 or any(isinstance(p, bytes) or re.search(r'\\\d|\(\?P=|\(\?[aiLmsux-]', p) for p in sources):
+            return None
+        alternation = '|'.join('(?P<p%d>%s)' % (i, p) for i, p in enumerate(sources))
+        try:
+            return re.compile(alternation, flags.pop())
+        except re.error:
+            return None
+
+    def replace(self, text):
+        """
+        :param text: String to apply the replacements to
+        :return: The string after every pattern has been applied in order
+        """
+        s = text
+        changed = False
+        untriggered_may_match = self.gate is None or self.gate.search(text) is not None
+        for pattern, repl, trigger in self.rules:
+            if trigger:
+                if trigger not in s:
+                    continue
+            elif not (untriggered_may_match or changed):
+                continue
+            s, count = pattern.subn(repl, s)
+            if count:
+                changed = True
+        return s
+
+
 class RegexpReplacer(object):
     """ Replaces regular expression in a text.
     >>> replacer = RegexpReplacer()
@@ -43,22 +167,19 @@ class RegexpReplacer(object):
 
     def __init__(self, patterns=replacement_patterns):
         self.patterns = [(re.compile(regex), repl) for (regex, repl) in patterns]
+        self.engine = RegexpReplacementEngine(self.patterns)
 
     def add_replacement_pattern(self, replacement_pattern):
         """
         Pushes an additional replacment pattern tuple into the list to apply
         :param tuple replacement_pattern: Tuple with format (regex expression, string to insert)
         """
-        new_pattern = re.compile(replacement_pattern[0], replacement_pattern[1])
+        new_pattern = (re.compile(replacement_pattern[0]), replacement_pattern[1])
         self.patterns.append(new_pattern)
+        self.engine.add_patterns([new_pattern])
 
     def replace(self, text):
-        s = text
-
-        for (pattern, repl) in self.patterns:
-            (s, count) = re.subn(pattern, repl, s)
-
-        return s
+        return self.engine.replace(text)
 
 
 class PunctuationReplacer(object):
@@ -67,18 +188,130 @@ class PunctuationReplacer(object):
 
     def __init__(self, patterns=punctuation_patterns):
         self.patterns = [(re.compile(regex), repl) for (regex, repl) in patterns]
+        self.engine = RegexpReplacementEngine(self.patterns)
 
     def replace(self, text):
-        s = text
-        for (pattern, repl) in self.patterns:
-            (s, count) = re.subn(pattern, repl, s)
-        return s
+        return self.engine.replace(text)
 
 
 ##################################
 # Replacing Repeating Characters #
 ##################################
 
+class PickledResource(object):
+    """ Base for lookup tables which are expensive to build but cheap to load
+    once pickled. Subclasses implement build().
+    """
+
+    @classmethod
+    def build(cls, **kwargs):
+        raise NotImplementedError
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: File written by save()
+        """
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    @classmethod
+    def load_or_build(cls, path=None, **kwargs):
+        """
+        Loads the table from path if it exists. Otherwise builds it and, if a
+        path was given, saves it there for next time
+        :param path: Location of the persisted table or None
+        :param kwargs: Passed to build()
+        """
+        if path is not None and os.path.exists(path):
+            return cls.load(path)
+        resource = cls.build(**kwargs)
+        if path is not None:
+            resource.save(path)
+        return resource
+
+    def save(self, path):
+        """
+        :param path: File to write the table to
+        """
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+
+
+class WordNetResource(PickledResource):
+    """ Base for lookup tables which are expensive to build from the wordnet corpus
+    but cheap to load once pickled. Subclasses implement build().
+    """
+
+
+class WordNetLexicon(WordNetResource):
+    """ In-memory answer to "would wordnet.synsets(word) find anything?".
+    Holds the wordnet lemma names and morphological exception forms for each part
+    of speech in frozensets and applies morphy's suffix rules as set lookups,
+    so checking a word never touches the corpus reader. Build it once with
+    build() and persist it with save() so later runs only need load().
+    >>> lexicon = WordNetLexicon({'n': ['kiss', 'love']}, {'v': {'went': ['go']}})
+    >>> 'kisses' in lexicon
+    True
+    >>> 'loooove' in lexicon
+    False
+
+    Attributes:
+        lemmas: Dictionary mapping each wordnet pos to a frozenset of its lemma names
+        exception_forms: Dictionary mapping each pos to a frozenset of the forms in its exception list
+        exception_hits: Dictionary mapping each pos to a frozenset of the exception forms whose
+            base forms include a lemma of that pos
+    """
+
+    def __init__(self, lemmas, exceptions=None):
+        """
+        :param lemmas: Dictionary mapping pos to an iterable of lemma names
+        :param exceptions: Dictionary mapping pos to a dictionary of {inflected form: [base forms]}
+        """
+        exceptions = exceptions or {}
+        self.lemmas = {}
+        self.exception_forms = {}
+        self.exception_hits = {}
+        for pos in POS_LIST:
+            lemmas_for_pos = frozenset(lemmas.get(pos, ()))
+            exceptions_for_pos = exceptions.get(pos, {})
+            self.lemmas[pos] = lemmas_for_pos
+            self.exception_forms[pos] = frozenset(exceptions_for_pos)
+            self.exception_hits[pos] = frozenset(
+                form for form, bases in exceptions_for_pos.items()
+                if form in lemmas_for_pos or any(b in lemmas_for_pos for b in bases))
+
+    @classmethod
+    def build(cls):
+        """
+        Reads the lemma names and exception lists out of the wordnet corpus. Slow; do it once and save()
+        :return: WordNetLexicon
+        """
+        lemmas = dict((pos, list(wordnet.all_lemma_names(pos))) for pos in POS_LIST)
+        # the exception lists have no public accessor
+        exceptions = dict((pos, wordnet._exception_map[pos]) for pos in POS_LIST)
+        return cls(lemmas, exceptions)
+
+    def __contains__(self, word):
+        """
+        Mirrors wordnet.synsets(): lower cases the word and, for each pos, checks the
+        word itself and either its exception list entry or morphy's suffix substitutions
+        """
+        word = word.lower()
+        for pos in POS_LIST:
+            lemmas = self.lemmas[pos]
+            if word in lemmas:
+                return True
+            if word in self.exception_forms[pos]:
+                if word in self.exception_hits[pos]:
+                    return True
+                continue
+            for old, new in WordNetCorpusReader.MORPHOLOGICAL_SUBSTITUTIONS[pos]:
+                if word.endswith(old) and word[:-len(old)] + new in lemmas:
+                    return True
+        return False
+
+
 class RepeatReplacer(object):
     """ Removes repeating characters until a valid word is found.
     >>> replacer = RepeatReplacer()
@@ -88,56 +321,253 @@ class RepeatReplacer(object):
     'ooh'
     >>> replacer.replace('goose')
     'goose'
+
+    Words are checked against a WordNetLexicon rather than by calling wordnet.synsets()
+    at every step, and the result for each input word is memoized.
     """
 
-    def __init__(self):
+    def __init__(self, lexicon=None, lexicon_path=None):
+        """
+        :param lexicon: WordNetLexicon to check words against
+        :param lexicon_path: Where to load the lexicon from (or save it to once built) if
+            lexicon is not given. Without either the lexicon is built from wordnet on first use
+        """
         self.repeat_regexp = re.compile(r'(\w*)(\w)\2(\w*)')
         self.repl = r'\1\2\3'
+        self._lexicon = lexicon
+        self.lexicon_path = lexicon_path
+        self._replaced = {}
+
+    @property
+    def lexicon(self):
+        if self._lexicon is None:
+            self._lexicon = WordNetLexicon.load_or_build(self.lexicon_path)
+        return self._lexicon
 
     def replace(self, word):
-        if wordnet.synsets(word):
-            return word
+        try:
+            return self._replaced[word]
+        except KeyError:
+            repl_word = self._collapse(word)
+            self._replaced[word] = repl_word
+            return repl_word
 
-        repl_word = self.repeat_regexp.sub(self.repl, word)
+    def replace_many(self, words):
+        """
+        :param words: List of strings
+        :return: List with the repeats removed from each string
+        """
+        replace = self.replace
+        return [replace(w) for w in words]
 
-        if repl_word != word:
-            return self.replace(repl_word)
-        else:
-            return repl_word
+    def _collapse(self, word):
+        """
+        Removes one repeated character at a time until the word is in the lexicon
+        or there are no repeats left
+        """
+        lexicon = self.lexicon
+        while word not in lexicon:
+            repl_word = self.repeat_regexp.sub(self.repl, word)
+            if repl_word == word:
+                break
+            word = repl_word
+        return word
 
 
 ####################################
-# Spelling Correction with Enchant #
+# Spelling Correction              #
 ####################################
 
-class SpellingReplacer(object):
-    """ Replaces misspelled words with a likely suggestion based on shortest
-    edit distance.
-    >>> replacer = SpellingReplacer()
-    >>> replacer.replace('cookbok')
+class SymSpellIndex(PickledResource):
+    """ Symmetric delete spelling index (as in SymSpell). Every dictionary word
+    is stored under each string obtainable by deleting up to max_dist of the
+    characters of its first prefix_length characters. Two words within edit
+    distance max_dist share such a string, so the candidates for a misspelling
+    are found by generating its own deletes and looking them up, with no scan of
+    the dictionary. Capping the deletes at a prefix keeps the index for a full
+    dictionary small; build it once and persist it with save() (see load_or_build()).
+    >>> index = SymSpellIndex({'cookbook': 5, 'book': 20})
+    >>> index.lookup('cookbok')
     'cookbook'
+    >>> index.lookup('xyzzy')
+
+    Attributes:
+        max_dist: Largest edit distance the index can answer for
+        prefix_length: Number of leading characters of each word the deletes are made from
+        frequencies: Dictionary mapping each dictionary word to its frequency. Used to break ties
+        deletes: Dictionary mapping each delete string to the list of words which produce it
     """
 
-    def __init__(self, dict_name='en', max_dist=2):
-        self.spell_dict = enchant.Dict(dict_name)
+    def __init__(self, frequencies=None, max_dist=2, prefix_length=7):
+        """
+        :param frequencies: Dictionary mapping words to frequencies, or an iterable of words
+        :param max_dist: Largest edit distance the index will answer for
+        :param prefix_length: Number of leading characters to make the deletes from. Must exceed max_dist
+        """
+        assert(prefix_length > max_dist)
         self.max_dist = max_dist
+        self.prefix_length = prefix_length
+        self.frequencies = {}
+        self.deletes = {}
+        if frequencies is not None:
+            if not isinstance(frequencies, dict):
+                frequencies = dict.fromkeys(frequencies, 1)
+            for word, count in frequencies.items():
+                self.add(word, count)
+
+    @classmethod
+    def build(cls, max_dist=2, prefix_length=7):
+        """ Builds the index from the nltk words corpus. Slow; do it once and save()
+        :param max_dist: Largest edit distance the index will answer for
+        :param prefix_length: Number of leading characters to make the deletes from
+        :return: SymSpellIndex
+        """
+        from nltk.corpus import words
+        return cls(words.words(), max_dist, prefix_length)
+
+    @classmethod
+    def from_word_list(cls, fname, max_dist=2, prefix_length=7):
+        """ Builds the index from a local word list with one word per line,
+        optionally followed by whitespace and a frequency.
+        :param fname: Path of the word list
+        :param max_dist: Largest edit distance the index will answer for
+        :param prefix_length: Number of leading characters to make the deletes from
+        :return: SymSpellIndex
+        """
+        frequencies = {}
+        with open(fname) as f:
+            for line in f:
+                parts = line.split()
+                if parts:
+                    frequencies[parts[0]] = int(parts[1]) if len(parts) > 1 else 1
+        return cls(frequencies, max_dist, prefix_length)
+
+    @classmethod
+    def from_corpus(cls, words, max_dist=2, min_count=1, prefix_length=7):
+        """ Builds the index from corpus frequencies, e.g. masterbag.
+        :param words: Iterable of tokens
+        :param max_dist: Largest edit distance the index will answer for
+        :param min_count: Words seen fewer times than this are left out (they are likely misspellings)
+        :param prefix_length: Number of leading characters to make the deletes from
+        :return: SymSpellIndex
+        """
+        counts = {}
+        for w in words:
+            counts[w] = counts.get(w, 0) + 1
+        return cls(dict((w, c) for w, c in counts.items() if c >= min_count), max_dist, prefix_length)
 
-    def replace(self, word):
-        if self.spell_dict.check(word):
+    def add(self, word, count=1):
+        """
+        :param word: Dictionary word to add
+        :param count: Frequency of the word
+        """
+        if word in self.frequencies:
+            self.frequencies[word] += count
+            return
+        self.frequencies[word] = count
+        for variant in self._deletes(word[:self.prefix_length], self.max_dist):
+            self.deletes.setdefault(variant, []).append(word)
+
+    def __contains__(self, word):
+        return word in self.frequencies
+
+    def __len__(self):
+        return len(self.frequencies)
+
+    def lookup(self, word, max_dist=None):
+        """
+        :param word: String to correct
+        :param max_dist: Largest edit distance to accept. Cannot exceed the index's max_dist
+        :return: The closest dictionary word within max_dist (ties go to the most frequent word),
+            or None if there is none
+        """
+        if max_dist is None or max_dist > self.max_dist:
+            max_dist = self.max_dist
+        if word in self.frequencies:
             return word
+        best = None
+        best_key = None
+        seen = set()
+        for variant in self._deletes(word[:self.prefix_length], max_dist):
+            for candidate in self.deletes.get(variant, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if abs(len(candidate) - len(word)) > max_dist:
+                    continue
+                dist = edit_distance(word, candidate)
+                if dist > max_dist:
+                    continue
+                key = (dist, -self.frequencies[candidate], candidate)
+                if best_key is None or key < best_key:
+                    best, best_key = candidate, key
+        return best
+
+    @staticmethod
+    def _deletes(word, max_dist):
+        """
+        :return: Set of the word and every string made by deleting up to max_dist of its characters
+        """
+        variants = set([word])
+        frontier = [word]
+        for _ in range(max_dist):
+            next_frontier = []
+            for w in frontier:
+                for i in range(len(w)):
+                    variant = w[:i] + w[i + 1:]
+                    if variant not in variants:
+                        variants.add(variant)
+                        next_frontier.append(variant)
+            frontier = next_frontier
+        return variants
+
 
-        suggestions = self.spell_dict.suggest(word)
+class SpellingReplacer(object):
+    """ Replaces misspelled words with the closest dictionary word within max_dist
+    edits, found with a SymSpellIndex. Results are cached per word so whole
+    vocabularies can be corrected in bulk with replace_many().
+    >>> replacer = SpellingReplacer(index_path='words.symspell')
+    >>> replacer.replace('cookbok')
+    'cookbook'
+    """
 
-        if suggestions and edit_distance(word, suggestions[0]) <= self.max_dist:
-            return suggestions[0]
+    def __init__(self, word_list=None, max_dist=2, index_path=None):
+        """
+        :param word_list: Path of a local word list (one word per line, optionally with a frequency).
+            Defaults to the nltk words corpus
+        :param max_dist: Largest edit distance to correct across
+        :param index_path: Where to persist the index of the nltk words corpus, so that it is
+            built only the first time. Ignored when word_list is given
+        """
+        if word_list is None:
+            self.spell_dict = SymSpellIndex.load_or_build(index_path, max_dist=max_dist)
         else:
-            return word
+            self.spell_dict = SymSpellIndex.from_word_list(word_list, max_dist)
+        self.max_dist = max_dist
+        self._replaced = {}
+
+    def replace(self, word):
+        try:
+            return self._replaced[word]
+        except KeyError:
+            suggestion = self.spell_dict.lookup(word, self.max_dist)
+            repl_word = word if suggestion is None else suggestion
+            self._replaced[word] = repl_word
+            return repl_word
+
+    def replace_many(self, words):
+        """
+        :param words: List of strings
+        :return: List of the strings with misspellings corrected
+        """
+        replace = self.replace
+        return [replace(w) for w in words]
 
 
 class CustomSpellingReplacer(SpellingReplacer):
-    """ SpellingReplacer that allows passing a custom enchant dictionary, such
-    a DictWithPWL.
-    >>> d = enchant.DictWithPWL('en_US', 'mywords.txt')
+    """ SpellingReplacer that allows passing a custom SymSpellIndex, such as
+    one built from corpus frequencies.
+    >>> d = SymSpellIndex.from_word_list('mywords.txt')
     >>> replacer = CustomSpellingReplacer(d)
     >>> replacer.replace('nltk')
     'nltk'
@@ -146,12 +576,76 @@ class CustomSpellingReplacer(SpellingReplacer):
     def __init__(self, spell_dict, max_dist=2):
         self.spell_dict = spell_dict
         self.max_dist = max_dist
+        self._replaced = {}
 
 
 ######################
 # Replacing Synonyms #
 ######################
 
+class WordMapFile(MappedSortedTable):
+    """ Read-only word map compiled into a file which is memory mapped rather
+    than parsed. Opening one costs nothing however many entries it holds, and
+    every process which opens the same file shares one copy of it in the page
+    cache. Lookups are a binary search over the sorted keys.
+
+    File layout (native byte order):
+        b'TTWM', uint32 version, uint64 count,
+        (count + 1) uint64 key offsets, (count + 1) uint64 value offsets,
+        the utf-8 keys in byte order, then the utf-8 values
+    >>> import os, tempfile
+    >>> fname = os.path.join(tempfile.mkdtemp(), 'synonyms.map')
+    >>> WordMapFile.compile({'bday': 'birthday', 'gr8': 'great'}, fname)
+    >>> word_map = WordMapFile(fname)
+    >>> word_map.get('bday')
+    'birthday'
+    >>> word_map.get('happy', 'happy')
+    'happy'
+    >>> word_map.close()
+    """
+    MAGIC = b'TTWM'
+    VERSION = 1
+    ARRAYS = (('_key_offsets', 1), ('_value_offsets', 1))
+    DESCRIPTION = 'compiled word map'
+
+    @classmethod
+    def compile(cls, word_map, fname):
+        """
+        :param word_map: Dictionary mapping strings to strings
+        :param fname: Path of the file to write
+        :raises ValueError: An entry of word_map is not a pair of strings
+        """
+        for k, v in word_map.items():
+            if not (isinstance(k, str) and isinstance(v, str)):
+                raise ValueError('word map entry %r: %r is not a pair of strings' % (k, v))
+        items = sorted((k.encode('utf-8'), v.encode('utf-8')) for k, v in word_map.items())
+        data_start = cls.HEADER.size + 16 * (len(items) + 1)
+        key_offsets = array('Q', [data_start])
+        for k, v in items:
+            key_offsets.append(key_offsets[-1] + len(k))
+        value_offsets = array('Q', [key_offsets[-1]])
+        for k, v in items:
+            value_offsets.append(value_offsets[-1] + len(v))
+        with open(fname, 'wb') as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(items)))
+            key_offsets.tofile(f)
+            value_offsets.tofile(f)
+            f.write(b''.join(k for k, v in items))
+            f.write(b''.join(v for k, v in items))
+
+    def get(self, word, default=None):
+        i = self._find(word)
+        if i < 0:
+            return default
+        return self._mmap[self._value_offsets[i]:self._value_offsets[i + 1]].decode('utf-8')
+
+    def __getitem__(self, word):
+        i = self._find(word)
+        if i < 0:
+            raise KeyError(word)
+        return self._mmap[self._value_offsets[i]:self._value_offsets[i + 1]].decode('utf-8')
+
+
 class WordReplacer(object):
     """ WordReplacer that replaces a given word with a word from the word_map,
     or if the word isn't found, returns the word as is.
@@ -168,6 +662,27 @@ class WordReplacer(object):
     def replace(self, word):
         return self.word_map.get(word, word)
 
+    def replace_many(self, words):
+        """ Replaces every word in a token list, looking each distinct word up once.
+        >>> WordReplacer({'bday': 'birthday'}).replace_many(['happy', 'bday', 'bday'])
+        ['happy', 'birthday', 'birthday']
+        """
+        get = self.word_map.get
+        table = dict((w, get(w, w)) for w in set(words))
+        return [table[w] for w in words]
+
+
+class MappedWordReplacer(WordReplacer):
+    """ WordReplacer that reads word mappings from a file compiled with
+    CsvWordReplacer.compile(), YamlWordReplacer.compile() or WordMapFile.compile().
+    >>> replacer = MappedWordReplacer('synonyms.map')
+    >>> replacer.replace('bday')
+    'birthday'
+    """
+
+    def __init__(self, fname):
+        super(MappedWordReplacer, self).__init__(WordMapFile(fname))
+
 
 class CsvWordReplacer(WordReplacer):
     """ WordReplacer that reads word mappings from a csv file.
@@ -179,13 +694,28 @@ class CsvWordReplacer(WordReplacer):
     """
 
     def __init__(self, fname):
-        word_map = {}
-
-        for line in csv.reader(open(fname)):
-            word, syn = line
-            word_map[word] = syn
+        super(CsvWordReplacer, self).__init__(self.read_map(fname))
 
-        super(CsvWordReplacer, self).__init__(word_map)
+    @staticmethod
+    def read_map(fname):
+        """
+        :param fname: Path of a csv file with rows of word,replacement
+        :return: Dictionary mapping words to their replacements
+        """
+        word_map = {}
+        with open(fname, newline='') as f:
+            for line in csv.reader(f):
+                word, syn = line
+                word_map[word] = syn
+        return word_map
+
+    @classmethod
+    def compile(cls, fname, map_fname):
+        """ Compiles the csv file into a WordMapFile for use with MappedWordReplacer.
+        :param fname: Path of the csv file
+        :param map_fname: Path of the compiled file to write
+        """
+        WordMapFile.compile(cls.read_map(fname), map_fname)
 
 
 class YamlWordReplacer(WordReplacer):
@@ -198,15 +728,119 @@ class YamlWordReplacer(WordReplacer):
     """
 
     def __init__(self, fname):
-        word_map = yaml.load(open(fname))
-        super(YamlWordReplacer, self).__init__(word_map)
+        super(YamlWordReplacer, self).__init__(self.read_map(fname))
+
+    @staticmethod
+    def read_map(fname):
+        """
+        :param fname: Path of a yaml file holding a single mapping of word: replacement
+        :return: Dictionary mapping words to their replacements
+        """
+        # words are strings, so scalars such as yes, no and 1.5 are read as written
+        # rather than resolved to bools and floats
+        with open(fname) as f:
+            return yaml.load(f, Loader=yaml.BaseLoader)
+
+    @classmethod
+    def compile(cls, fname, map_fname):
+        """ Compiles the yaml file into a WordMapFile for use with MappedWordReplacer.
+        :param fname: Path of the yaml file
+        :param map_fname: Path of the compiled file to write
+        """
+        WordMapFile.compile(cls.read_map(fname), map_fname)
 
 
 #####################################
 # Replacing Negations with Antonyms #
 #####################################
 
+class AntonymMap(WordNetResource):
+    """ Every antonym relation in wordnet, compiled once into a dictionary.
+    For each lemma name and pos it holds the antonyms of all the lemmas of all
+    the synsets the lemma belongs to, which is what AntonymReplacer used to
+    collect by walking wordnet on every call. Lookups apply morphy's exception
+    lists and suffix rules just like wordnet.synsets().
+    >>> antonym_map = AntonymMap({('uglify', 'v'): ['beautify']})
+    >>> sorted(antonym_map.antonyms('uglifies'))
+    ['beautify']
+
+    Attributes:
+        table: Dictionary mapping (lemma name, pos) to a frozenset of antonym names
+        exceptions: Dictionary mapping pos to a dictionary of {inflected form: [base forms]}
+    """
+
+    def __init__(self, table, exceptions=None):
+        """
+        :param table: Dictionary mapping (lemma name, pos) to an iterable of antonym names
+        :param exceptions: Dictionary mapping pos to a dictionary of {inflected form: [base forms]}
+        """
+        self.table = dict((key, frozenset(names)) for key, names in table.items() if names)
+        self.exceptions = exceptions or {}
+
+    @classmethod
+    def build(cls):
+        """
+        Walks every synset in wordnet once. Slow; do it once and save()
+        :return: AntonymMap
+        """
+        table = {}
+        for syn in wordnet.all_synsets():
+            antonyms = set(antonym.name() for lemma in syn.lemmas() for antonym in lemma.antonyms())
+            if not antonyms:
+                continue
+            # satellite adjectives are found under the adjective pos
+            pos = 'a' if syn.pos() == 's' else syn.pos()
+            for lemma in syn.lemmas():
+                table.setdefault((lemma.name().lower(), pos), set()).update(antonyms)
+        # the exception lists have no public accessor
+        exceptions = dict((pos, dict(wordnet._exception_map[pos])) for pos in POS_LIST)
+        return cls(table, exceptions)
+
+    def antonyms(self, word, pos=None):
+        """
+        :param word: Word to find antonyms for
+        :param pos: Wordnet pos to restrict the search to, or None for all
+        :return: Set of antonym names, empty if there are none
+        """
+        word = word.lower()
+        found = set()
+        for p in (POS_LIST if pos is None else [pos]):
+            exceptions = self.exceptions.get(p, {})
+            if word in exceptions:
+                forms = exceptions[word]
+            else:
+                forms = [word[:-len(old)] + new for old, new in WordNetCorpusReader.MORPHOLOGICAL_SUBSTITUTIONS[p]
+                         if word.endswith(old)]
+            for form in [word] + list(forms):
+                found.update(self.table.get((form, p), ()))
+        return found
+
+
 class AntonymReplacer(object):
+    """ Replaces words with their antonyms using a precompiled AntonymMap.
+
+    Attributes:
+        map_path: Where the AntonymMap is loaded from (or saved to once built)
+        _antonym_map: The AntonymMap, loaded on first use
+        _replaced: Dictionary memoizing replace() by (word, pos)
+    """
+
+    def __init__(self, antonym_map=None, map_path=None):
+        """
+        :param antonym_map: AntonymMap to use
+        :param map_path: Where to load the map from (or save it to once built) if antonym_map
+            is not given. Without either the map is built from wordnet on first use
+        """
+        self._antonym_map = antonym_map
+        self.map_path = map_path
+        self._replaced = {}
+
+    @property
+    def antonym_map(self):
+        if self._antonym_map is None:
+            self._antonym_map = AntonymMap.load_or_build(self.map_path)
+        return self._antonym_map
+
     def replace(self, word, pos=None):
         """ Returns the antonym of a word, but only if there is no ambiguity.
         >>> replacer = AntonymReplacer()
@@ -216,17 +850,13 @@ class AntonymReplacer(object):
         >>> replacer.replace('beautify')
         'uglify'
         """
-        antonyms = set()
-
-        for syn in wordnet.synsets(word, pos=pos):
-            for lemma in syn.lemmas:
-                for antonym in lemma.antonyms():
-                    antonyms.add(antonym.name)
-
-        if len(antonyms) == 1:
-            return antonyms.pop()
-        else:
-            return None
+        try:
+            return self._replaced[(word, pos)]
+        except KeyError:
+            antonyms = self.antonym_map.antonyms(word, pos)
+            antonym = antonyms.pop() if len(antonyms) == 1 else None
+            self._replaced[(word, pos)] = antonym
+            return antonym
 
     def replace_negations(self, sent):
         """ Try to replace negations with antonyms in the tokenized sentence.
@@ -255,6 +885,17 @@ class AntonymReplacer(object):
 
         return words
 
+    def replace_negations_many(self, sents):
+        """ Replaces negations in a batch of tokenized sentences (e.g., tweets).
+        Each sentence is rewritten in one linear pass and antonym lookups are
+        shared across the whole batch.
+        >>> replacer = AntonymReplacer(AntonymMap({('uglify', 'v'): ['beautify']}))
+        >>> replacer.replace_negations_many([['do', 'not', 'uglify'], ['not', 'yet']])
+        [['do', 'beautify'], ['not', 'yet']]
+        """
+        replace_negations = self.replace_negations
+        return [replace_negations(sent) for sent in sents]
+
 
 class AntonymWordReplacer(WordReplacer, AntonymReplacer):
     """ AntonymReplacer that uses a custom mapping instead of WordNet.
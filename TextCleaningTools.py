@@ -1,9 +1,13 @@
 # Used for WordFilters
 import re
+import functools
+import multiprocessing
 
 import nltk
 from nltk.corpus import wordnet as wn
 
+from StringReplacementTools import RegexpReplacementEngine
+
 
 # from nltk.replacers import RegexpReplacer
 
@@ -35,6 +39,18 @@ class IModifier(object):
     def process(self, text, **kwargs):
         raise NotImplementedError
 
+    def process_many(self, words, **kwargs):
+        """
+        Applies process() to a list of strings. Word lists are Zipfian, so each
+        unique string is processed only once and the results are mapped back
+        onto the list with a dictionary lookup per token.
+        :param words: List of strings to process
+        :param kwargs: Passed through to process()
+        :return: List of processed strings, in the same order
+        """
+        table = {w: self.process(w, **kwargs) for w in set(words)}
+        return [table[w] for w in words]
+
     def _check_is_single_word(self, text):
         """
         Some implmentations of IModifier allow for sentences. Others
@@ -66,6 +82,45 @@ class IModifierList(object):
         raise NotImplementedError
 
 
+class ITokenizer(object):
+    """
+    Interface for classes which split a text into a list of lower case tokens.
+    Used by WordBagMaker to build word bags
+    """
+
+    def __init__(self):
+        pass
+
+    def tokenize(self, text):
+        """
+        Args:
+            text: String to tokenize
+        Returns:
+            List of lower case strings
+        """
+        raise NotImplementedError
+
+    def compare(self, reference, sample):
+        """
+        Equivalence check against another tokenizer. Run this on a sample of the
+        corpus before swapping tokenizers to see exactly what would change.
+
+        Args:
+            reference: ITokenizer whose output is taken as the expected result
+            sample: Iterable of strings to tokenize with both
+        Returns:
+            List of dictionaries with the keys 'text', 'expected' and 'result', one
+            for each text where the two tokenizers disagree
+        """
+        differences = []
+        for text in sample:
+            expected = reference.tokenize(text)
+            result = self.tokenize(text)
+            if result != expected:
+                differences.append({'text': text, 'expected': expected, 'result': result})
+        return differences
+
+
 class INgramFilter(object):
     """
     Interface for filters on ngrams
@@ -83,6 +138,16 @@ class INgramFilter(object):
         """
         raise NotImplementedError
 
+    def compile(self):
+        """
+        Builds the predicate which the ngram getters run while counting, so that
+        filtered ngrams are never stored. The getters cache the predicate, so it
+        should read the filter's settings when called rather than when compiled
+        Returns:
+            Function taking an ngram tuple and returning True if the ngram should be removed
+        """
+        raise NotImplementedError
+
 
 #####################################
 # ICleaner implementations          #
@@ -136,6 +201,54 @@ class NumeralCleaner(ICleaner):
             return False
 
 
+#############################
+# ITokenizer                #
+#############################
+
+
+class NltkTokenizer(ITokenizer):
+    """
+    Splits the text into sentences with the punkt tokenizer, then each sentence
+    into words with the treebank word tokenizer. Thorough but slow.
+    """
+
+    def __init__(self):
+        ITokenizer.__init__(self)
+
+    def tokenize(self, text):
+        return [word.lower() for sent in nltk.tokenize.sent_tokenize(text) for word in nltk.tokenize.word_tokenize(sent)]
+
+
+class FastTweetTokenizer(ITokenizer):
+    """
+    Tokenizes tweets with a single precompiled regex and no sentence splitting.
+    Keeps urls (including the bare //t.co links), @mentions, #hashtags and emoji
+    as whole tokens and splits off contractions the way the treebank tokenizer
+    does (e.g., "can't" -> "ca", "n't").
+
+    Use compare() with an NltkTokenizer to check the differences on a sample
+    before switching a pipeline over.
+    """
+    pattern = re.compile(r"""
+        (?:https?:)?//\S+                           # urls, including //t.co fragments
+      | [@#]\w+                                     # @mentions and #hashtags
+      | [\U0001F1E6-\U0001F1FF]{2}                   # flags
+      | [\U0001F300-\U0001FAFF\u2600-\u27BF]\uFE0F?   # emoji
+      | \w+(?=n['\u2019]t\b) | n['\u2019]t          # do n't
+      | ['\u2019](?:s|re|ve|ll|d|m)\b                # 's 're 've 'll 'd 'm
+      | \d+(?:[.,]\d+)+                              # 3.5 1,000
+      | \w+(?:-\w+)*                                 # words, including hyphenated ones
+      | \.\.\.                                       # ellipsis
+      | [^\w\s]                                      # any other single symbol
+    """, re.VERBOSE | re.UNICODE)
+
+    def __init__(self):
+        ITokenizer.__init__(self)
+
+    def tokenize(self, text):
+        return self.pattern.findall(text.lower())
+
+
 #############################
 # IModifier                 #
 #############################
@@ -148,6 +261,7 @@ class RegexpReplacer(IModifier):
     By default will replace contractions
     Properties:
         _patterns: Tuple of compiled regex replacement patterns to apply
+        _engine: RegexpReplacementEngine compiled from _patterns. Rebuilt on demand after they change
     """
 
     def __init__(self, replace_contractions=True):
@@ -156,6 +270,7 @@ class RegexpReplacer(IModifier):
         :param replace_contractions:  Whether to load patterns for contractions
         """
         self._patterns = ()
+        self._engine = None
         self.contraction_patterns = [
             (r'won\'t', 'will not'),
             (r'Won\'t', 'will not'),
@@ -207,18 +322,28 @@ class RegexpReplacer(IModifier):
 
         # re-tuple the stored patterns
         self._patterns = tuple(self._patterns)
+        self._engine = None
+
+    @property
+    def engine(self):
+        """
+        The RegexpReplacementEngine which applies the stored patterns
+        """
+        if self._engine is None:
+            self._engine = RegexpReplacementEngine(self._patterns)
+        return self._engine
 
     def process(self, text, **kwargs):
         """
+        Applies the patterns in order. Same result as running re.subn with each
+        pattern in turn, but strings which none of the patterns can match are
+        only scanned once
         Arguments:
             text: The text to subject to regex replacement
             :param kwargs:
             :returns: Modified text if regex found, original if not
         """
-        s = text
-        for (pattern, repl) in self._patterns:
-            (s, count) = re.subn(pattern, repl, s)
-        return s
+        return self.engine.replace(text)
 
     def add_compiled_regex_pattern(self, compiled_pattern, replacement):
         """
@@ -231,6 +356,7 @@ class RegexpReplacer(IModifier):
         self._patterns.append((compiled_pattern, replacement))
         # re-tuple the stored patterns
         self._patterns = tuple(self._patterns)
+        self._engine = None
 
 
 class Lemmatizer(IModifierList):
@@ -240,11 +366,20 @@ class Lemmatizer(IModifierList):
 
     Attributes:
         lemmatizer: The nltk wordnet lemmatizer instance
+        cache_size: Maximum number of (word, pos) -> lemma results held in the cache
+        _lemmatize: Bounded LRU cached function of (word, pos) returning the lemma
     """
 
-    def __init__(self):
+    def __init__(self, cache_size=100000):
+        """
+        Args:
+            cache_size: Maximum number of (word, pos) -> lemma results to memoize.
+                None means unbounded
+        """
         IModifierList.__init__(self)
         self.lemmatizer = nltk.stem.WordNetLemmatizer()
+        self.cache_size = cache_size
+        self._lemmatize = functools.lru_cache(maxsize=cache_size)(self._lemmatize_uncached)
 
     def process(self, wordbag):
         """
@@ -255,18 +390,71 @@ class Lemmatizer(IModifierList):
             Lemmatized list of strings
         """
         try:
-            lemmatized = [ ]
-            tagged = self._get_pos_tags(wordbag)
-            for word, tag in tagged:
-                # if the part of speech wasn't determined, lemmatize without pos
-                if tag is None:
-                    lemmatized.append(self.process_token(word))
-                else:
-                    lemmatized.append(self.lemmatizer.lemmatize(word, tag))
-            return lemmatized
+            lemmatize = self._lemmatize
+            return [lemmatize(word, tag) for word, tag in self._get_pos_tags(wordbag)]
         except Exception as e:
             print(e)
 
+    def process_many(self, wordbags, workers=None, chunksize=None):
+        """
+        Lemmatizes many word bags (e.g., one per tweet). All the bags in a batch are
+        tagged in a single call to the tagger and the lemmas are memoized by (word, pos).
+        Example:
+            lemmatizer = Lemmatizer()
+            lemmatized = lemmatizer.process_many([words for tweetid, words in bagmaker.tweet_tuples], workers=4)
+
+        Args:
+            wordbags: List of word bags (lists of strings)
+            workers: Number of processes to spread the bags across. None or 1 runs in this process
+            chunksize: Number of bags per batch sent to a worker. Defaults to a quarter of each
+                worker's share
+        Returns:
+            List of lemmatized lists of strings, in the same order as wordbags
+        """
+        if workers is None or workers < 2:
+            return self._process_batch(wordbags)
+        wordbags = list(wordbags)
+        if chunksize is None:
+            chunksize = len(wordbags) // (workers * 4) + 1
+        batches = [wordbags[i:i + chunksize] for i in range(0, len(wordbags), chunksize)]
+        lemmatized = []
+        pool = multiprocessing.Pool(workers, initializer=_init_lemmatizer_worker,
+                                    initargs=(self.__class__, self.cache_size))
+        try:
+            for batch_result in pool.imap(_lemmatize_batch, batches):
+                lemmatized += batch_result
+        except BaseException:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+        return lemmatized
+
+    def _process_batch(self, wordbags):
+        """
+        Args:
+            wordbags: List of word bags (lists of strings)
+        Returns:
+            List of lemmatized lists of strings
+        """
+        lemmatize = self._lemmatize
+        return [[lemmatize(word, tag) for word, tag in tagged] for tagged in self._get_pos_tags_many(wordbags)]
+
+    def _lemmatize_uncached(self, word, tag):
+        """
+        Args:
+            word: String to lemmatize
+            tag: Wordnet part of speech tag or None
+        Returns:
+            Lemmatized string
+        """
+        # if the part of speech wasn't determined, lemmatize without pos
+        if tag is None:
+            return self.process_token(word)
+        return self.lemmatizer.lemmatize(word, tag)
+
     def process_token(self, text, **kwargs):
         """
         Lemmatizes a single token. Does not take into account pos
@@ -292,6 +480,16 @@ class Lemmatizer(IModifierList):
         """
         return PartOfSpeechClassification.get_pos_tags(word_list)
 
+    def _get_pos_tags_many(self, word_lists):
+        """
+        Tags each word in each word bag with its part of speech
+        Args:
+            word_lists: List of word bags (lists of strings)
+        Returns:
+            List of lists of (word, pos) tuples where pos is the wordnet pos tag
+        """
+        return PartOfSpeechClassification.get_pos_tags_many(word_lists)
+
         # def _convert_treebank_tag_to_wordnet_pos(self, treebank_tag):
         #     """
         #     The nltk.pos_tag() is trained on the treebank corpus. So it returns
@@ -364,6 +562,9 @@ class CustomFilter(INgramFilter):
         assert isinstance(collocation_finder, nltk.collocations.AbstractCollocationFinder)
         return collocation_finder.apply_ngram_filter(self.filter_function)
 
+    def compile(self):
+        return lambda ngram: self.filter_function(*ngram)
+
 
 class WordFilter(INgramFilter):
     """
@@ -371,10 +572,12 @@ class WordFilter(INgramFilter):
     Make sure to set filter_words before calling filter
     Attributes:
         _filter_words: Tuple holding words to filter by, can be set with string, tuple, or list
+        _filter_set: Frozenset of _filter_words for membership tests
     """
 
     def __init__(self):
         self._filter_words = ()
+        self._filter_set = frozenset()
         INgramFilter.__init__(self)
 
     @property
@@ -396,6 +599,7 @@ class WordFilter(INgramFilter):
         elif isinstance(words, tuple):
             self._filter_words += list(words)
         self._filter_words = tuple(self._filter_words)
+        self._filter_set = frozenset(self._filter_words)
 
     def filter(self, collocation_finder):
         """
@@ -403,13 +607,27 @@ class WordFilter(INgramFilter):
             collocation_finder: Instance of nltk.collocations.AbstractCollocationFinder
         """
         assert isinstance(collocation_finder, nltk.collocations.AbstractCollocationFinder)
-        return collocation_finder.apply_word_filter(lambda w: w in self.filter_words)
+        return collocation_finder.apply_word_filter(self._filter_set.__contains__)
+
+    def compile(self):
+        return lambda ngram: not self._filter_set.isdisjoint(ngram)
 
 
 class PartOfSpeechClassification(object):
     """
     Tools for classifying part of speech
+
+    Attributes:
+        treebank_to_wordnet: Dictionary mapping penn treebank tags to wordnet pos tags.
+            The values are the literals behind wn.ADJ, wn.NOUN, wn.ADV and wn.VERB so that
+            building the table does not load the wordnet corpus
     """
+    treebank_to_wordnet = {
+        'JJ': 'a', 'JJR': 'a', 'JJS': 'a',
+        'NN': 'n', 'NNS': 'n', 'NNP': 'n', 'NNPS': 'n',
+        'RB': 'r', 'RBR': 'r', 'RBS': 'r',
+        'VB': 'v', 'VBD': 'v', 'VBG': 'v', 'VBN': 'v', 'VBP': 'v', 'VBZ': 'v',
+    }
 
     @classmethod
     def get_pos_tags(cls, word_list):
@@ -420,7 +638,20 @@ class PartOfSpeechClassification(object):
         Returns:
             Returns a list of tuples with the format (word, pos) where pos is the wordnet pos tag
         """
-        return [ (word, cls._convert_treebank_tag_to_wordnet_pos(tag)) for word, tag in nltk.pos_tag(word_list) ]
+        convert = cls.treebank_to_wordnet.get
+        return [ (word, convert(tag)) for word, tag in nltk.pos_tag(word_list) ]
+
+    @classmethod
+    def get_pos_tags_many(cls, word_lists):
+        """
+        Tags each word in many word bags with a single invocation of the tagger
+        Args:
+            word_lists: List of word bags (lists of strings)
+        Returns:
+            List of lists of tuples with the format (word, pos) where pos is the wordnet pos tag
+        """
+        convert = cls.treebank_to_wordnet.get
+        return [ [ (word, convert(tag)) for word, tag in tagged ] for tagged in nltk.pos_tag_sents(word_lists) ]
 
     @classmethod
     def _convert_treebank_tag_to_wordnet_pos(cls, tag):
@@ -435,28 +666,30 @@ class PartOfSpeechClassification(object):
         Returns:
             Wordnet part of speech tag or None
         """
+        return cls.treebank_to_wordnet.get(tag)
 
-        def is_noun(tag):
-            return tag in [ 'NN', 'NNS', 'NNP', 'NNPS' ]
 
-        def is_verb(tag):
-            return tag in [ 'VB', 'VBD', 'VBG', 'VBN', 'VBP', 'VBZ' ]
+# The lemmatizer used by each pool process in Lemmatizer.process_many
+_worker_lemmatizer = None
 
-        def is_adverb(tag):
-            return tag in [ 'RB', 'RBR', 'RBS' ]
 
-        def is_adjective(tag):
-            return tag in [ 'JJ', 'JJR', 'JJS' ]
+def _init_lemmatizer_worker(lemmatizer_class, cache_size):
+    """
+    Pool initializer for Lemmatizer.process_many. Each process builds its own
+    lemmatizer (and cache) of the caller's class once
+    """
+    global _worker_lemmatizer
+    _worker_lemmatizer = lemmatizer_class(cache_size)
+
 
-        if is_adjective(tag):
-            return wn.ADJ
-        elif is_noun(tag):
-            return wn.NOUN
-        elif is_adverb(tag):
-            return wn.ADV
-        elif is_verb(tag):
-            return wn.VERB
-        return None
+def _lemmatize_batch(wordbags):
+    """
+    Args:
+        wordbags: List of word bags (lists of strings)
+    Returns:
+        List of lemmatized lists of strings
+    """
+    return _worker_lemmatizer._process_batch(wordbags)
 
 
 # ------------------------------------------------------------ deprecated ---------------------------------
@@ -1,44 +1,125 @@
 """
 This contains classes which calculate statistical properties of processed text
 """
+import heapq
+import itertools
+import os
+import tempfile
+from array import array
+from collections import Counter
+
 import nltk
 
+from MappedTables import MappedSortedTable
+from StreamingCounters import SpaceSavingCounter
+from Vocabulary import IdBag
+
+try:
+    import numpy as np
+except ImportError:
+    # counts are kept in lists and ranked with heapq instead
+    np = None
+
 
 class Stats(object):
     def __init__(self, data):
         """
         Args:
-            data: list of the strings to calc
+            data: list of the strings to calc, or an IdBag
         """
-        assert(type(data) is list)
+        assert(type(data) is list or isinstance(data, IdBag))
         self.data = data
-        self.unique = sorted(set(data))
+        self._unique = None
+
+    @property
+    def unique(self):
+        """
+        Sorted list of the distinct strings in data. Computed on first use
+        """
+        if self._unique is None:
+            self._unique = sorted(set(self.data))
+        return self._unique
 
 
 class WordFreq(Stats):
     """
-    Tools for computing and plotting frequencies of word appearances using the nltk.FreqDist method
+    Tools for computing and plotting frequencies of word appearances.
+    The words are counted once, into two aligned columns: words, in order of first
+    appearance, and their counts. An IdBag is counted with numpy.unique over its
+    ids without decoding the bag. Everything else (ranking, topN, freqDist, ...) is
+    derived from the columns.
+
+    Attributes:
+        words: List of the distinct words in order of first appearance
+        counts: Count of each entry of words (a numpy array when numpy is installed, else a list)
     """
 
     def __init__(self, word_list):
         """
         Args:
-            word_list: list of words
+            word_list: list of words, or an IdBag
         """
-        assert(type(word_list) is list)
         Stats.__init__(self, word_list)
-        self.freqDist = nltk.FreqDist(self.data)
-        self.ranking = list(self.freqDist.keys())
+        self.words, self.counts = self._count(word_list)
+        self._ranking = None
+        self._freqDist = None
+
+    @staticmethod
+    def _count(data):
+        """
+        Returns:
+            Tuple of (list of distinct words in order of first appearance, their counts)
+        """
+        if isinstance(data, IdBag) and np is not None:
+            ids, first, counts = np.unique(np.frombuffer(data.ids, dtype=np.uint32),
+                                           return_index=True, return_counts=True)
+            # a shared vocabulary may have handed out the ids in another order than this bag's
+            order = np.argsort(first, kind='stable')
+            words = data.vocabulary.words
+            return [words[i] for i in ids[order].tolist()], counts[order].astype(np.int64)
+        counter = Counter(data)
+        words = list(counter.keys())
+        counts = list(counter.values())
+        if np is not None:
+            counts = np.array(counts, dtype=np.int64)
+        return words, counts
+
+    @property
+    def unique(self):
+        if self._unique is None:
+            self._unique = sorted(self.words)
+        return self._unique
+
+    @property
+    def freqDist(self):
+        """
+        nltk.FreqDist of the counts, built on first use
+        """
+        if self._freqDist is None:
+            self._freqDist = nltk.FreqDist(dict(zip(self.words, self._count_list())))
+        return self._freqDist
+
+    @property
+    def ranking(self):
+        """
+        List of all the words from most to least frequent. Words with the same
+        count stay in order of first appearance, as in FreqDist.most_common
+        """
+        if self._ranking is None:
+            self._ranking = [self.words[i] for i in self._order()]
+        return self._ranking
 
     def topN(self, number_to_display):
         """
-        Returns the N most common items in the dataset
+        Returns the N most common items in the dataset. Only the top N are sorted.
 
         Args:
             number_to_display: The number to display
         """
         assert(type(number_to_display) is int)
-        return self.ranking[0: number_to_display]
+        if self._ranking is not None:
+            return self._ranking[0: number_to_display]
+        return [self.words[i] for i in self._order(number_to_display)]
 
     def plot(self, number_to_display):
         """
@@ -56,10 +137,376 @@ class WordFreq(Stats):
         Returns:
             List of dictionaries with the keys 'word' and 'count'
         """
-        fd = nltk.FreqDist()
-        for word in self.data:
-            fd.inc(word)
-        results = []
-        for w in fd.items():
-            results.append({'word': w[0], 'count' : w[1]})
-        return results
+        return [{'word': word, 'count': count} for word, count in zip(self.words, self._count_list())]
+
+    def to_columns(self, ranked=False):
+        """
+        Exports the counts as two aligned columns rather than one dictionary per word
+        Example:
+            words, counts = WordFreq(bagmaker.masterbag).to_columns(ranked=True)
+
+        Args:
+            ranked: Whether to order the columns from most to least frequent rather than by first appearance
+        Returns:
+            Tuple of (list of words, counts)
+        """
+        if not ranked:
+            return self.words, self.counts
+        order = self._order()
+        if np is not None:
+            return [self.words[i] for i in order], self.counts[order]
+        return [self.words[i] for i in order], [self.counts[i] for i in order]
+
+    def _count_list(self):
+        if np is not None:
+            return self.counts.tolist()
+        return self.counts
+
+    def _order(self, number=None):
+        """
+        Args:
+            number: How many of the top positions to return. None for all
+        Returns:
+            List of positions in words from the highest count to the lowest, ties in order of position
+        """
+        total = len(self.words)
+        if number is None or number >= total:
+            number = total
+        if number <= 0:
+            return []
+        if np is None:
+            counts = self.counts
+            return heapq.nsmallest(number, range(total), key=lambda i: (-counts[i], i))
+        counts = self.counts
+        if number < total:
+            cutoff = np.partition(counts, total - number)[total - number]
+            candidates = np.flatnonzero(counts >= cutoff)
+        else:
+            candidates = np.arange(total)
+        # stable sort keeps equal counts in order of position
+        ordered = candidates[np.argsort(-counts[candidates], kind='stable')]
+        return ordered[:number].tolist()
+
+
+class StreamingWordFreq(object):
+    """
+    Heavy hitters mode of WordFreq for open-ended streams of tokens. Keeps a fixed
+    number of counters (see StreamingCounters.SpaceSavingCounter) rather than a
+    count for every word, and consumes the tokens in one pass.
+    Any word seen more than total / capacity times is counted, and each reported
+    count overstates the truth by at most its error. With a capacity a few times the
+    N asked of topN, the top N of real corpora is usually exact; topN_is_exact() checks.
+    Example:
+        freq = StreamingWordFreq(capacity=2000)
+        for tweetid, words in bagmaker.iter_process(cursor):
+            freq.update(words)
+        freq.topN(200)
+
+    Attributes:
+        counter: The SpaceSavingCounter
+    """
+
+    def __init__(self, capacity=1000):
+        """
+        Args:
+            capacity: Number of words to keep counters for
+        """
+        self.counter = SpaceSavingCounter(capacity)
+
+    @property
+    def total(self):
+        """
+        Number of tokens consumed
+        """
+        return self.counter.total
+
+    @property
+    def max_error(self):
+        """
+        Most any count may overstate the truth, and most times any word without a counter was seen
+        """
+        return self.counter.min_count
+
+    def update(self, words):
+        """
+        Args:
+            words: List of strings
+        """
+        self.counter.update(words)
+
+    def consume(self, tokens, batch_size=10000):
+        """
+        Counts every token from an iterator, batch_size tokens at a time
+
+        Args:
+            tokens: Iterable of strings, e.g., a generator over a live stream
+            batch_size: Number of tokens counted together
+        """
+        tokens = iter(tokens)
+        while True:
+            batch = list(itertools.islice(tokens, batch_size))
+            if not batch:
+                return
+            self.counter.update(batch)
+
+    def topN(self, number_to_display):
+        """
+        Returns the N most common items seen so far
+
+        Args:
+            number_to_display: The number to display
+        """
+        assert(type(number_to_display) is int)
+        return [word for word, count, error in self.counter.top(number_to_display)]
+
+    def topN_with_bounds(self, number_to_display):
+        """
+        Args:
+            number_to_display: The number to return
+        Returns:
+            List of (word, lower bound, upper bound) tuples for the N most common items
+        """
+        return [(word, count - error, count) for word, count, error in self.counter.top(number_to_display)]
+
+    def topN_is_exact(self, number_to_display):
+        """
+        Returns:
+            True when topN(number_to_display) is guaranteed to hold the true N most common words
+        """
+        return self.counter.top_is_exact(number_to_display)
+
+    def bounds(self, word):
+        """
+        Returns:
+            Tuple of (lower, upper) bounds on the number of times word was seen
+        """
+        return self.counter.bounds(word)
+
+
+class FrequencyTable(object):
+    """
+    Mergeable word frequency table. Batches are added with update(), tables are
+    combined with merge() / + and taken apart with subtract() / -, and a table can
+    be saved to a binary file which FrequencyFile memory maps. A nightly job can
+    fold the day's counts into the stored totals without re-reading the corpus:
+        table = FrequencyFile('totals.freq').to_table()
+        table.update(bagmaker.masterbag)
+        table.save('totals.freq')
+
+    Attributes:
+        counts: Counter of the count of each word. Words whose count drops to zero or below are removed
+    """
+
+    def __init__(self, counts=None):
+        """
+        Args:
+            counts: Optional mapping of words to counts to start from
+        """
+        self.counts = Counter()
+        if counts is not None:
+            self.merge(counts)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __contains__(self, word):
+        return word in self.counts
+
+    def __getitem__(self, word):
+        return self.counts.get(word, 0)
+
+    def __eq__(self, other):
+        return dict(self.items()) == dict(other.items())
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def items(self):
+        return self.counts.items()
+
+    @property
+    def total(self):
+        """
+        Sum of all the counts
+        """
+        return sum(self.counts.values())
+
+    def update(self, words):
+        """
+        Counts a batch of words into the table
+
+        Args:
+            words: List of strings or IdBag
+        Returns:
+            This table
+        """
+        batch_words, batch_counts = WordFreq._count(words)
+        if np is not None:
+            batch_counts = batch_counts.tolist()
+        counts = self.counts
+        for word, count in zip(batch_words, batch_counts):
+            counts[word] += count
+        return self
+
+    def merge(self, other):
+        """
+        Adds the counts of another table
+
+        Args:
+            other: FrequencyTable, FrequencyFile or dictionary of words to counts
+        Returns:
+            This table
+        """
+        counts = self.counts
+        for word, count in other.items():
+            counts[word] += count
+        self._drop_nonpositive()
+        return self
+
+    def subtract(self, other):
+        """
+        Takes away the counts of another table, e.g., to remove a day which was counted twice
+
+        Args:
+            other: FrequencyTable, FrequencyFile or dictionary of words to counts
+        Returns:
+            This table
+        """
+        counts = self.counts
+        for word, count in other.items():
+            counts[word] -= count
+        self._drop_nonpositive()
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def __isub__(self, other):
+        return self.subtract(other)
+
+    def __add__(self, other):
+        return FrequencyTable(self.counts).merge(other)
+
+    def __sub__(self, other):
+        return FrequencyTable(self.counts).subtract(other)
+
+    def topN(self, number_to_display):
+        """
+        Args:
+            number_to_display: The number to return
+        Returns:
+            List of the N most common words. Ties are ordered by word
+        """
+        assert(type(number_to_display) is int)
+        return [word for word, count in
+                heapq.nsmallest(number_to_display, self.counts.items(), key=lambda item: (-item[1], item[0]))]
+
+    def save(self, fname):
+        """
+        Writes the table in the format FrequencyFile reads. The file is written
+        under a temporary name and then moved into place, so a FrequencyFile
+        which has the old file open keeps working.
+
+        Args:
+            fname: Path of the file to write
+        """
+        FrequencyFile.write(self.counts, fname)
+
+    @staticmethod
+    def load(fname):
+        """
+        Args:
+            fname: Path of a file written by save()
+        Returns:
+            Read-only FrequencyFile over the file. Use to_table() on it for a table which can be updated
+        """
+        return FrequencyFile(fname)
+
+    def _drop_nonpositive(self):
+        counts = self.counts
+        for word in [word for word, count in counts.items() if count <= 0]:
+            del counts[word]
+
+
+class FrequencyFile(MappedSortedTable):
+    """
+    Read-only frequency table memory mapped from a file written by FrequencyTable.save().
+    Opening one does not read the counts; lookups binary search the sorted words and
+    topN reads the first N entries of a precomputed ranking.
+
+    File layout (native byte order):
+        b'TTFT', uint32 version, uint64 count,
+        (count + 1) uint64 word offsets, count uint64 counts,
+        count uint64 positions from the highest count to the lowest (ties by word),
+        the utf-8 words in byte order
+    """
+    MAGIC = b'TTFT'
+    VERSION = 1
+    ARRAYS = (('_key_offsets', 1), ('_counts', 0), ('_ranking', 0))
+    DESCRIPTION = 'saved frequency table'
+
+    @classmethod
+    def write(cls, counts, fname):
+        """
+        Args:
+            counts: Dictionary of words to counts
+            fname: Path of the file to write
+        """
+        items = sorted((word.encode('utf-8'), count) for word, count in counts.items())
+        data_start = cls.HEADER.size + 8 * (3 * len(items) + 1)
+        offsets = array('Q', [data_start])
+        for word, count in items:
+            offsets.append(offsets[-1] + len(word))
+        ranking = array('Q', sorted(range(len(items)), key=lambda i: -items[i][1]))
+        # a temporary file of its own, so concurrent writers do not clobber each other's
+        fd, tmp_fname = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(fname)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(items)))
+                offsets.tofile(f)
+                array('Q', [count for word, count in items]).tofile(f)
+                ranking.tofile(f)
+                f.write(b''.join(word for word, count in items))
+            os.replace(tmp_fname, fname)
+        except BaseException:
+            os.unlink(tmp_fname)
+            raise
+
+    def __getitem__(self, word):
+        i = self._find(word)
+        if i < 0:
+            return 0
+        return self._counts[i]
+
+    def get(self, word, default=None):
+        i = self._find(word)
+        if i < 0:
+            return default
+        return self._counts[i]
+
+    def items(self):
+        """
+        Returns:
+            Generator of (word, count) tuples in word order
+        """
+        for i in range(self._count):
+            yield self._key(i), self._counts[i]
+
+    def topN(self, number_to_display):
+        """
+        Args:
+            number_to_display: The number to return
+        Returns:
+            List of the N most common words. Ties are ordered by word
+        """
+        assert(type(number_to_display) is int)
+        return [self._key(i) for i in self._ranking[:max(number_to_display, 0)]]
+
+    def to_table(self):
+        """
+        Returns:
+            FrequencyTable holding a copy of the counts
+        """
+        table = FrequencyTable()
+        table.counts.update(dict(self.items()))
+        return table
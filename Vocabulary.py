@@ -0,0 +1,230 @@
+"""
+This contains the compact, integer-id representation of processed text.
+
+A Vocabulary interns each token type once and hands out integer ids. The word bags
+then store those ids in array('I') buffers (4 bytes per token) instead of lists
+of str objects. The views decode back to strings on access so existing callers
+which treat masterbag and tweet_tuples as lists keep working.
+The id buffers support the buffer protocol, so numpy.frombuffer(bag.ids, dtype=numpy.uint32)
+gives a zero-copy array when numpy is available.
+"""
+from array import array
+
+
+class Vocabulary(object):
+    """
+    Bidirectional mapping between tokens and integer ids. Ids are assigned
+    in order of first appearance starting at 0.
+
+    Attributes:
+        _ids: Dictionary mapping each token to its id
+        _words: List of tokens, indexed by id
+    """
+
+    def __init__(self, words=()):
+        """
+        Args:
+            words: Iterable of tokens to add up front
+        """
+        self._ids = {}
+        self._words = []
+        for w in words:
+            self.add(w)
+
+    def __len__(self):
+        return len(self._words)
+
+    def __contains__(self, word):
+        return word in self._ids
+
+    @property
+    def words(self):
+        """
+        List of tokens indexed by id. Do not modify.
+        """
+        return self._words
+
+    def add(self, word):
+        """
+        Args:
+            word: Token to intern
+        Returns:
+            The id of the token, newly assigned if it has not been seen before
+        """
+        try:
+            return self._ids[word]
+        except KeyError:
+            wordid = len(self._words)
+            self._ids[word] = wordid
+            self._words.append(word)
+            return wordid
+
+    def lookup(self, word):
+        """
+        Args:
+            word: Token to look up
+        Returns:
+            The id of the token or None if it is not in the vocabulary
+        """
+        return self._ids.get(word)
+
+    def encode(self, words):
+        """
+        Args:
+            words: Iterable of tokens. Unseen tokens are added to the vocabulary
+        Returns:
+            array('I') of token ids
+        """
+        ids = self._ids
+        add = self.add
+        return array('I', [ids[w] if w in ids else add(w) for w in words])
+
+    def decode(self, ids):
+        """
+        Args:
+            ids: Iterable of token ids
+        Returns:
+            List of tokens
+        """
+        words = self._words
+        return [words[i] for i in ids]
+
+
+class IdBag(object):
+    """
+    List-like word bag which stores vocabulary ids in an array('I').
+    Supports += with a list of strings, len(), iteration and indexing, all of
+    which speak strings.
+
+    Attributes:
+        vocabulary: The Vocabulary used to encode and decode tokens
+        ids: array('I') of token ids
+    """
+
+    def __init__(self, vocabulary, ids=None):
+        """
+        Args:
+            vocabulary: Vocabulary instance
+            ids: Optional array('I') to use as storage. Shared, not copied
+        """
+        self.vocabulary = vocabulary
+        self.ids = array('I') if ids is None else ids
+
+    def __iadd__(self, words):
+        self.extend(words)
+        return self
+
+    def extend(self, words):
+        """
+        Args:
+            words: List of strings to append
+        """
+        self.ids.extend(self.vocabulary.encode(words))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        words = self.vocabulary.words
+        return (words[i] for i in self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.vocabulary.decode(self.ids[index])
+        return self.vocabulary.words[self.ids[index]]
+
+    def __eq__(self, other):
+        return self.tolist() == list(other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def tolist(self):
+        """
+        Returns:
+            The decoded list of strings
+        """
+        return self.vocabulary.decode(self.ids)
+
+
+class TweetTupleTable(object):
+    """
+    List-like store of (tweetID, [list of words]) tuples in CSR layout: one flat
+    array('I') of token ids for all tweets plus an offsets array marking where each
+    tweet's words start. Indexing and iteration decode back to tuples of
+    (tweetID, [list of strings]).
+
+    Attributes:
+        vocabulary: The Vocabulary used to encode and decode tokens
+        tweet_ids: List of tweetIDs in insertion order
+        token_ids: array('I') of the token ids of all tweets, concatenated
+        offsets: array('Q') with len(tweet_ids) + 1 entries. The words of tweet i
+            are token_ids[offsets[i]:offsets[i + 1]]
+    """
+
+    def __init__(self, vocabulary):
+        """
+        Args:
+            vocabulary: Vocabulary instance
+        """
+        self.vocabulary = vocabulary
+        self.tweet_ids = []
+        self.token_ids = array('I')
+        self.offsets = array('Q', [0])
+
+    def append(self, tweet_tuple):
+        """
+        Args:
+            tweet_tuple: Tuple with the structure (tweetID, [list of words in tweet])
+        """
+        tweetid, words = tweet_tuple
+        self.tweet_ids.append(tweetid)
+        self.token_ids.extend(self.vocabulary.encode(words))
+        self.offsets.append(len(self.token_ids))
+
+    def __len__(self):
+        return len(self.tweet_ids)
+
+    def __iter__(self):
+        for i in range(len(self.tweet_ids)):
+            yield self[i]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self.tweet_ids)))]
+        if index < 0:
+            index += len(self.tweet_ids)
+        if not 0 <= index < len(self.tweet_ids):
+            raise IndexError('tweet index out of range')
+        return self.tweet_ids[index], self.words(index)
+
+    def words(self, index):
+        """
+        Args:
+            index: Position of the tweet in the table
+        Returns:
+            The decoded list of words in the tweet
+        """
+        return self.vocabulary.decode(self.token_ids[self.offsets[index]:self.offsets[index + 1]])
+
+    def word_ids(self, index):
+        """
+        Args:
+            index: Position of the tweet in the table
+        Returns:
+            array('I') of the token ids of the tweet
+        """
+        return self.token_ids[self.offsets[index]:self.offsets[index + 1]]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def masterbag(self):
+        """
+        Returns:
+            IdBag view sharing this table's flat token id array
+        """
+        return IdBag(self.vocabulary, self.token_ids)
@@ -4,7 +4,81 @@ Formerly in TextTools
 """
 __author__ = 'adam'
 
+import copy
+import multiprocessing
+
 from TextCleaningTools import *
+from Vocabulary import Vocabulary, IdBag, TweetTupleTable
+
+
+class TokenFilter(object):
+    """
+    Compiled form of an ignore list plus a chain of ICleaner objects.
+
+    The ignore list is held in a frozenset and the cleaners are fused into a single
+    predicate. Each distinct token type is judged once and the verdict memoized, so
+    every later occurrence of that type is admitted or rejected with one dict lookup.
+
+    Attributes:
+        ignore: Frozenset of strings to reject
+        _cleans: Tuple of the bound clean() methods of the cleaners
+        _verdicts: Dictionary mapping each token type seen to True (keep) or False (drop)
+    """
+
+    def __init__(self, ignore=(), cleaners=()):
+        """
+        Args:
+            ignore: Iterable of strings to reject
+            cleaners: Iterable of ICleaner objects
+        """
+        self.ignore = frozenset(ignore)
+        self._cleans = tuple(c.clean for c in cleaners)
+        self._verdicts = {}
+
+    def admits(self, word):
+        """
+        Args:
+            word: String to evaluate
+        Returns:
+            True if the string is to be included, False if it is to be left out
+        """
+        try:
+            return self._verdicts[word]
+        except KeyError:
+            verdict = self._judge(word)
+            self._verdicts[word] = verdict
+            return verdict
+
+    def filter(self, words):
+        """
+        Args:
+            words: List of strings to filter
+        Returns:
+            List of the strings which are admitted, in their original order
+        """
+        verdicts = self._verdicts
+        judge = self._judge
+        kept = []
+        for w in words:
+            verdict = verdicts.get(w)
+            if verdict is None:
+                verdict = judge(w)
+                verdicts[w] = verdict
+            if verdict:
+                kept.append(w)
+        return kept
+
+    def _judge(self, word):
+        """
+        The uncached predicate: the word must not be in the ignore set and
+        no cleaner may return False for it
+        """
+        if word in self.ignore:
+            return False
+        for clean in self._cleans:
+            if clean(word) is False:
+                return False
+        return True
 
 
 class WordBagMaker(object):
@@ -15,18 +89,39 @@ class WordBagMaker(object):
 
     Attributes:
         _cleaners: List of ICleaner objects
-        masterbag: List containing all words
-        _ignore: Tuple of strings to ignore while filtering
+        masterbag: List containing all words. In compact mode an IdBag holding vocabulary ids
+        _ignore: Frozenset of strings to ignore while filtering
+        _token_filter: TokenFilter compiled from _ignore and _cleaners. Rebuilt on demand after either changes
+        compact: Whether results are stored as vocabulary ids rather than strings
+        vocabulary: The Vocabulary shared by the compact results. None unless compact
+        tokenizer: ITokenizer used by _make_wordbag
     """
 
-    def __init__(self):
-        self._ignore = ()
+    def __init__(self, compact=False, vocabulary=None, tokenizer=None):
+        """
+        Args:
+            compact: Store masterbag as an array of integer ids rather than a list of strings.
+                The stored results still decode to strings when read
+            vocabulary: Vocabulary to use in compact mode. Pass the same instance to several
+                bag makers to share ids between them. A new one is created if not given
+            tokenizer: ITokenizer to split texts into words. Defaults to NltkTokenizer.
+                FastTweetTokenizer is much quicker on tweets
+        """
+        self.tokenizer = NltkTokenizer() if tokenizer is None else tokenizer
+        assert(isinstance(self.tokenizer, ITokenizer))
+        self._ignore = frozenset()
         self._cleaners = []
+        self._token_filter = None
+        self.compact = compact
+        self.vocabulary = None
         self.masterbag = []
+        if compact:
+            self.vocabulary = Vocabulary() if vocabulary is None else vocabulary
+            self.masterbag = IdBag(self.vocabulary)
 
     def add_to_ignorelist(self, list_to_ignore):
         """
-        Add a list of strings to the internally held tuple of strings to ignore in processing text
+        Add a list of strings to the internally held set of strings to ignore in processing text
         Example:
             bagmaker = WordBagMaker()
             bagmaker.add_to_ignorelist(ignore.get_list())
@@ -36,15 +131,13 @@ class WordBagMaker(object):
         Args:
             list_to_ignore: List of strings to ignore.
         """
-        self._ignore = list(self._ignore)
-        [self._ignore.append(i) for i in list_to_ignore]
-        self._ignore = set(self._ignore)
-        self._ignore = tuple(self._ignore)
+        self._ignore = self._ignore.union(list_to_ignore)
+        self._token_filter = None
 
     def add_to_cleaners(self, icleaner):
         """
-        Adds an object which does cleaning to the que of cleaners which get
-        called by _check_unwanted()
+        Adds an object which does cleaning to the que of cleaners which the
+        TokenFilter built by the next processing run calls on each new word
         Example:
             bagmaker.add_to_cleaners(URLCleaner())
             bagmaker.add_to_cleaners(UsernameCleaner())
@@ -55,6 +148,16 @@ class WordBagMaker(object):
         """
         assert(isinstance(icleaner, ICleaner))
         self._cleaners.append(icleaner)
+        self._token_filter = None
+
+    @property
+    def token_filter(self):
+        """
+        The TokenFilter compiled from the current ignore list and cleaners
+        """
+        if self._token_filter is None:
+            self._token_filter = TokenFilter(self._ignore, self._cleaners)
+        return self._token_filter
 
     def process(self, to_process):
         """
@@ -64,11 +167,45 @@ class WordBagMaker(object):
             to_process: List of strings to process
         """
         assert(isinstance(to_process, list))
-        for t in to_process:
-            # process text
-            words = self._make_wordbag(t)
-            words = [w for w in words if self._check_unwanted(w) and w not in self._ignore]
-            self.masterbag += words
+        for textid, words in self.iter_process(to_process):
+            self._accumulate(textid, words)
+
+    def iter_process(self, to_process, accumulate=False):
+        """
+        Lazily processes the texts one at a time so that downstream stages can consume
+        them without the whole corpus being held in memory.
+        Example:
+            for tweetid, words in bagmaker.iter_process(cursor):
+                ngram_counter.update(words)
+
+        Args:
+            to_process: Any iterable of the items process() accepts (need not be a list)
+            accumulate: Whether to also store the results in masterbag (and tweet_tuples)
+        Returns:
+            Generator of (id, [list of words]) tuples. For plain strings the id is the
+            position of the string in to_process
+        """
+        token_filter = self.token_filter
+        for textid, text in self._iter_texts(to_process):
+            words = token_filter.filter(self._make_wordbag(text))
+            if accumulate:
+                self._accumulate(textid, words)
+            yield textid, words
+
+    def _iter_texts(self, to_process):
+        """
+        Args:
+            to_process: Iterable of strings
+        Returns:
+            Iterator of (id, text) tuples
+        """
+        return enumerate(to_process)
+
+    def _accumulate(self, textid, words):
+        """
+        Stores the words from one processed text in masterbag
+        """
+        self.masterbag += words
 
     def _make_wordbag(self, text):
         """
@@ -80,20 +217,25 @@ class WordBagMaker(object):
         Returns:
             List of words, all lower case
         """
-        return [word.lower() for sent in nltk.tokenize.sent_tokenize(text) for word in nltk.tokenize.word_tokenize(sent)]
+        return self.tokenizer.tokenize(text)
 
-    def _check_unwanted(self, word):
+    def check_tokenizer(self, sample, reference=None):
         """
+        Reports where the configured tokenizer disagrees with a reference tokenizer
+        on a sample of texts. Run this before adopting a faster tokenizer.
+        Example:
+            bagmaker = WordBagMaker(tokenizer=FastTweetTokenizer())
+            differences = bagmaker.check_tokenizer(sample_texts)
+
         Args:
-            word: String to evaluate with ICleaner objects in _cleaners
+            sample: Iterable of strings
+            reference: ITokenizer to compare against. Defaults to NltkTokenizer
         Returns:
-            False if the the string is to be left out
-            True if the string is to be included
+            List of dictionaries with the keys 'text', 'expected' and 'result'
         """
-        for cleaner in self._cleaners:
-            if cleaner.clean(word) is False:
-                return False
-        return True
+        if reference is None:
+            reference = NltkTokenizer()
+        return self.tokenizer.compare(reference, sample)
 
 
 class TweetTextWordBagMaker(WordBagMaker):
@@ -104,18 +246,26 @@ class TweetTextWordBagMaker(WordBagMaker):
 
     Attributes:
         _cleaners: List of ICleaner objects
-        masterbag: List containing all words
-        _ignore: Tuple of strings to ignore while filtering
-        tweet_tuples: List containing tuples with the structure (tweetID, [list of words in tweet])
+        masterbag: List containing all words. In compact mode an IdBag view over tweet_tuples' token ids
+        _ignore: Frozenset of strings to ignore while filtering
+        tweet_tuples: List containing tuples with the structure (tweetID, [list of words in tweet]).
+            In compact mode a TweetTupleTable holding the words as a flat id array plus offsets
     """
-    def __init__(self):
+    def __init__(self, compact=False, vocabulary=None, tokenizer=None):
+        WordBagMaker.__init__(self, compact, vocabulary, tokenizer)
         self.tweet_tuples = []
-        WordBagMaker.__init__(self)
+        if compact:
+            self.tweet_tuples = TweetTupleTable(self.vocabulary)
+            # masterbag is the concatenation of the tweets' words, so share the storage
+            self.masterbag = self.tweet_tuples.masterbag()
 
-    def process(self, to_process):
+    def process(self, to_process, workers=None, chunksize=None):
         """
         Args:
             to_process: List of tweet dictionary objects with keys 'tweetID' and 'tweetText'
+            workers: Number of processes to shard the tweets across. None or 1 runs serially
+            chunksize: Number of tweets per shard when workers is set. Defaults to a quarter of
+                each worker's share
 
         Best time 225.85651803
 
@@ -123,17 +273,77 @@ class TweetTextWordBagMaker(WordBagMaker):
         bagmaker = TweetTextWordBagMaker()
         bagmaker.add_to_ignorelist(ignore.get_list())
         bagmaker.add_to_ignorelist(nltk.corpus.stopwords.words('english'))
+        bagmaker.process(tweets, workers=4)
+        """
+        if workers is not None and workers > 1:
+            results = self._process_in_pool(to_process, workers, chunksize)
+        else:
+            results = self.iter_process(to_process)
+        for tweetid, words in results:
+            self._accumulate(tweetid, words)
+
+    def _iter_texts(self, to_process):
+        """
+        Args:
+            to_process: Iterable of tweet dictionary objects with keys 'tweetID' and 'tweetText'
+        Returns:
+            Iterator of (tweetID, tweetText) tuples
+        """
+        return ((t['tweetID'], t['tweetText']) for t in to_process)
+
+    def _accumulate(self, tweetid, words):
+        """
+        Stores the words from one processed tweet in tweet_tuples and masterbag
         """
-        for t in to_process:
-            tweetid = t['tweetID']
-            # process text
-            words = self._make_wordbag(t['tweetText'])
-            words = [w for w in words if self._check_unwanted(w) and w not in self._ignore]
-            # process tuple
-            tweet_tuple = (tweetid, words)
-            self.tweet_tuples.append(tweet_tuple)
+        self.tweet_tuples.append((tweetid, words))
+        if not self.compact:
+            # the compact masterbag is a view over tweet_tuples and is already up to date
             self.masterbag += words
 
+    def _process_in_pool(self, to_process, workers, chunksize=None):
+        """
+        Shards the tweets across a pool of processes. Each process receives a copy of
+        this bag maker's configuration once, when it starts. Shard results are yielded
+        in the original input order so the output matches a serial run.
+
+        Args:
+            to_process: List of tweet dictionary objects with keys 'tweetID' and 'tweetText'
+            workers: Number of processes in the pool
+            chunksize: Number of tweets per shard
+        Returns:
+            Generator of (tweetID, [list of words in tweet]) tuples
+        """
+        to_process = list(to_process)
+        if chunksize is None:
+            chunksize = len(to_process) // (workers * 4) + 1
+        shards = [to_process[i:i + chunksize] for i in range(0, len(to_process), chunksize)]
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(self._worker_copy(),))
+        try:
+            for shard_result in pool.imap(_process_shard, shards):
+                for tweet_tuple in shard_result:
+                    yield tweet_tuple
+        except BaseException:
+            # a failed shard or an abandoned generator stops the remaining work
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+
+    def _worker_copy(self):
+        """
+        Returns:
+            Shallow copy of this bag maker carrying the ignore list and cleaners
+            but none of the accumulated results, for shipping to worker processes
+        """
+        worker = copy.copy(self)
+        worker.masterbag = []
+        worker.tweet_tuples = []
+        worker.vocabulary = None
+        worker._token_filter = None
+        return worker
+
     # def OLDprocess(self, list_of_dicts):
     #     for t in list(self.results):
     #         tweetid = t['tweetID']
@@ -175,4 +385,24 @@ class TweetTextWordBagMaker(WordBagMaker):
     #         self.masterbag += words
 
 
+# The bag maker installed in each pool process by _init_worker
+_worker_bagmaker = None
+
+
+def _init_worker(bagmaker):
+    """
+    Pool initializer for TweetTextWordBagMaker.process. Stores the configured
+    bag maker so that it is shipped once per process rather than once per shard
+    """
+    global _worker_bagmaker
+    _worker_bagmaker = bagmaker
+
 
+def _process_shard(shard):
+    """
+    Args:
+        shard: List of tweet dictionary objects with keys 'tweetID' and 'tweetText'
+    Returns:
+        List of (tweetID, [list of words in tweet]) tuples in shard order
+    """
+    return list(_worker_bagmaker.iter_process(shard))
@@ -0,0 +1,51 @@
+import random
+import unittest
+
+import nltk
+
+from NgramStatistics import *
+
+
+class AssociationScorerTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        self.words = [rng.choice('abcdefghijkl') for _ in range(2000)]
+        self.finders = []
+        for finder_class, measures in ((nltk.collocations.BigramCollocationFinder,
+                                        nltk.collocations.BigramAssocMeasures),
+                                       (nltk.collocations.TrigramCollocationFinder,
+                                        nltk.collocations.TrigramAssocMeasures)):
+            finder = finder_class.from_words(self.words)
+            finder.apply_freq_filter(2)
+            self.finders.append((finder, measures))
+
+    def test_scores_match_nltk(self):
+        for finder, measures in self.finders:
+            scorer = AssociationScorer.from_finder(finder)
+            for measure in AssociationScorer.measures:
+                expected = finder.score_ngrams(getattr(measures, measure))
+                result = scorer.score_ngrams(measure)
+                self.assertListEqual([ngram for ngram, score in result], [ngram for ngram, score in expected])
+                for (ngram, score), (_, expected_score) in zip(result, expected):
+                    self.assertAlmostEqual(score, expected_score, places=9)
+
+    def test_nbest_matches_nltk(self):
+        for finder, measures in self.finders:
+            scorer = AssociationScorer.from_finder(finder)
+            for measure in AssociationScorer.measures:
+                for number in (1, 10, len(scorer) + 5):
+                    self.assertListEqual(scorer.nbest(measure, number),
+                                         finder.nbest(getattr(measures, measure), number))
+
+    def test_nbest_breaks_ties_by_ngram(self):
+        scorer = AssociationScorer([('c', 'd'), ('a', 'b'), ('b', 'c')], [2, 2, 2], ([2, 2, 2], [2, 2, 2]), 6)
+        self.assertListEqual(scorer.nbest('raw_freq', 2), [('a', 'b'), ('b', 'c')])
+
+    def test_nbest_does_not_rank_whole_table(self):
+        scorer = AssociationScorer.from_finder(self.finders[0][0])
+        scorer.nbest('pmi', 5)
+        self.assertIsNone(scorer._ranks)
+
+    def test_unknown_measure(self):
+        scorer = AssociationScorer.from_finder(self.finders[0][0])
+        self.assertRaises(ValueError, scorer.score, 'fisher')
@@ -0,0 +1,366 @@
+import pickle
+import random
+import unittest
+
+from AnalysisErrors import NgramError
+from NgramTools import *
+from TextCleaningTools import IModifier, WordFilter, CustomFilter
+from Vocabulary import Vocabulary, IdBag, TweetTupleTable
+
+
+class CountingUpperModifier(IModifier):
+    """
+    Uppercases words and records each call to process
+    """
+    def __init__(self):
+        IModifier.__init__(self)
+        self.calls = []
+
+    def process(self, text, **kwargs):
+        self.calls.append(text)
+        return text.upper()
+
+
+class IModifierProcessManyTest(unittest.TestCase):
+    def test_process_many_processes_each_type_once(self):
+        modifier = CountingUpperModifier()
+        result = modifier.process_many(['back', 'pain', 'back', 'back', 'pain'])
+        self.assertListEqual(result, ['BACK', 'PAIN', 'BACK', 'BACK', 'PAIN'])
+        self.assertListEqual(sorted(modifier.calls), ['back', 'pain'])
+
+
+class BigramGetterTest(unittest.TestCase):
+    def setUp(self):
+        self.object = BigramGetter()
+        self.word_bag = ['back', 'pain', 'is', 'bad'] * 4 + ['neck', 'pain']
+
+    def test_process(self):
+        self.object.process(self.word_bag, min_freq=3)
+        self.assertIn(('back', 'pain'), self.object.topPMI)
+        self.assertEqual(self.object.collocation_finder.ngram_fd[('back', 'pain')], 4)
+        self.assertNotIn(('neck', 'pain'), self.object.collocation_finder.ngram_fd)
+
+    def test_modifiers_applied(self):
+        modifier = CountingUpperModifier()
+        self.object.add_modifier(modifier)
+        self.object.process(self.word_bag, min_freq=3)
+        self.assertEqual(self.object.collocation_finder.ngram_fd[('BACK', 'PAIN')], 4)
+        self.assertEqual(len(modifier.calls), 5)
+
+
+class CalculateErrorTest(unittest.TestCase):
+    def test_failures_raise_ngram_error(self):
+        getter = BigramGetter()
+        getter.partial_fit(['back', 'pain', 'back', 'pain'])
+
+        def fail(get_top=10):
+            raise ValueError('no scores')
+
+        getter._calculate_statistics = fail
+        with self.assertRaises(NgramError) as raised:
+            getter.calculate(min_freq=1)
+        self.assertIsInstance(raised.exception.__cause__, ValueError)
+
+
+class TrigramGetterTest(unittest.TestCase):
+    def test_process(self):
+        getter = TrigramGetter()
+        getter.process(['back', 'pain', 'is', 'bad'] * 4, min_freq=3)
+        self.assertEqual(getter.collocation_finder.ngram_fd[('back', 'pain', 'is')], 4)
+        self.assertIn(('back', 'pain', 'is'), getter.top_likelihood_ratio)
+
+
+class IncrementalNgramGetterTest(unittest.TestCase):
+    def setUp(self):
+        self.batches = [['back', 'pain', 'is', 'bad', 'back', 'pain'],
+                        ['neck', 'pain', 'is', 'bad', 'back', 'pain', 'is']]
+
+    def test_partial_fit_matches_from_words_per_batch(self):
+        getter = TrigramGetter()
+        for batch in self.batches:
+            getter.partial_fit(batch)
+        word_fd = nltk.FreqDist()
+        ngram_fd = nltk.FreqDist()
+        for batch in self.batches:
+            finder = nltk.collocations.TrigramCollocationFinder.from_words(batch)
+            word_fd.update(finder.word_fd)
+            ngram_fd.update(finder.ngram_fd)
+        self.assertEqual(getter.word_fd, word_fd)
+        self.assertEqual(getter.ngram_fd, ngram_fd)
+
+    def test_single_batch_same_as_process(self):
+        incremental = BigramGetter()
+        incremental.partial_fit(self.batches[0] * 3)
+        incremental.calculate(min_freq=2)
+        batch = BigramGetter()
+        batch.process(self.batches[0] * 3, min_freq=2)
+        self.assertListEqual(incremental.raw_freq, batch.raw_freq)
+        self.assertListEqual(incremental.topPMI, batch.topPMI)
+
+    def test_merge(self):
+        merged = BigramGetter()
+        merged.partial_fit(self.batches[0])
+        other = BigramGetter()
+        other.partial_fit(self.batches[1])
+        merged.merge(other)
+        expected = BigramGetter()
+        for batch in self.batches:
+            expected.partial_fit(batch)
+        self.assertEqual(merged.word_fd, expected.word_fd)
+        self.assertEqual(merged.ngram_fd, expected.ngram_fd)
+
+    def test_calculate_leaves_counts_intact(self):
+        getter = BigramGetter()
+        getter.partial_fit(self.batches[0])
+        getter.calculate(min_freq=2)
+        self.assertEqual(getter.ngram_fd[('pain', 'is')], 1)
+        self.assertNotIn(('pain', 'is'), getter.collocation_finder.ngram_fd)
+
+    def test_process_resets(self):
+        getter = BigramGetter()
+        getter.partial_fit(self.batches[1])
+        getter.process(self.batches[0], min_freq=1)
+        self.assertNotIn('neck', getter.word_fd)
+
+
+class IdNgramGetterTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(3)
+        self.word_bag = [rng.choice('abcdef') for _ in range(1500)]
+
+    def test_matches_bigram_and_trigram_getters(self):
+        for n, getter_class in ((2, BigramGetter), (3, TrigramGetter)):
+            getter = IdNgramGetter(n)
+            getter.process(self.word_bag, min_freq=2)
+            expected = getter_class()
+            expected.process(self.word_bag, min_freq=2)
+            self.assertListEqual(getter.raw_freq, expected.raw_freq)
+            self.assertListEqual(getter.topPMI, expected.topPMI)
+
+    def test_counts_longer_ngrams(self):
+        getter = IdNgramGetter(4)
+        getter.process(['low', 'back', 'pain', 'today'] * 3 + ['low', 'back', 'pain', 'again'], min_freq=3)
+        self.assertListEqual([ngram for ngram, score in getter.raw_freq],
+                             [('back', 'pain', 'today', 'low'), ('low', 'back', 'pain', 'today'),
+                              ('pain', 'today', 'low', 'back'), ('today', 'low', 'back', 'pain')])
+        self.assertListEqual(list(getter.sorted_ngrams)[:1], [('back', 'pain', 'today', 'low')])
+
+    def test_counts_idbag_without_decoding(self):
+        vocabulary = Vocabulary()
+        bag = IdBag(vocabulary)
+        bag += self.word_bag
+        getter = IdNgramGetter(3)
+        getter.process(bag, min_freq=2)
+        expected = IdNgramGetter(3)
+        expected.process(self.word_bag, min_freq=2)
+        self.assertIs(getter.vocabulary, vocabulary)
+        self.assertListEqual(getter.raw_freq, expected.raw_freq)
+
+    def test_wide_keys(self):
+        # 5 ids of 13 bits do not fit in an int64 key
+        words = ['w%d' % i for i in range(5000)] * 2
+        getter = IdNgramGetter(5)
+        getter.process(words, min_freq=2)
+        self.assertEqual(len(getter.raw_freq), 4996)
+        self.assertEqual(getter.raw_freq[0][0], ('w0', 'w1', 'w2', 'w3', 'w4'))
+
+    def test_partial_fit_and_merge(self):
+        vocabulary = Vocabulary()
+        first = IdNgramGetter(4, vocabulary)
+        first.partial_fit(self.word_bag[:700])
+        second = IdNgramGetter(4, vocabulary)
+        second.partial_fit(self.word_bag[700:])
+        first.merge(second)
+        expected = IdNgramGetter(4)
+        expected.partial_fit(self.word_bag[:700])
+        expected.partial_fit(self.word_bag[700:])
+        first.calculate(min_freq=1)
+        expected.calculate(min_freq=1)
+        self.assertListEqual(first.raw_freq, expected.raw_freq)
+        self.assertEqual(sum(count for count in first.gram_counts), 1500 - 2 * 3)
+
+    def test_batches_folded_in_lazily(self):
+        getter = IdNgramGetter(3)
+        for start in range(0, 1500, 50):
+            getter.partial_fit(self.word_bag[start:start + 50])
+        self.assertEqual(len(getter._pending), 30)
+        expected = IdNgramGetter(3)
+        expected.process(self.word_bag[:50], min_freq=1)
+        for start in range(50, 1500, 50):
+            expected.partial_fit(self.word_bag[start:start + 50])
+            expected._consolidate()
+        self.assertListEqual(getter.grams.tolist(), expected.grams.tolist())
+        self.assertListEqual(getter.gram_counts.tolist(), expected.gram_counts.tolist())
+        self.assertListEqual(getter._pending, [])
+
+
+class DocumentNgramTest(unittest.TestCase):
+    def setUp(self):
+        self.tweet_tuples = [(1, ['back', 'pain', 'back', 'pain']),
+                             (2, ['pain', 'killers', 'back']),
+                             (3, []),
+                             (4, ['back', 'pain', 'killers'])]
+
+    def test_no_ngrams_across_tweets(self):
+        getter = BigramGetter()
+        getter.process_documents(self.tweet_tuples, min_freq=1)
+        self.assertNotIn(('pain', 'pain'), getter.ngram_fd)
+        self.assertNotIn(('back', 'back'), getter.ngram_fd)
+        self.assertEqual(getter.ngram_fd[('back', 'pain')], 3)
+        self.assertEqual(getter.word_fd['back'], 4)
+
+    def test_document_frequency(self):
+        getter = TrigramGetter()
+        getter.process_documents(self.tweet_tuples, min_freq=1)
+        self.assertEqual(getter.document_fd[('back', 'pain', 'back')], 1)
+        self.assertEqual(getter.document_fd[('back', 'pain', 'killers')], 1)
+        bigrams = BigramGetter()
+        bigrams.process_documents(self.tweet_tuples, min_freq=1)
+        self.assertEqual(bigrams.ngram_fd[('back', 'pain')], 3)
+        self.assertEqual(bigrams.document_fd[('back', 'pain')], 2)
+
+    def test_workers_match_serial(self):
+        serial = BigramGetter()
+        serial.process_documents(self.tweet_tuples * 5, min_freq=1)
+        pooled = BigramGetter()
+        pooled.process_documents(self.tweet_tuples * 5, min_freq=1, workers=2, chunksize=3)
+        self.assertEqual(pooled.ngram_fd, serial.ngram_fd)
+        self.assertEqual(pooled.document_fd, serial.document_fd)
+        self.assertListEqual(pooled.raw_freq, serial.raw_freq)
+
+    def test_workers_twice_on_one_getter(self):
+        for getter in (BigramGetter(), TrigramGetter(), IdNgramGetter(3)):
+            getter.process_documents(self.tweet_tuples * 5, min_freq=1, workers=2, chunksize=3)
+            first = getter.raw_freq
+            # the worker copy must be picklable under the spawn start method too
+            pickle.dumps(getter._worker_copy())
+            getter.process_documents(self.tweet_tuples * 5, min_freq=1, workers=2, chunksize=3)
+            self.assertListEqual(getter.raw_freq, first)
+
+    def test_id_getter_matches_tuple_getter(self):
+        expected = BigramGetter()
+        expected.process_documents(self.tweet_tuples, min_freq=1)
+        getter = IdNgramGetter(2)
+        getter.process_documents(self.tweet_tuples, min_freq=1)
+        self.assertListEqual(getter.raw_freq, expected.raw_freq)
+        self.assertEqual(getter.document_fd, expected.document_fd)
+
+    def test_id_getter_on_tweet_tuple_table(self):
+        table = TweetTupleTable(Vocabulary())
+        for tweet_tuple in self.tweet_tuples * 5:
+            table.append(tweet_tuple)
+        expected = TrigramGetter()
+        expected.process_documents(self.tweet_tuples * 5, min_freq=1)
+        for workers in (None, 2):
+            getter = IdNgramGetter(3)
+            getter.process_documents(table, min_freq=1, workers=workers, chunksize=3)
+            self.assertIs(getter.vocabulary, table.vocabulary)
+            self.assertListEqual(getter.raw_freq, expected.raw_freq)
+            self.assertEqual(getter.document_fd, expected.document_fd)
+
+
+class PushDownFilterTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(5)
+        self.word_bag = [rng.choice(['the', 'back', 'pain', 'is', 'bad', 'and', 'neck']) for _ in range(1000)]
+        self.word_filter = WordFilter()
+        self.word_filter.filter_words = ['the', 'and']
+        self.custom_filter = CustomFilter()
+        self.custom_filter.set_filter(lambda *ngram: ngram[0] == ngram[-1])
+
+    def expected(self, finder_class, min_freq):
+        finder = finder_class.from_words(self.word_bag)
+        finder.apply_word_filter(lambda w: w in ('the', 'and'))
+        finder.apply_ngram_filter(lambda *ngram: ngram[0] == ngram[-1])
+        finder.apply_freq_filter(min_freq)
+        return finder
+
+    def test_filters_applied_while_counting(self):
+        for getter, finder_class in ((BigramGetter(), nltk.collocations.BigramCollocationFinder),
+                                     (TrigramGetter(), nltk.collocations.TrigramCollocationFinder)):
+            getter.add_filter(self.word_filter)
+            getter.add_filter(self.custom_filter)
+            getter.process(self.word_bag, min_freq=2)
+            expected = self.expected(finder_class, 2)
+            self.assertEqual(getter.collocation_finder.ngram_fd, expected.ngram_fd)
+            self.assertEqual(getter.word_fd, expected.word_fd)
+            self.assertFalse(any('the' in ngram for ngram in getter.ngram_fd))
+
+    def test_filter_words_changed_after_counting(self):
+        getter = BigramGetter()
+        getter.add_filter(self.word_filter)
+        getter.process(self.word_bag, min_freq=1)
+        self.word_filter.filter_words = 'neck'
+        getter.process(self.word_bag, min_freq=1)
+        self.assertFalse(any('neck' in ngram for ngram in getter.ngram_fd))
+
+    def test_id_getter_filters(self):
+        expected = TrigramGetter()
+        expected.add_filter(self.word_filter)
+        expected.add_filter(self.custom_filter)
+        expected.process(self.word_bag, min_freq=2)
+        getter = IdNgramGetter(3)
+        getter.add_filter(self.word_filter)
+        getter.add_filter(self.custom_filter)
+        getter.process(self.word_bag, min_freq=2)
+        self.assertListEqual(getter.raw_freq, expected.raw_freq)
+        self.assertListEqual(getter.topPMI, expected.topPMI)
+
+    def test_id_getter_filters_in_workers(self):
+        table = TweetTupleTable(Vocabulary())
+        for i in range(0, len(self.word_bag), 10):
+            table.append((i, self.word_bag[i:i + 10]))
+        getter = IdNgramGetter(2)
+        getter.add_filter(self.word_filter)
+        getter.process_documents(table, min_freq=1, workers=2)
+        self.assertTrue(len(getter.raw_freq))
+        self.assertFalse(any('and' in ngram for ngram, score in getter.raw_freq))
+
+    def test_apply_filters(self):
+        getter = BigramGetter()
+        getter.process(self.word_bag, min_freq=1)
+        getter.add_filter(self.word_filter)
+        getter.apply_filters()
+        self.assertFalse(any('the' in ngram for ngram in getter.collocation_finder.ngram_fd))
+
+
+class BoundedNgramTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(13)
+        common = ['back', 'pain', 'neck', 'is', 'bad']
+        self.word_bags = [[rng.choice(common) if rng.random() < 0.5 else 'w%d' % rng.randrange(3000)
+                           for _ in range(12)] for _ in range(300)]
+
+    def test_matches_exact_counts(self):
+        for getter_class in (BigramGetter, TrigramGetter):
+            exact = getter_class()
+            exact.process_documents([(i, words) for i, words in enumerate(self.word_bags)], min_freq=3)
+            bounded = getter_class()
+            bounded.process_bounded(self.word_bags, min_freq=3, max_entries=2000)
+            self.assertLess(bounded.approximation_error, 3)
+            self.assertEqual(bounded.collocation_finder.ngram_fd, exact.collocation_finder.ngram_fd)
+            self.assertListEqual(bounded.raw_freq, exact.raw_freq)
+            self.assertListEqual(bounded.topPMI, exact.topPMI)
+            self.assertListEqual(bounded.top_likelihood_ratio, exact.top_likelihood_ratio)
+            self.assertLess(len(bounded.ngram_fd), len(exact.ngram_fd))
+
+    def test_spilling_matches_exact_counts(self):
+        for getter_class in (BigramGetter, TrigramGetter):
+            exact = getter_class()
+            exact.process_documents([(i, words) for i, words in enumerate(self.word_bags)], min_freq=3)
+            spilling = getter_class()
+            spilling.process_spilling(self.word_bags, min_freq=3, max_entries=500)
+            self.assertEqual(spilling.collocation_finder.ngram_fd, exact.collocation_finder.ngram_fd)
+            self.assertListEqual(spilling.raw_freq, exact.raw_freq)
+            self.assertListEqual(spilling.topPMI, exact.topPMI)
+            self.assertListEqual(spilling.top_likelihood_ratio, exact.top_likelihood_ratio)
+            for ngram in spilling.ngram_fd:
+                self.assertEqual(spilling.document_fd[ngram], exact.document_fd[ngram])
+
+    def test_bounded_rejects_iterators(self):
+        self.assertRaises(TypeError, BigramGetter().process_bounded, iter(self.word_bags))
+
+    def test_id_getter_has_no_bounded_modes(self):
+        getter = IdNgramGetter(3)
+        self.assertRaises(NotImplementedError, getter.process_bounded, self.word_bags)
+        self.assertRaises(NotImplementedError, getter.process_spilling, self.word_bags)
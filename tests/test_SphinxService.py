@@ -0,0 +1,208 @@
+import importlib
+import os
+import random
+import sqlite3
+import sys
+import types
+import unittest
+
+# SphinxService imports sphinxapi relative to the TextTools package and the
+# IOMDataService database layer, neither of which ships with this repository.
+# The stand-ins below are installed before importing it: a SphinxClient which
+# answers from canned data and an IOMService backed by an in-memory SQLite database.
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeSphinxClient(object):
+    """
+    Stand-in for sphinxapi.SphinxClient. Queries for a term in self.terms match its
+    ids, any other query matches self.matches. Like searchd, Query honours the offset
+    and limit, caps total at max_matches and reports the real count in total_found
+    """
+
+    def __init__(self):
+        self.matches = []
+        self.terms = {}
+        self.calls = []
+        self.queued = []
+        self.limits = (0, 20, 1000)
+
+    def SetServer(self, host, port):
+        pass
+
+    def SetLimits(self, offset, limit, maxmatches=0, cutoff=0):
+        self.limits = (offset, limit, maxmatches)
+
+    def SetSortMode(self, mode, clause=''):
+        pass
+
+    def SetRankingMode(self, ranker, rankexpr=''):
+        pass
+
+    def SetMatchMode(self, mode):
+        pass
+
+    def GetLastError(self):
+        return ''
+
+    def GetLastWarning(self):
+        return ''
+
+    def _result(self, query):
+        ids = self.terms.get(query, self.matches)
+        offset, limit, maxmatches = self.limits
+        page = ids[offset:offset + limit]
+        return {'matches': [{'id': idnum, 'weight': 1, 'attrs': {}} for idnum in page],
+                'total': min(len(ids), maxmatches), 'total_found': len(ids), 'error': '', 'warning': ''}
+
+    def Query(self, query, index='*', comment=''):
+        self.calls.append(('Query', query))
+        return self._result(query)
+
+    def AddQuery(self, query, index='*', comment=''):
+        self.queued.append(query)
+        return len(self.queued) - 1
+
+    def RunQueries(self):
+        self.calls.append(('RunQueries', len(self.queued)))
+        results = [self._result(query) for query in self.queued]
+        self.queued = []
+        return results
+
+    def BuildExcerpts(self, docs, index, words, opts=None):
+        self.calls.append(('BuildExcerpts', len(docs)))
+        return [doc.replace(words, '~%s~' % words) for doc in docs]
+
+
+class FakeIOMService(object):
+    """
+    Stand-in for IOMDataService.IOMService over SQLite. Takes queries with the
+    mysql %s placeholders in self.query and their values in self.val
+    """
+
+    def __init__(self):
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.row_factory = sqlite3.Row
+        self.queries = []
+        self.results = []
+
+    def connect_to_mysql(self, test):
+        pass
+
+    def _execute(self):
+        self.queries.append(self.query)
+        return self.connection.execute(self.query.replace('%s', '?'), list(self.val))
+
+    def returnAll(self):
+        self.results = [dict(row) for row in self._execute().fetchall()]
+
+    def executeQuery(self):
+        self._execute()
+        self.connection.commit()
+
+
+def import_sphinx_service():
+    package = types.ModuleType('TextTools')
+    package.__path__ = [REPO_DIR]
+    sphinxapi = types.ModuleType('TextTools.sphinxapi')
+    sphinxapi.SphinxClient = FakeSphinxClient
+    iom = types.ModuleType('IOMDataService')
+    iom.IOMService = FakeIOMService
+    saved = dict((name, sys.modules.get(name)) for name in ('TextTools', 'TextTools.sphinxapi', 'IOMDataService'))
+    sys.modules.update({'TextTools': package, 'TextTools.sphinxapi': sphinxapi, 'IOMDataService': iom})
+    try:
+        return importlib.import_module('TextTools.SphinxService')
+    finally:
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+
+SphinxService = import_sphinx_service()
+
+
+class SphinxSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.object = SphinxService.SphinxSearch()
+        self.object.setPresetTables('iomAll')
+        self.object.connection.execute("CREATE TABLE testimony_all (quoteID INTEGER PRIMARY KEY, quoteText TEXT)")
+        self.object.connection.executemany("INSERT INTO testimony_all VALUES (?, ?)",
+                                           [(i, 'quote %d about pain' % i) for i in range(1, 1301)])
+        self.object.queries = []
+
+    def test_getContent_batches_and_keeps_order(self):
+        ids = list(range(1, 1201))
+        random.Random(31).shuffle(ids)
+        self.object.resultIDs = ids
+        self.object.getContent(batch_size=500)
+        self.assertEqual(len(self.object.queries), 3)
+        self.assertListEqual([r['quoteID'] for r in self.object.result_content], ids)
+        self.assertEqual(self.object.result_content[0]['quoteText'], 'quote %d about pain' % ids[0])
+
+    def test_getContent_skips_missing_rows(self):
+        self.object.resultIDs = [5, 99999, 3]
+        self.object.getContent()
+        self.assertEqual(len(self.object.queries), 1)
+        self.assertListEqual([r['quoteID'] for r in self.object.result_content], [5, 3])
+
+    def test_search_pages_past_max_results(self):
+        self.object.matches = list(range(12001, 0, -1))
+        self.object.search('pain')
+        self.assertListEqual(self.object.resultIDs, list(range(12001, 0, -1)))
+        self.assertEqual(len([c for c in self.object.calls if c[0] == 'Query']), 3)
+        self.assertEqual(self.object.limits, (0, 5000, 5000))
+
+    def test_iter_search_is_lazy(self):
+        self.object.matches = list(range(1, 101))
+        pages = self.object.iter_search('pain', page_size=10)
+        self.assertListEqual([next(pages) for i in range(15)], list(range(1, 16)))
+        self.assertEqual(len(self.object.calls), 2)
+        pages.close()
+        self.assertEqual(self.object.limits, (0, 5000, 5000))
+
+    def test_search_many_in_one_round_trip(self):
+        self.object.terms = {'pain': [1, 2, 3], 'pains': [3, 4], 'painful': []}
+        found = self.object.search_many(['pain', 'pains', 'painful'])
+        self.assertListEqual(self.object.calls, [('RunQueries', 3)])
+        self.assertDictEqual(found, {'pain': [1, 2, 3], 'pains': [3, 4], 'painful': []})
+        self.assertListEqual(self.object.resultIDs, [1, 2, 3, 4])
+
+
+class SphinxExcerptTest(unittest.TestCase):
+    def setUp(self):
+        self.object = SphinxService.SphinxSearch()
+        self.object.setPresetTables('iomAll')
+        self.object.connection.execute("CREATE TABLE testimony_all (quoteID INTEGER PRIMARY KEY, quoteText TEXT)")
+        self.object.connection.execute("CREATE TABLE masked_main (quoteID INTEGER PRIMARY KEY, quoteText TEXT)")
+        self.object.connection.executemany("INSERT INTO testimony_all VALUES (?, ?)",
+                                           [(i, 'my back pain is bad %d' % i) for i in range(1, 2501)])
+        self.object.queries = []
+        self.object.matches = list(range(2500, 0, -1))
+
+    def masked_rows(self):
+        return self.object.connection.execute("SELECT quoteID, quoteText FROM masked_main ORDER BY quoteID").fetchall()
+
+    def test_buildExcerpts_batches(self):
+        self.object.search('pain')
+        self.object.getContent()
+        self.object.buildExcerpts(batch_size=1000)
+        self.assertListEqual([c for c in self.object.calls if c[0] == 'BuildExcerpts'],
+                             [('BuildExcerpts', 1000), ('BuildExcerpts', 1000), ('BuildExcerpts', 500)])
+        self.assertDictEqual(self.object.excerpts[0], {'quoteID': 2500, 'quoteText': 'my back ~pain~ is bad 2500'})
+
+    def test_mask_and_insert_in_multirow_inserts(self):
+        self.object.mask_term('pain')
+        self.object.insertExcerpts()
+        rows = self.masked_rows()
+        self.assertEqual(len(rows), 2500)
+        self.assertEqual(tuple(rows[6]), (7, 'my back  is bad 7'))
+        # 5 SELECTs for the content and 3 INSERTs of up to 1000 rows
+        self.assertEqual(len(self.object.queries), 8)
+
+    def test_insert_batch_size(self):
+        self.object.mask_term('pain')
+        self.object.insertExcerpts(batch_size=300)
+        self.assertEqual(len(self.masked_rows()), 2500)
+        self.assertEqual(len([q for q in self.object.queries if q.startswith('INSERT')]), 9)
@@ -0,0 +1,129 @@
+import random
+import unittest
+from collections import Counter
+
+from StreamingCounters import *
+
+
+class LossyCounterTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(11)
+        # a few heavy items in a long tail of rare ones
+        self.batches = [[rng.choice('abc') if rng.random() < 0.3 else rng.randrange(5000) for _ in range(100)]
+                        for _ in range(50)]
+        self.truth = Counter(item for batch in self.batches for item in batch)
+
+    def check_bounds(self, counter):
+        for item, true_count in self.truth.items():
+            if item in counter:
+                self.assertLessEqual(counter.count(item), true_count)
+                self.assertLessEqual(true_count, counter.upper_bound(item))
+            else:
+                self.assertLessEqual(true_count, counter.error)
+
+    def test_max_entries_bounds_table(self):
+        counter = LossyCounter(max_entries=200)
+        for batch in self.batches:
+            counter.update(batch)
+            self.assertLessEqual(len(counter), 200)
+        self.assertEqual(counter.total, 5000)
+        self.check_bounds(counter)
+        self.assertTrue(set('abc') <= counter.candidates(counter.error + 1))
+
+    def test_max_entries_bounds_one_large_batch(self):
+        sizes = []
+
+        class RecordingCounter(LossyCounter):
+            def _update(self, items):
+                LossyCounter._update(self, items)
+                sizes.append(len(self.counts))
+
+        counter = RecordingCounter(max_entries=200)
+        counter.update(item for batch in self.batches for item in batch)
+        self.assertLessEqual(max(sizes), 200)
+        self.assertEqual(counter.total, 5000)
+        self.check_bounds(counter)
+
+    def test_epsilon_bounds_error(self):
+        counter = LossyCounter(epsilon=0.001)
+        for batch in self.batches:
+            counter.update(batch)
+        self.assertLessEqual(counter.error, 0.001 * counter.total)
+        self.check_bounds(counter)
+
+    def test_exact_without_pruning(self):
+        counter = LossyCounter(max_entries=100000)
+        for batch in self.batches:
+            counter.update(batch)
+        self.assertEqual(counter.error, 0)
+        self.assertEqual(counter.counts, dict(self.truth))
+
+
+class SpillingCounterTest(unittest.TestCase):
+    def test_items_match_counter(self):
+        rng = random.Random(17)
+        batches = [[('w%d' % rng.randrange(400), 'w%d' % rng.randrange(5)) for _ in range(50)] for _ in range(40)]
+        with SpillingCounter(max_entries=100) as counter:
+            for batch in batches:
+                counter.update(batch)
+            self.assertTrue(len(counter.runs) > 1)
+            expected = Counter(item for batch in batches for item in batch)
+            self.assertListEqual(list(counter.items()), sorted(expected.items()))
+            # runs can be merged again
+            self.assertEqual(sum(count for item, count in counter.items()), 2000)
+        self.assertListEqual(counter.runs, [])
+
+    def test_runs_merged_past_max_runs(self):
+        rng = random.Random(19)
+        batches = [['w%d' % rng.randrange(300) for _ in range(40)] for _ in range(60)]
+        with SpillingCounter(max_entries=20, max_runs=4) as counter:
+            most_runs = 0
+            for batch in batches:
+                counter.update(batch)
+                most_runs = max(most_runs, len(counter.runs))
+            self.assertLess(most_runs, 4)
+            expected = Counter(item for batch in batches for item in batch)
+            self.assertListEqual(list(counter.items()), sorted(expected.items()))
+
+    def test_no_spill(self):
+        counter = SpillingCounter()
+        counter.update(['b', 'a', 'b'])
+        self.assertListEqual(list(counter.items()), [('a', 1), ('b', 2)])
+        self.assertListEqual(counter.runs, [])
+
+
+class SpaceSavingCounterTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(23)
+        # a zipf-like stream
+        self.batches = [[int(rng.paretovariate(1.2)) for _ in range(200)] for _ in range(50)]
+        self.truth = Counter(item for batch in self.batches for item in batch)
+
+    def test_bounds(self):
+        counter = SpaceSavingCounter(50)
+        for batch in self.batches:
+            counter.update(batch)
+            self.assertLessEqual(len(counter), 50)
+        self.assertEqual(counter.total, 10000)
+        self.assertLessEqual(counter.min_count, counter.total / 50)
+        for item, true_count in self.truth.items():
+            lower, upper = counter.bounds(item)
+            self.assertLessEqual(lower, true_count)
+            self.assertLessEqual(true_count, upper)
+            if true_count > counter.total / 50:
+                self.assertIn(item, counter)
+
+    def test_top_is_exact(self):
+        counter = SpaceSavingCounter(50)
+        for batch in self.batches:
+            counter.update(batch)
+        expected = [item for item, count in sorted(self.truth.items(), key=lambda kv: (-kv[1], kv[0]))[:5]]
+        self.assertTrue(counter.top_is_exact(5))
+        self.assertListEqual(sorted(item for item, count, error in counter.top(5)), sorted(expected))
+
+    def test_exact_below_capacity(self):
+        counter = SpaceSavingCounter(1000)
+        counter.update(['a', 'b', 'a'])
+        self.assertListEqual(counter.top(2), [('a', 2, 0), ('b', 1, 0)])
+        self.assertEqual(counter.min_count, 0)
+        self.assertTrue(counter.top_is_exact(5))
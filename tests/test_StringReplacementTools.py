@@ -0,0 +1,295 @@
+import pickle
+import re
+import unittest
+from StringReplacementTools import *
+
+
+def sequential_replace(patterns, text):
+    """
+    The reference semantics: re.subn with each pattern in turn
+    """
+    s = text
+    for (pattern, repl) in patterns:
+        (s, count) = re.subn(pattern, repl, s)
+    return s
+
+
+SAMPLE_TEXTS = [
+    "I won't go", "Won't you?", "swon't", "scan't", "I can't, you can't", "i'm here", "I'm here",
+    "this ain't it", "Ain't", "they'll", "you'll've", "didn't", "couldn't've", "it's", "what's", "that's",
+    "we're", "they'd", "I'd've", "no contractions here", "", "'", "''ll", "don't won't can't ain't",
+    "rock'n'roll", "o'clock", "it'snot", "pain'll be", "ain't'nt",
+]
+
+
+class RequiredLiteralTest(unittest.TestCase):
+    def test_required_literal(self):
+        test = [(r"won\'t", "won't"), (r"(\w+)n\'t", "n't"), (r"(\w+t)\'s", "'s"), (r'colou?r', 'colo'),
+                (r'cat|dog', ''), (r'a[bc]+d', 'a'), (r'(\w+).', ''), (r'ab*c', 'a'), (r'x\.y', 'x.y')]
+        for t in test:
+            self.assertEqual(required_literal(t[0]), t[1])
+
+    def test_quantifiers_and_escapes_are_not_literals(self):
+        test = [(r'ab{2}c', 'a'), (r'a{1,3}', ''), (r'lo{2,}l', 'l'), (r'\x41b', 'Ab'), (r'\101b', 'Ab'),
+                (r'\N{EN DASH}x', '\u2013x'), (r'\d+px', 'px')]
+        for t in test:
+            self.assertEqual(required_literal(t[0]), t[1])
+
+
+class RegexpReplacementEngineTest(unittest.TestCase):
+    def assert_sequential(self, patterns, texts):
+        engine = RegexpReplacementEngine(patterns)
+        for text in texts:
+            self.assertEqual(engine.replace(text), sequential_replace(patterns, text), text)
+
+    def test_contractions_match_sequential(self):
+        self.assert_sequential(replacement_patterns, SAMPLE_TEXTS)
+
+    def test_overlapping_patterns_match_sequential(self):
+        # the second pattern only matches the output of the first
+        patterns = [(r'ab', 'xy'), (r'yc', 'Z'), (r'(\w)\1', r'\1')]
+        self.assert_sequential(patterns, ['abc', 'aabbc', 'yc', 'nothing', 'abab'])
+        self.assertIsNone(RegexpReplacementEngine(patterns).gate)
+
+    def test_gate_skips_only_while_text_unchanged(self):
+        # the untriggered patterns only match after the first pattern has run
+        patterns = [(r'cat', 'c4t'), (r'\d+', '#'), (r'[xy]+', 'Q')]
+        self.assertIsNotNone(RegexpReplacementEngine(patterns).gate)
+        self.assert_sequential(patterns, ['cat', 'dog', 'xz cat', '12', 'concatenate'])
+
+    def test_flag_compiled_patterns_match_sequential(self):
+        patterns = [(re.compile(r"won't   # contraction", re.VERBOSE), 'will not'),
+                    (re.compile(r"can't", re.IGNORECASE), 'cannot')]
+        self.assert_sequential(patterns, ["I won't", "I won't   # contraction", "CAN'T", "can't"])
+        self.assertEqual(required_literal(r"won't   # contraction", re.VERBOSE), "won't")
+
+    def test_quantified_and_escaped_patterns_match_sequential(self):
+        patterns = [(r'ab{2}c', 'X'), (r'lo{1,3}l', 'lol'), (r'\x41b', 'Y'), (r'\N{EN DASH}x', '-')]
+        self.assert_sequential(patterns, ['abbc', 'loool', 'looool', 'Ab', '\u2013x', '2}c', '1,3}', '41b', 'DASH}x'])
+
+    def test_unmatched_text_returned_as_is(self):
+        engine = RegexpReplacementEngine(replacement_patterns)
+        text = "no apostrophes at all"
+        self.assertIs(engine.replace(text), text)
+
+
+class RegexpReplacerTest(unittest.TestCase):
+    def test_replace(self):
+        replacer = RegexpReplacer()
+        self.assertEqual(replacer.replace("I should've done that thing I didn't do"),
+                         'I should have done that thing I did not do')
+
+    def test_add_replacement_pattern(self):
+        replacer = RegexpReplacer()
+        replacer.add_replacement_pattern((r'gonna', 'going to'))
+        self.assertEqual(replacer.replace("i'm gonna"), 'i am going to')
+
+
+class WordNetLexiconTest(unittest.TestCase):
+    def setUp(self):
+        self.object = WordNetLexicon({'n': ['love', 'goose', 'kiss', 'ooh'], 'v': ['go', 'love']},
+                                     {'v': {'went': ['go'], 'lovees': ['nothing']}})
+
+    def test_contains(self):
+        test = [('love', True), ('Love', True), ('kisses', True), ('loving', True), ('went', True),
+                ('lovees', False), ('loove', False), ('painnn', False)]
+        for t in test:
+            self.assertEqual(t[0] in self.object, t[1], t[0])
+
+    def test_save_and_load(self):
+        import os
+        import tempfile
+        path = os.path.join(tempfile.mkdtemp(), 'lexicon.pickle')
+        self.object.save(path)
+        loaded = WordNetLexicon.load_or_build(path)
+        self.assertEqual(loaded.lemmas, self.object.lemmas)
+        self.assertIn('kisses', loaded)
+
+
+class RepeatReplacerTest(unittest.TestCase):
+    def setUp(self):
+        lexicon = WordNetLexicon({'n': ['love', 'goose', 'ooh', 'pain']})
+        self.object = RepeatReplacer(lexicon=lexicon)
+
+    def test_replace(self):
+        test = [('looooove', 'love'), ('oooooh', 'ooh'), ('goose', 'goose'), ('painnnnnnn', 'pain'),
+                ('zzzzz', 'z')]
+        for t in test:
+            self.assertEqual(self.object.replace(t[0]), t[1])
+
+    def test_replace_many_memoizes(self):
+        self.assertListEqual(self.object.replace_many(['painnn', 'painnn', 'goose']), ['pain', 'pain', 'goose'])
+        self.assertDictEqual(self.object._replaced, {'painnn': 'pain', 'goose': 'goose'})
+
+
+class AntonymReplacerTest(unittest.TestCase):
+    def setUp(self):
+        antonym_map = AntonymMap({('uglify', 'v'): ['beautify'], ('beautify', 'v'): ['uglify'],
+                                  ('good', 'n'): ['bad', 'evil'], ('good', 'a'): ['bad'],
+                                  ('happy', 'a'): ['unhappy']},
+                                 {'a': {'happier': ['happy']}})
+        self.object = AntonymReplacer(antonym_map)
+
+    def test_replace(self):
+        test = [('uglify', 'beautify'), ('uglifies', 'beautify'), ('good', None), ('happier', 'unhappy'),
+                ('pain', None)]
+        for t in test:
+            self.assertEqual(self.object.replace(t[0]), t[1], t[0])
+        self.assertEqual(self.object.replace('good', pos='a'), 'bad')
+
+    def test_replace_negations_many(self):
+        test = [['do', 'not', 'uglify', 'our', 'code'], ['good', 'is', 'not', 'evil'], ['not'], []]
+        expect = [['do', 'beautify', 'our', 'code'], ['good', 'is', 'not', 'evil'], ['not'], []]
+        self.assertListEqual(self.object.replace_negations_many(test), expect)
+
+    def test_save_and_load(self):
+        import os
+        import tempfile
+        path = os.path.join(tempfile.mkdtemp(), 'antonyms.pickle')
+        self.object.antonym_map.save(path)
+        replacer = AntonymReplacer(map_path=path)
+        self.assertEqual(replacer.replace('beautify'), 'uglify')
+
+
+class SymSpellIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.object = SymSpellIndex({'pain': 50, 'paint': 5, 'back': 30, 'cookbook': 2, 'migraine': 8})
+
+    def test_lookup(self):
+        test = [('pain', 'pain'), ('pian', 'pain'), ('pan', 'pain'), ('bakc', 'back'), ('cookbok', 'cookbook'),
+                ('migrane', 'migraine'), ('zzzzzz', None)]
+        for t in test:
+            self.assertEqual(self.object.lookup(t[0]), t[1], t[0])
+
+    def test_lookup_prefers_distance_then_frequency(self):
+        # 'pains' is one edit from 'pain' and 'paint'; pain is more frequent
+        self.assertEqual(self.object.lookup('pains'), 'pain')
+        self.assertEqual(self.object.lookup('paintt'), 'paint')
+
+    def test_lookup_respects_max_dist(self):
+        self.assertIsNone(self.object.lookup('pnx', max_dist=1))
+        self.assertEqual(self.object.lookup('mgrane'), 'migraine')
+        self.assertIsNone(self.object.lookup('mgrne'))
+
+    def test_lookup_finds_everything_within_max_dist(self):
+        words = ['abc', 'abd', 'xbc', 'ab', 'abcd', 'bca', 'a', 'cab']
+        index = SymSpellIndex(words)
+        for probe in ['abc', 'ac', 'bac', 'xyz', 'abdc', 'c', '', 'qqqqq']:
+            nearest = min(edit_distance(probe, w) for w in words)
+            result = index.lookup(probe)
+            if nearest > 2:
+                self.assertIsNone(result, probe)
+            else:
+                self.assertEqual(edit_distance(probe, result), nearest, probe)
+
+    def test_prefix_length_caps_deletes(self):
+        words = ['migraine', 'migraines', 'headache', 'headaches', 'backache', 'stomachache']
+        capped = SymSpellIndex(words, prefix_length=4)
+        full = SymSpellIndex(words, prefix_length=100)
+        self.assertLess(len(capped.deletes), len(full.deletes))
+        for probe in ['migrane', 'migranes', 'headahce', 'hedache', 'bakache', 'stomachace', 'zzzz']:
+            self.assertEqual(capped.lookup(probe), full.lookup(probe), probe)
+
+    def test_save_and_load(self):
+        import os
+        import tempfile
+        fname = os.path.join(tempfile.mkdtemp(), 'index.symspell')
+        self.object.save(fname)
+        loaded = SymSpellIndex.load_or_build(fname)
+        self.assertEqual(loaded.lookup('migrane'), 'migraine')
+        self.assertEqual(loaded.deletes, self.object.deletes)
+
+    def test_from_corpus(self):
+        index = SymSpellIndex.from_corpus(['pain', 'pain', 'pian'], min_count=2)
+        self.assertIn('pain', index)
+        self.assertNotIn('pian', index)
+
+
+class CustomSpellingReplacerTest(unittest.TestCase):
+    def setUp(self):
+        self.object = CustomSpellingReplacer(SymSpellIndex(['pain', 'back', 'neck']), max_dist=1)
+
+    def test_replace_many(self):
+        test = ['bakc', 'paiin', 'nekc', 'pain', 'paiin']
+        expect = ['bakc', 'pain', 'nekc', 'pain', 'pain']
+        self.assertListEqual(self.object.replace_many(test), expect)
+        self.assertEqual(len(self.object._replaced), 4)
+
+
+class WordMapFileTest(unittest.TestCase):
+    def setUp(self):
+        import os
+        import tempfile
+        self.directory = tempfile.mkdtemp()
+        self.word_map = {'bday': 'birthday', 'gr8': 'great', 'migrane': 'migraine', 'café': 'coffee', '': 'empty'}
+        self.fname = os.path.join(self.directory, 'synonyms.map')
+        WordMapFile.compile(self.word_map, self.fname)
+        self.object = WordMapFile(self.fname)
+
+    def tearDown(self):
+        self.object.close()
+
+    def test_lookups(self):
+        for word, replacement in self.word_map.items():
+            self.assertEqual(self.object.get(word), replacement)
+            self.assertEqual(self.object[word], replacement)
+            self.assertIn(word, self.object)
+        self.assertIsNone(self.object.get('happy'))
+        self.assertNotIn('bdays', self.object)
+        self.assertRaises(KeyError, lambda: self.object['happy'])
+        self.assertEqual(len(self.object), len(self.word_map))
+
+    def test_pickle_reopens_file(self):
+        clone = pickle.loads(pickle.dumps(self.object))
+        self.assertEqual(clone.get('gr8'), 'great')
+        clone.close()
+
+    def test_rejects_other_files(self):
+        import os
+        fname = os.path.join(self.directory, 'synonyms.csv')
+        with open(fname, 'w') as f:
+            f.write('bday,birthday\n' * 4)
+        self.assertRaises(ValueError, WordMapFile, fname)
+
+
+class WordReplacerFilesTest(unittest.TestCase):
+    def setUp(self):
+        import os
+        import tempfile
+        self.directory = tempfile.mkdtemp()
+        self.csv = os.path.join(self.directory, 'synonyms.csv')
+        with open(self.csv, 'w') as f:
+            f.write('bday,birthday\ngr8,great\n')
+        self.yaml = os.path.join(self.directory, 'synonyms.yaml')
+        with open(self.yaml, 'w') as f:
+            f.write('bday: birthday\ngr8: great\n')
+
+    def test_csv_and_yaml(self):
+        for replacer in [CsvWordReplacer(self.csv), YamlWordReplacer(self.yaml)]:
+            self.assertListEqual(replacer.replace_many(['happy', 'bday', 'gr8']), ['happy', 'birthday', 'great'])
+
+    def test_compiled(self):
+        import os
+        for cls, fname in [(CsvWordReplacer, self.csv), (YamlWordReplacer, self.yaml)]:
+            map_fname = os.path.join(self.directory, cls.__name__ + '.map')
+            cls.compile(fname, map_fname)
+            replacer = MappedWordReplacer(map_fname)
+            self.assertListEqual(replacer.replace_many(['happy', 'bday', 'gr8']), ['happy', 'birthday', 'great'])
+            replacer.word_map.close()
+
+    def test_yaml_scalars_stay_strings(self):
+        import os
+        with open(self.yaml, 'w') as f:
+            f.write('yes: affirmative\nno: negative\n1.5: one and a half\nok: yes\n')
+        map_fname = os.path.join(self.directory, 'scalars.map')
+        YamlWordReplacer.compile(self.yaml, map_fname)
+        replacer = MappedWordReplacer(map_fname)
+        self.assertListEqual(replacer.replace_many(['yes', 'no', '1.5', 'ok']),
+                             ['affirmative', 'negative', 'one and a half', 'yes'])
+        replacer.word_map.close()
+        self.assertEqual(YamlWordReplacer(self.yaml).replace('yes'), 'affirmative')
+
+    def test_compile_rejects_non_strings(self):
+        import os
+        map_fname = os.path.join(self.directory, 'bad.map')
+        self.assertRaises(ValueError, WordMapFile.compile, {True: 'affirmative'}, map_fname)
@@ -47,6 +47,32 @@ class NumeralCleanerTest(unittest.TestCase):
             self.assertEqual(self.object.clean(t[0]), t[1])
 
 
+class FastTweetTokenizerTest(unittest.TestCase):
+    def setUp(self):
+        self.object = FastTweetTokenizer()
+
+    def test_tokenize(self):
+        test = "My back can't take it!! @Taco #ChronicPain //t.co/a1B2 \U0001F62D"
+        expect = ['my', 'back', 'ca', "n't", 'take', 'it', '!', '!', '@taco', '#chronicpain', '//t.co/a1b2',
+                  '\U0001F62D']
+        self.assertListEqual(self.object.tokenize(test), expect)
+
+    def test_tokenize_clitics_and_numbers(self):
+        test = "It's 3.5 days of well-known pain..."
+        expect = ['it', "'s", '3.5', 'days', 'of', 'well-known', 'pain', '...']
+        self.assertListEqual(self.object.tokenize(test), expect)
+
+    def test_compare(self):
+        class SplitTokenizer(ITokenizer):
+            def tokenize(self, text):
+                return text.lower().split()
+
+        sample = ["the cat sat", "the cat sat!"]
+        result = self.object.compare(SplitTokenizer(), sample)
+        self.assertListEqual(result, [{'text': "the cat sat!", 'expected': ['the', 'cat', 'sat!'],
+                                       'result': ['the', 'cat', 'sat', '!']}])
+
+
 class LemmatizerTest(unittest.TestCase):
     """
     Wrapper on nltk.stem.WordNetLemmatizer for lemmatizing words
@@ -61,6 +87,62 @@ class LemmatizerTest(unittest.TestCase):
         self.assertRaises(AssertionError, self.object.process(4))
 
 
+class StubTaggedLemmatizer(Lemmatizer):
+    """
+    Tags everything as a noun and lemmatizes by stripping a trailing s so the
+    tests do not need the tagger or wordnet data
+    """
+    def __init__(self, cache_size=100000):
+        Lemmatizer.__init__(self, cache_size)
+        self.calls = []
+        self.tag_calls = 0
+
+    def _get_pos_tags_many(self, word_lists):
+        self.tag_calls += 1
+        return [[(w, 'n') for w in words] for words in word_lists]
+
+    def _lemmatize_uncached(self, word, tag):
+        self.calls.append((word, tag))
+        return word[:-1] if word.endswith('s') else word
+
+
+class FailingLemmatizer(StubTaggedLemmatizer):
+    def _lemmatize_uncached(self, word, tag):
+        raise AttributeError(word)
+
+
+class LemmatizerProcessManyTest(unittest.TestCase):
+    def setUp(self):
+        self.object = StubTaggedLemmatizer()
+
+    def test_process_many(self):
+        test = [['aches', 'pains'], ['pains'], [], ['aches', 'back']]
+        expect = [['ache', 'pain'], ['pain'], [], ['ache', 'back']]
+        self.assertListEqual(self.object.process_many(test), expect)
+        self.assertEqual(self.object.tag_calls, 1)
+        self.assertListEqual(sorted(self.object.calls), [('aches', 'n'), ('back', 'n'), ('pains', 'n')])
+
+    def test_process_many_with_workers(self):
+        test = [['aches', 'pains'], ['pains'], [], ['aches', 'back']] * 5
+        expect = [['ache', 'pain'], ['pain'], [], ['ache', 'back']] * 5
+        self.assertListEqual(self.object.process_many(test, workers=2, chunksize=3), expect)
+
+    def test_worker_failure_raises(self):
+        self.assertRaises(AttributeError, FailingLemmatizer().process_many, [['aches']] * 4, workers=2)
+
+    def test_cache_is_bounded(self):
+        lemmatizer = StubTaggedLemmatizer(cache_size=2)
+        lemmatizer.process_many([['a', 'b', 'c', 'a']])
+        self.assertEqual(lemmatizer._lemmatize.cache_info().currsize, 2)
+
+
+class PartOfSpeechClassificationTest(unittest.TestCase):
+    def test_convert_treebank_tag_to_wordnet_pos(self):
+        test = [('NNS', 'n'), ('VBD', 'v'), ('JJR', 'a'), ('RB', 'r'), ('DT', None)]
+        for t in test:
+            self.assertEqual(PartOfSpeechClassification._convert_treebank_tag_to_wordnet_pos(t[0]), t[1])
+
+
 class PorterStemmerTest(unittest.TestCase):
     def setUp(self):
         self.object = PorterStemmer()
@@ -118,4 +200,48 @@ class WordFiltersTest(unittest.TestCase):
         self.object.filter_words = 'fish'
         self.object.filter_words = 'taco'
         self.object.filter_words = 'dog'
-        self.assertTupleEqual(self.object._filter_words, self.expected)
\ No newline at end of file
+        self.assertTupleEqual(self.object._filter_words, self.expected)
+
+
+class RegexpReplacerTest(unittest.TestCase):
+    def setUp(self):
+        self.object = RegexpReplacer()
+
+    def test_process_matches_sequential_subn(self):
+        test = ["I won't", "Won't", "swon't", "Can't we", "I'm sure you'll", "isn't it", "it's", "we're",
+                "they'd've", "no change", "Ain't", ""]
+        for t in test:
+            s = t
+            for (pattern, repl) in self.object.patterns:
+                (s, count) = re.subn(pattern, repl, s)
+            self.assertEqual(self.object.process(t), s)
+
+    def test_add_compiled_regex_pattern(self):
+        self.object.add_compiled_regex_pattern(re.compile('gonna'), 'going to')
+        self.assertEqual(self.object.process("I'm gonna"), 'i am going to')
+
+
+class CompiledNgramFilterTest(unittest.TestCase):
+    def test_word_filter_compile(self):
+        word_filter = WordFilter()
+        word_filter.filter_words = ['the', 'and']
+        drop = word_filter.compile()
+        self.assertTrue(drop(('back', 'and')))
+        self.assertFalse(drop(('back', 'pain')))
+
+    def test_custom_filter_compile(self):
+        custom_filter = CustomFilter()
+        custom_filter.set_filter(lambda w1, w2, w3: 'and' in (w1, w3))
+        drop = custom_filter.compile()
+        self.assertTrue(drop(('and', 'back', 'pain')))
+        self.assertFalse(drop(('back', 'and', 'pain')))
+
+    def test_compiled_filters_follow_later_changes(self):
+        word_filter = WordFilter()
+        word_filter.filter_words = ['the']
+        custom_filter = CustomFilter()
+        drops = [word_filter.compile(), custom_filter.compile()]
+        word_filter.filter_words = 'and'
+        custom_filter.set_filter(lambda w1, w2: w1 == 'back')
+        self.assertTrue(drops[0](('back', 'and')))
+        self.assertTrue(drops[1](('back', 'pain')))
@@ -0,0 +1,167 @@
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import unittest
+
+import nltk
+
+import TextStats
+from TextStats import *
+from Vocabulary import Vocabulary, IdBag
+
+
+class WordFreqTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(19)
+        self.words = [rng.choice(['pain', 'back', 'neck', 'bad', 'is', 'the', 'knee']) for _ in range(500)]
+        self.words += ['rare']
+        self.object = WordFreq(self.words)
+
+    def test_ranking_matches_most_common(self):
+        expected = [word for word, count in nltk.FreqDist(self.words).most_common()]
+        self.assertListEqual(self.object.ranking, expected)
+
+    def test_topN(self):
+        expected = [word for word, count in nltk.FreqDist(self.words).most_common(3)]
+        self.assertListEqual(self.object.topN(3), expected)
+        self.assertListEqual(self.object.topN(100), self.object.ranking)
+        self.assertListEqual(self.object.topN(0), [])
+
+    def test_topN_ties_in_order_of_appearance(self):
+        self.assertListEqual(WordFreq(['b', 'a', 'c', 'a', 'b']).topN(2), ['b', 'a'])
+
+    def test_unique(self):
+        self.assertListEqual(self.object.unique, sorted(set(self.words)))
+
+    def test_compute_individual_word_freq(self):
+        result = self.object.compute_individual_word_freq()
+        self.assertDictEqual(dict((d['word'], d['count']) for d in result), dict(nltk.FreqDist(self.words)))
+
+    def test_freqDist(self):
+        self.assertEqual(self.object.freqDist, nltk.FreqDist(self.words))
+
+    def test_to_columns(self):
+        words, counts = self.object.to_columns()
+        self.assertEqual(len(words), len(counts))
+        self.assertEqual(words[0], self.words[0])
+        words, counts = self.object.to_columns(ranked=True)
+        self.assertListEqual(words, self.object.ranking)
+        self.assertEqual(list(counts)[-1], 1)
+
+    def test_idbag_counted_by_id(self):
+        bag = IdBag(Vocabulary(['unused']))
+        bag += self.words
+        freq = WordFreq(bag)
+        self.assertListEqual(freq.ranking, self.object.ranking)
+        self.assertNotIn('unused', freq.words)
+        self.assertListEqual(list(freq.counts), list(self.object.counts))
+
+    def test_idbag_with_shared_vocabulary_keeps_first_appearance(self):
+        bag = IdBag(Vocabulary(['b', 'a']))
+        bag += ['a', 'b', 'a', 'b']
+        freq = WordFreq(bag)
+        self.assertListEqual(freq.words, ['a', 'b'])
+        self.assertListEqual(freq.ranking, WordFreq(['a', 'b', 'a', 'b']).ranking)
+
+    def test_without_numpy(self):
+        numpy = TextStats.np
+        TextStats.np = None
+        try:
+            freq = WordFreq(self.words)
+            self.assertListEqual(freq.ranking, self.object.ranking)
+            self.assertListEqual(freq.topN(3), self.object.topN(3))
+            self.assertListEqual(freq.to_columns(ranked=True)[1], list(self.object.to_columns(ranked=True)[1]))
+        finally:
+            TextStats.np = numpy
+
+
+class FrequencyTableTest(unittest.TestCase):
+    def setUp(self):
+        self.day1 = ['back', 'pain', 'back', 'neck', 'pain', 'back']
+        self.day2 = ['knee', 'pain', 'pain', 'back']
+        self.dir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.dir, 'totals.freq')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_update_and_merge(self):
+        table = FrequencyTable().update(self.day1)
+        table.update(self.day2)
+        self.assertEqual(table, FrequencyTable(nltk.FreqDist(self.day1 + self.day2)))
+        merged = FrequencyTable().update(self.day1) + FrequencyTable().update(self.day2)
+        self.assertEqual(merged, table)
+        self.assertEqual(table.total, 10)
+
+    def test_update_with_idbag(self):
+        bag = IdBag(Vocabulary())
+        bag += self.day1
+        self.assertEqual(FrequencyTable().update(bag), FrequencyTable().update(self.day1))
+
+    def test_subtract(self):
+        table = FrequencyTable().update(self.day1 + self.day2)
+        table -= FrequencyTable().update(self.day2)
+        self.assertEqual(table, FrequencyTable().update(self.day1))
+        self.assertNotIn('knee', table)
+        self.assertEqual(table['knee'], 0)
+
+    def test_topN(self):
+        table = FrequencyTable().update(self.day1 + self.day2)
+        self.assertListEqual(table.topN(3), ['back', 'pain', 'knee'])
+
+    def test_save_and_load(self):
+        table = FrequencyTable().update(self.day1 + self.day2 + ['caf\xe9'])
+        table.save(self.fname)
+        saved = FrequencyTable.load(self.fname)
+        self.assertEqual(len(saved), len(table))
+        self.assertEqual(saved['pain'], 4)
+        self.assertEqual(saved['caf\xe9'], 1)
+        self.assertEqual(saved['elbow'], 0)
+        self.assertNotIn('elbow', saved)
+        self.assertListEqual(saved.topN(3), table.topN(3))
+        self.assertEqual(saved.to_table(), table)
+        saved.close()
+
+    def test_failed_save_leaves_file_alone(self):
+        FrequencyTable().update(self.day1).save(self.fname)
+        # a negative count does not fit the uint64 counts column
+        self.assertRaises(OverflowError, FrequencyFile.write, {'back': -1}, self.fname)
+        self.assertListEqual(os.listdir(self.dir), ['totals.freq'])
+        saved = FrequencyTable.load(self.fname)
+        self.assertEqual(saved['back'], 3)
+        saved.close()
+
+    def test_nightly_update(self):
+        FrequencyTable().update(self.day1).save(self.fname)
+        stored = FrequencyFile(self.fname)
+        table = stored.to_table().update(self.day2)
+        table.save(self.fname)
+        # the old mapping stays readable after the file is replaced
+        self.assertEqual(stored['back'], 3)
+        stored.close()
+        reloaded = FrequencyFile(self.fname)
+        self.assertEqual(reloaded.to_table(), FrequencyTable().update(self.day1 + self.day2))
+        self.assertEqual(pickle.loads(pickle.dumps(reloaded))['pain'], 4)
+        reloaded.close()
+
+    def test_rejects_other_files(self):
+        with open(self.fname, 'wb') as f:
+            f.write(b'not a table at all')
+        self.assertRaises(ValueError, FrequencyFile, self.fname)
+
+
+class StreamingWordFreqTest(unittest.TestCase):
+    def test_consume(self):
+        rng = random.Random(29)
+        common = ['pain', 'back', 'neck', 'bad']
+        tokens = [rng.choice(common) if rng.random() < 0.6 else 'w%d' % rng.randrange(2000) for _ in range(5000)]
+        freq = StreamingWordFreq(capacity=50)
+        freq.consume(iter(tokens), batch_size=300)
+        self.assertEqual(freq.total, 5000)
+        self.assertListEqual(freq.topN(4), WordFreq(tokens).topN(4))
+        self.assertTrue(freq.topN_is_exact(4))
+        for word, lower, upper in freq.topN_with_bounds(4):
+            self.assertTrue(lower <= tokens.count(word) <= upper)
+        self.assertLessEqual(freq.bounds('w1')[1], freq.max_error + tokens.count('w1'))
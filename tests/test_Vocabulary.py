@@ -0,0 +1,65 @@
+import unittest
+from array import array
+from Vocabulary import *
+
+
+class VocabularyTest(unittest.TestCase):
+    def setUp(self):
+        self.object = Vocabulary(['pain', 'back'])
+
+    def test_add_assigns_ids_in_order(self):
+        self.assertEqual(self.object.add('pain'), 0)
+        self.assertEqual(self.object.add('neck'), 2)
+        self.assertEqual(len(self.object), 3)
+
+    def test_encode_decode(self):
+        ids = self.object.encode(['back', 'neck', 'pain', 'neck'])
+        self.assertEqual(ids, array('I', [1, 2, 0, 2]))
+        self.assertListEqual(self.object.decode(ids), ['back', 'neck', 'pain', 'neck'])
+
+    def test_lookup(self):
+        self.assertEqual(self.object.lookup('back'), 1)
+        self.assertIsNone(self.object.lookup('neck'))
+        self.assertNotIn('neck', self.object)
+
+
+class IdBagTest(unittest.TestCase):
+    def setUp(self):
+        self.object = IdBag(Vocabulary())
+
+    def test_iadd_and_views(self):
+        self.object += ['my', 'back', 'pain']
+        self.object += ['back']
+        self.assertEqual(self.object, ['my', 'back', 'pain', 'back'])
+        self.assertEqual(len(self.object), 4)
+        self.assertEqual(self.object[1], 'back')
+        self.assertListEqual(self.object[2:], ['pain', 'back'])
+        self.assertEqual(self.object.ids, array('I', [0, 1, 2, 1]))
+
+
+class TweetTupleTableTest(unittest.TestCase):
+    def setUp(self):
+        self.object = TweetTupleTable(Vocabulary())
+        self.object.append((10, ['my', 'back']))
+        self.object.append((11, []))
+        self.object.append((12, ['back', 'pain']))
+
+    def test_csr_layout(self):
+        self.assertEqual(self.object.token_ids, array('I', [0, 1, 1, 2]))
+        self.assertEqual(self.object.offsets, array('Q', [0, 2, 2, 4]))
+
+    def test_index_out_of_range(self):
+        self.assertEqual(self.object[-3], (10, ['my', 'back']))
+        for index in (3, -4):
+            self.assertRaises(IndexError, lambda: self.object[index])
+
+    def test_decodes_to_tuples(self):
+        self.assertEqual(len(self.object), 3)
+        self.assertTupleEqual(self.object[0], (10, ['my', 'back']))
+        self.assertTupleEqual(self.object[-1], (12, ['back', 'pain']))
+        self.assertEqual(self.object, [(10, ['my', 'back']), (11, []), (12, ['back', 'pain'])])
+
+    def test_masterbag_shares_storage(self):
+        bag = self.object.masterbag()
+        self.object.append((13, ['ow']))
+        self.assertEqual(bag, ['my', 'back', 'back', 'pain', 'ow'])
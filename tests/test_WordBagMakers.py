@@ -24,6 +24,33 @@ from WordBagMakers import *
 #         self.assertEqual(tuple(set(test)), self.object._ignore, 'contents as expected')
 
 
+class TokenFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.object = TokenFilter(['the', 'a'], [UsernameCleaner(), URLCleaner()])
+
+    def test_filter(self):
+        test = ['the', 'cat', '@taco', 'ate', 'a', '//t.co/xyz', 'cat']
+        expect = ['cat', 'ate', 'cat']
+        self.assertListEqual(self.object.filter(test), expect)
+
+    def test_admits(self):
+        test = [('the', False), ('cat', True), ('@taco', False), ('//t.co', False)]
+        for t in test:
+            self.assertEqual(self.object.admits(t[0]), t[1])
+
+    def test_verdicts_memoized(self):
+        calls = []
+
+        class CountingCleaner(ICleaner):
+            def clean(self, word):
+                calls.append(word)
+                return True
+
+        token_filter = TokenFilter((), [CountingCleaner()])
+        token_filter.filter(['cat', 'dog', 'cat', 'cat', 'dog'])
+        self.assertListEqual(calls, ['cat', 'dog'])
+
+
 class LemmatizerTest(unittest.TestCase):
     """
     Wrapper on nltk.stem.WordNetLemmatizer for lemmatizing words
@@ -58,11 +85,11 @@ class WordBagMakerTest(unittest.TestCase):
 
     def test_add_to_ignorelist(self):
         """
-        The tested function combines the lists, removes duplicates, and converts to a tuple
+        The tested function combines the lists, removes duplicates, and converts to a frozenset
         """
         testlist1 = [1, 2]
         testlist2 = [2, 3, 4, 5]
-        expect = (1, 2, 3, 4, 5)
+        expect = frozenset([1, 2, 3, 4, 5])
 
         self.object.add_to_ignorelist(testlist1)
         # make sure adds to the list
@@ -70,7 +97,17 @@ class WordBagMakerTest(unittest.TestCase):
         # self.assertListEqual(t1, testlist1.sort())
         self.object.add_to_ignorelist(testlist2)
         # make sure edited out the duplicates
-        self.assertTupleEqual(self.object._ignore, expect)
+        self.assertIsInstance(self.object._ignore, frozenset)
+        self.assertSetEqual(self.object._ignore, expect)
+
+    def test_token_filter_rebuilt_after_changes(self):
+        self.object.add_to_ignorelist(['dog'])
+        first = self.object.token_filter
+        self.assertIs(first, self.object.token_filter)
+        self.object.add_to_cleaners(UsernameCleaner())
+        second = self.object.token_filter
+        self.assertIsNot(first, second)
+        self.assertListEqual(second.filter(['dog', '@cat', 'cat']), ['cat'])
 
     def test__make_wordbag(self):
         test = "The quick brown fox became a delicious taco for the hungry cat. All lived happily ever after"
@@ -98,11 +135,11 @@ class TweetTextWordBagMakerTest(unittest.TestCase):
 
     def test_add_to_ignorelist(self):
         """
-        The tested function combines the lists, removes duplicates, and converts to a tuple
+        The tested function combines the lists, removes duplicates, and converts to a frozenset
         """
         testlist1 = [1, 2]
         testlist2 = [2, 3, 4, 5]
-        expect = (1, 2, 3, 4, 5)
+        expect = frozenset([1, 2, 3, 4, 5])
 
         self.object.add_to_ignorelist(testlist1)
         # make sure adds to the list
@@ -110,7 +147,17 @@ class TweetTextWordBagMakerTest(unittest.TestCase):
         # self.assertListEqual(t1, testlist1.sort())
         self.object.add_to_ignorelist(testlist2)
         # make sure edited out the duplicates
-        self.assertTupleEqual(self.object._ignore, expect)
+        self.assertIsInstance(self.object._ignore, frozenset)
+        self.assertSetEqual(self.object._ignore, expect)
+
+    def test_token_filter_rebuilt_after_changes(self):
+        self.object.add_to_ignorelist(['dog'])
+        first = self.object.token_filter
+        self.assertIs(first, self.object.token_filter)
+        self.object.add_to_cleaners(UsernameCleaner())
+        second = self.object.token_filter
+        self.assertIsNot(first, second)
+        self.assertListEqual(second.filter(['dog', '@cat', 'cat']), ['cat'])
 
     def test__make_wordbag(self):
         test = "The quick brown fox became a delicious taco for the hungry cat. All lived happily ever after"
@@ -150,3 +197,111 @@ class TweetTextWordBagMakerTest(unittest.TestCase):
         self.assertTupleEqual(self.object.tweet_tuples[0], (1, ["first", "tweet", "text"]))
         self.assertTupleEqual(self.object.tweet_tuples[1], (2, ["quick", "brown", "fox", "became", "delicious", "taco", "hungry", "cat", "lived", "happily", "ever"]))
 
+
+
+class SplittingTweetTextWordBagMaker(TweetTextWordBagMaker):
+    """
+    Splits on whitespace so the tests do not depend on the punkt models
+    """
+    def _make_wordbag(self, text):
+        return text.lower().split()
+
+
+class TweetTextWordBagMakerWorkersTest(unittest.TestCase):
+    def setUp(self):
+        self.tweets = [{'tweetID': i, 'tweetText': "Tweet %s has @user%s and the pain %s" % (i, i % 7, i % 3)}
+                       for i in range(200)]
+
+    def make_bagmaker(self):
+        bagmaker = SplittingTweetTextWordBagMaker()
+        bagmaker.add_to_ignorelist(['the', 'and', 'has'])
+        bagmaker.add_to_cleaners(UsernameCleaner())
+        return bagmaker
+
+    def test_process_with_workers_matches_serial(self):
+        serial = self.make_bagmaker()
+        serial.process(self.tweets)
+        sharded = self.make_bagmaker()
+        sharded.process(self.tweets, workers=3, chunksize=17)
+        self.assertListEqual(sharded.tweet_tuples, serial.tweet_tuples)
+        self.assertListEqual(sharded.masterbag, serial.masterbag)
+
+    def test_worker_copy_carries_configuration_only(self):
+        bagmaker = self.make_bagmaker()
+        bagmaker.process(self.tweets[:5])
+        worker = bagmaker._worker_copy()
+        self.assertListEqual(worker.masterbag, [])
+        self.assertListEqual(worker.tweet_tuples, [])
+        self.assertSetEqual(worker._ignore, bagmaker._ignore)
+        self.assertListEqual(worker._cleaners, bagmaker._cleaners)
+
+
+class IterProcessTest(unittest.TestCase):
+    def setUp(self):
+        self.object = SplittingTweetTextWordBagMaker()
+        self.object.add_to_ignorelist(['the'])
+
+    def test_iter_process_is_lazy(self):
+        def tweets():
+            yield {'tweetID': 1, 'tweetText': "The first tweet"}
+            raise AssertionError('consumed past the first tweet')
+
+        result = next(self.object.iter_process(tweets()))
+        self.assertTupleEqual(result, (1, ['first', 'tweet']))
+
+    def test_iter_process_does_not_accumulate_by_default(self):
+        test = ({'tweetID': i, 'tweetText': "the cat %s" % i} for i in range(3))
+        result = list(self.object.iter_process(test))
+        self.assertListEqual(result, [(0, ['cat', '0']), (1, ['cat', '1']), (2, ['cat', '2'])])
+        self.assertListEqual(self.object.masterbag, [])
+        self.assertListEqual(self.object.tweet_tuples, [])
+
+    def test_iter_process_accumulate(self):
+        test = ({'tweetID': i, 'tweetText': "the cat %s" % i} for i in range(2))
+        list(self.object.iter_process(test, accumulate=True))
+        self.assertListEqual(self.object.masterbag, ['cat', '0', 'cat', '1'])
+        self.assertListEqual(self.object.tweet_tuples, [(0, ['cat', '0']), (1, ['cat', '1'])])
+
+    def test_word_bag_maker_ids_are_positions(self):
+        bagmaker = WordBagMaker()
+        bagmaker._make_wordbag = lambda text: text.split()
+        result = list(bagmaker.iter_process(iter(["a b", "c"])))
+        self.assertListEqual(result, [(0, ['a', 'b']), (1, ['c'])])
+
+
+class CompactTweetTextWordBagMakerTest(unittest.TestCase):
+    def setUp(self):
+        self.tweets = [{'tweetID': 1, 'tweetText': "The first tweet"},
+                       {'tweetID': 2, 'tweetText': "the second tweet"}]
+
+    def test_compact_results_match_plain(self):
+        plain = SplittingTweetTextWordBagMaker()
+        plain.add_to_ignorelist(['the'])
+        plain.process(self.tweets)
+        compact = SplittingTweetTextWordBagMaker(compact=True)
+        compact.add_to_ignorelist(['the'])
+        compact.process(self.tweets, workers=2)
+        self.assertEqual(compact.masterbag, plain.masterbag)
+        self.assertEqual(compact.tweet_tuples, plain.tweet_tuples)
+        self.assertTupleEqual(compact.tweet_tuples[1], (2, ['second', 'tweet']))
+        self.assertListEqual(compact.vocabulary.words, ['first', 'tweet', 'second'])
+
+    def test_shared_vocabulary(self):
+        vocabulary = Vocabulary()
+        first = SplittingTweetTextWordBagMaker(compact=True, vocabulary=vocabulary)
+        second = SplittingTweetTextWordBagMaker(compact=True, vocabulary=vocabulary)
+        first.process(self.tweets[:1])
+        second.process(self.tweets[1:])
+        self.assertEqual(second.masterbag.ids[2], first.masterbag.ids[2])
+
+
+class TokenizerSelectionTest(unittest.TestCase):
+    def test_fast_tweet_tokenizer(self):
+        bagmaker = TweetTextWordBagMaker(tokenizer=FastTweetTokenizer())
+        bagmaker.add_to_ignorelist(['the', '.'])
+        bagmaker.add_to_cleaners(UsernameCleaner())
+        bagmaker.process([{'tweetID': 1, 'tweetText': "@doc The pain. #fibro"}])
+        self.assertListEqual(bagmaker.masterbag, ['pain', '#fibro'])
+
+    def test_default_tokenizer(self):
+        self.assertIsInstance(WordBagMaker().tokenizer, NltkTokenizer)